@@ -0,0 +1,97 @@
+"""
+触摸输入延迟基准测试
+
+对比 `adb shell input tap/swipe` 与设备端触摸注入（utils/input_injector.py）的单次调用延迟。
+- 真机：按 --device 连接，点击位置默认为屏幕顶部中间（基础分辨率坐标，可用 --x/--y 修改），
+  请确认该位置点击无副作用
+- --fake：使用 FakeInputDevice 离线替身，模拟 input 指令的设备端耗时，并校验注入事件解码出的触点坐标
+
+用法：
+    python benchmark_input.py --fake
+    python benchmark_input.py --device emulator-5554 --count 20
+    python benchmark_input.py --device emulator-5554 --swipe-ms 300
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from utils import tools
+from utils.input_injector import FakeInputDevice, TouchInjector
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def timed(func, count):
+    latencies = []
+    for _ in range(count):
+        started = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def print_row(name, values):
+    print(f"{name:<20}{len(values):>6}{percentile(values, 50):>10.1f}{percentile(values, 90):>10.1f}"
+          f"{max(values, default=0):>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="input 指令与触摸注入的延迟对比")
+    parser.add_argument("--device", help="设备 ID（不传且未使用 --fake 时取第一台设备）")
+    parser.add_argument("--fake", action="store_true", help="使用离线替身代替真机")
+    parser.add_argument("--count", type=int, default=10, help="每种方式的调用次数")
+    parser.add_argument("--x", type=int, default=1400, help="点击位置 X（基础分辨率）")
+    parser.add_argument("--y", type=int, default=40, help="点击位置 Y（基础分辨率）")
+    parser.add_argument("--swipe-ms", type=int, default=0, help="额外测试该时长的原地滑动（毫秒），0 表示不测")
+    args = parser.parse_args()
+
+    if args.fake:
+        connector, device_id = FakeInputDevice(), "fake"
+        tools._DEVICE_CONTEXTS[device_id] = tools.DeviceContext.create(device_id, *tools.BASE_RESOLUTION)
+    else:
+        connector = tools.ensure_adb_connection()
+        device_id = args.device or (tools.list_devices(connector) or [None])[0]
+        if device_id is None:
+            raise SystemExit("错误: 没有可用的设备")
+        tools.init_resolution(connector, device_id)
+
+    injector = TouchInjector(connector, device_id)
+    if not injector.probe():
+        raise SystemExit("错误: 该设备不支持触摸注入")
+    x, y = tools.adapt_coord(args.x, args.y, device_id)
+    # 建立常驻 shell 会话，不计入注入延迟
+    injector.run([])
+
+    def adb_input(*values):
+        return connector.execute_adb(["shell", "input"] + [str(v) for v in values], device_id)
+
+    results = {
+        "input tap": timed(lambda: adb_input("tap", x, y), args.count),
+        "注入 tap": timed(lambda: injector.tap(x, y), args.count),
+    }
+    if args.swipe_ms:
+        results[f"input swipe {args.swipe_ms}ms"] = timed(
+            lambda: adb_input("swipe", x, y, x, y, args.swipe_ms), args.count)
+        results[f"注入 swipe {args.swipe_ms}ms"] = timed(
+            lambda: injector.swipe(x, y, x, y, args.swipe_ms), args.count)
+
+    print(f"\n设备: {device_id}  点击位置: ({x}, {y})  触摸屏: {injector.device.path}")
+    print(f"{'方式':<20}{'调用':>6}{'p50(ms)':>10}{'p90(ms)':>10}{'max(ms)':>10}")
+    for name, values in results.items():
+        print_row(name, values)
+
+    if args.fake:
+        expected = injector.to_touch(x, y)
+        wrong = [points for _, points in connector.touches if points[0] != expected]
+        print(f"\n替身记录触点 {len(connector.touches)} 个，坐标不符 {len(wrong)} 个 (期望原始坐标 {expected})")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(1)
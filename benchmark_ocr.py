@@ -0,0 +1,145 @@
+"""
+数字识别离线基准测试
+
+用录制的数字区域截图（如密函卡片的持有数）对比各识别后端的准确率与单张延迟：
+- glyph:   GlyphDigitRecognizer（templates/digits 下的字形模板）
+- easyocr: easyocr.Reader（未安装时跳过）
+
+标注文件为 JSON，键为截图文件名，值为该区域的正确数字：
+    {
+        "card1_r12.png": "12",
+        "card2_r12.png": "0"
+    }
+
+字形模板可以直接从已标注的截图生成（每个数字至少需要出现一次）：
+    python benchmark_ocr.py --crops bench_crops --labels bench_crops/labels.json --extract
+
+用法：
+    python benchmark_ocr.py --crops bench_crops --labels bench_crops/labels.json
+    python benchmark_ocr.py --crops bench_crops --labels bench_crops/labels.json --backends glyph --repeat 5
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from utils.ocr import DIGIT_ALLOWLIST, DIGIT_TEMPLATE_DIR, GlyphDigitRecognizer, parse_digits
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def load_crops(crops_dir, labels):
+    crops = []
+    for name, expected in sorted(labels.items()):
+        path = os.path.join(crops_dir, name)
+        image = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR) if os.path.exists(path) else None
+        if image is None:
+            print(f"跳过无法读取的截图: {name}")
+            continue
+        crops.append((name, str(expected), image))
+    return crops
+
+
+def extract(crops, template_dir):
+    recognizer = GlyphDigitRecognizer(template_dir)
+    saved = 0
+    for name, expected, image in crops:
+        count = recognizer.extract_templates(image, expected)
+        if count == 0:
+            print(f"  ✗ {name}: 字形数量不足或存在粘连，未生成模板")
+        saved += count
+    covered = sorted({file[0] for file in os.listdir(template_dir) if file[:1].isdigit()}) \
+        if os.path.isdir(template_dir) else []
+    print(f"已保存 {saved} 个字形模板到 {template_dir}，覆盖数字: {''.join(covered) or '无'}")
+    missing = sorted(set(DIGIT_ALLOWLIST) - set(covered))
+    if missing:
+        print(f"⚠️ 缺少数字 {''.join(missing)} 的模板，请补充包含这些数字的截图")
+
+
+def build_backend(name, template_dir):
+    if name == "glyph":
+        recognizer = GlyphDigitRecognizer(template_dir)
+        if not recognizer.templates:
+            print(f"跳过 glyph: {template_dir} 中没有数字模板（先运行 --extract）")
+            return None
+        return recognizer
+    if name == "easyocr":
+        try:
+            import easyocr
+        except ImportError:
+            print("跳过 easyocr: 未安装")
+            return None
+        print("正在加载 easyocr 模型...")
+        return easyocr.Reader(["ch_sim", "en"])
+    print(f"跳过未知后端: {name}")
+    return None
+
+
+def run_backend(reader, crops, repeat):
+    latencies, correct, errors = [], 0, []
+    # 预热一次，不计入延迟
+    reader.readtext_batched([crops[0][2]], allowlist=DIGIT_ALLOWLIST, detail=0)
+    for name, expected, image in crops:
+        texts = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            texts = reader.readtext_batched([image], allowlist=DIGIT_ALLOWLIST, detail=0)[0]
+            latencies.append((time.perf_counter() - started) * 1000)
+        value = parse_digits(texts)
+        if value is not None and value == int(expected):
+            correct += 1
+        else:
+            errors.append((name, expected, value))
+    return latencies, correct, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数字识别后端离线基准测试")
+    parser.add_argument("--crops", required=True, help="数字区域截图目录")
+    parser.add_argument("--labels", required=True, help="标注文件 (JSON)")
+    parser.add_argument("--templates", default=DIGIT_TEMPLATE_DIR, help="数字字形模板目录")
+    parser.add_argument("--backends", default="glyph,easyocr", help="参与对比的后端，逗号分隔")
+    parser.add_argument("--repeat", type=int, default=1, help="每张截图重复识别次数")
+    parser.add_argument("--extract", action="store_true", help="从已标注截图生成字形模板后退出")
+    args = parser.parse_args()
+
+    with open(args.labels, "r", encoding="utf-8") as f:
+        labels = json.load(f)
+    crops = load_crops(args.crops, labels)
+    if not crops:
+        raise SystemExit(f"错误: {args.crops} 中没有可用的已标注截图")
+
+    if args.extract:
+        extract(crops, args.templates)
+        return
+
+    results = {}
+    for name in [b.strip() for b in args.backends.split(",") if b.strip()]:
+        reader = build_backend(name, args.templates)
+        if reader is None:
+            continue
+        latencies, correct, errors = run_backend(reader, crops, max(1, args.repeat))
+        results[name] = (latencies, correct)
+        for crop_name, expected, value in errors:
+            print(f"  ✗ [{name}] {crop_name}: 期望 {expected}，识别为 {value}")
+
+    print(f"\n截图数: {len(crops)}")
+    print(f"{'后端':<12}{'准确率':>10}{'p50(ms)':>10}{'p90(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}")
+    for name, (latencies, correct) in results.items():
+        print(f"{name:<12}{correct / len(crops):>10.2%}{percentile(latencies, 50):>10.2f}"
+              f"{percentile(latencies, 90):>10.2f}{percentile(latencies, 99):>10.2f}{max(latencies, default=0):>10.2f}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(1)
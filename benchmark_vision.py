@@ -0,0 +1,174 @@
+"""
+视觉热路径离线基准测试
+
+用已保存的截图（capture.py / ADBConnector.capture_screen 生成）回放 ImageMatcher.compare_template，
+统计每次调用的延迟分位数、内存峰值，以及对照标注的命中/未命中混淆矩阵。
+
+标注文件（可选）为 JSON，键为截图文件名，值为该截图中应当出现的模板（相对 templates/ 的路径）：
+    {
+        "round1_restart.png": ["restart.png"],
+        "activity_start.png": ["Activity/start.png"],
+        "loading.png": []
+    }
+未出现在标注文件中的截图只计时，不参与混淆矩阵统计。
+
+用法：
+    python benchmark_vision.py --frames bench_frames --labels bench_frames/labels.json
+    python benchmark_vision.py --frames bench_frames --coarse-factor 4 --repeat 3
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from utils import tools
+from utils.template_cache import NON_MATCH_DIRS
+from utils.tools import ImageMatcher, template_registry
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+def list_images(directory, skip_dirs=()):
+    result = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if d not in skip_dirs)
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTS):
+                result.append(os.path.join(root, name))
+    return result
+
+
+def peak_rss_mb():
+    """进程常驻内存峰值（MB），取不到时返回 None"""
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        peak = getattr(info, "peak_wset", None) or info.rss
+        return peak / 1024 / 1024
+    except ImportError:
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        return None
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def run_benchmark(frames_dir, templates_dir, labels, repeat, threshold, cold):
+    frames = list_images(frames_dir)
+    templates = list_images(templates_dir, NON_MATCH_DIRS)
+    if not frames:
+        raise SystemExit(f"错误: {frames_dir} 中没有截图")
+    if not templates:
+        raise SystemExit(f"错误: {templates_dir} 中没有模板")
+
+    template_registry.preload(templates_dir)
+    names = {path: os.path.relpath(path, templates_dir).replace(os.sep, "/") for path in templates}
+    latencies = {name: [] for name in names.values()}
+    confusion = {name: {"tp": 0, "fp": 0, "fn": 0, "tn": 0} for name in names.values()}
+
+    tracemalloc.start()
+    for frame_path in frames:
+        frame_name = os.path.relpath(frame_path, frames_dir).replace(os.sep, "/")
+        screen = cv2.imdecode(np.fromfile(frame_path, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if screen is None:
+            print(f"跳过无法解码的截图: {frame_name}")
+            continue
+        expected = labels.get(frame_name) if labels else None
+
+        for path, name in names.items():
+            res = None
+            for _ in range(repeat):
+                if cold:
+                    ImageMatcher.reset_learned_state("bench")
+                started = time.perf_counter()
+                res = ImageMatcher.compare_template(screen, path, threshold, device_id="bench")
+                latencies[name].append((time.perf_counter() - started) * 1000)
+
+            if expected is not None:
+                should_match = name in expected
+                cell = ("tp" if res["is_match"] else "fn") if should_match else ("fp" if res["is_match"] else "tn")
+                confusion[name][cell] += 1
+                if cell in ("fp", "fn"):
+                    print(f"  ✗ {frame_name} / {name}: {cell.upper()} (相关度 {res['max_corr']:.3f})")
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return frames, latencies, confusion, traced_peak
+
+
+def print_report(frames, latencies, confusion, traced_peak, labelled):
+    print(f"\n截图数: {len(frames)}  模板数: {len(latencies)}")
+    print(f"{'模板':<28}{'调用':>6}{'p50(ms)':>10}{'p90(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}")
+    all_values = []
+    for name, values in sorted(latencies.items()):
+        all_values.extend(values)
+        print(f"{name:<28}{len(values):>6}{percentile(values, 50):>10.2f}{percentile(values, 90):>10.2f}"
+              f"{percentile(values, 99):>10.2f}{max(values, default=0):>10.2f}")
+    print(f"{'[全部]':<28}{len(all_values):>6}{percentile(all_values, 50):>10.2f}{percentile(all_values, 90):>10.2f}"
+          f"{percentile(all_values, 99):>10.2f}{max(all_values, default=0):>10.2f}")
+
+    rss = peak_rss_mb()
+    print(f"\n内存峰值: Python/NumPy 分配 {traced_peak / 1024 / 1024:.1f} MB"
+          + (f"，进程常驻 {rss:.1f} MB" if rss is not None else ""))
+
+    if labelled:
+        print(f"\n{'模板':<28}{'TP':>6}{'FP':>6}{'FN':>6}{'TN':>6}{'准确率':>10}")
+        totals = {"tp": 0, "fp": 0, "fn": 0, "tn": 0}
+        for name, cells in sorted(confusion.items()):
+            for key in totals:
+                totals[key] += cells[key]
+            total = sum(cells.values())
+            accuracy = (cells["tp"] + cells["tn"]) / total if total else 0.0
+            print(f"{name:<28}{cells['tp']:>6}{cells['fp']:>6}{cells['fn']:>6}{cells['tn']:>6}{accuracy:>10.2%}")
+        total = sum(totals.values())
+        accuracy = (totals["tp"] + totals["tn"]) / total if total else 0.0
+        print(f"{'[全部]':<28}{totals['tp']:>6}{totals['fp']:>6}{totals['fn']:>6}{totals['tn']:>6}{accuracy:>10.2%}")
+
+    print(f"\n模板缓存: {template_registry.stats()}")
+    if ImageMatcher.coarse_stats["checks"]:
+        print(f"粗到精抽样校验: {ImageMatcher.coarse_stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ImageMatcher 离线基准测试")
+    parser.add_argument("--frames", required=True, help="截图目录（递归查找）")
+    parser.add_argument("--templates", default=os.path.join(tools.BASE_DIR, "templates"), help="模板目录")
+    parser.add_argument("--labels", help="标注文件 (JSON)")
+    parser.add_argument("--repeat", type=int, default=1, help="每个 截图×模板 组合重复调用次数")
+    parser.add_argument("--threshold", type=float, default=0.7, help="匹配阈值")
+    parser.add_argument("--coarse-factor", type=int, help="覆盖配置中的 coarse_factor (0/4/8)")
+    parser.add_argument("--verify-rate", type=float, help="覆盖配置中的 coarse_verify_rate")
+    parser.add_argument("--cold", action="store_true", help="每次调用前清除尺度/区域锁定，测量冷启动路径")
+    args = parser.parse_args()
+
+    # 覆盖项只作用于本进程，不写回 config.json
+    if args.coarse_factor is not None:
+        tools.config_mgr.data["coarse_factor"] = args.coarse_factor
+    if args.verify_rate is not None:
+        tools.config_mgr.data["coarse_verify_rate"] = args.verify_rate
+
+    labels = None
+    if args.labels:
+        with open(args.labels, "r", encoding="utf-8") as f:
+            labels = json.load(f)
+
+    frames, latencies, confusion, traced_peak = run_benchmark(
+        args.frames, args.templates, labels, max(1, args.repeat), args.threshold, args.cold)
+    print_report(frames, latencies, confusion, traced_peak, labels is not None)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(1)
@@ -0,0 +1,59 @@
+"""
+HUD 锚点截取
+
+进场加载的就绪检测（utils/readiness.py）以战斗 HUD 上的摇杆、大招按钮为锚点。
+在设备已进入战斗、HUD 完整显示且没有弹窗遮挡时运行本工具，按基础分辨率下的固定区域截取锚点，
+缩放回基础分辨率尺寸后保存到 templates/hud/<名称>.png；之后脚本的加载等待即可提前结束。
+
+用法：
+    python capture_hud.py
+    python capture_hud.py --device emulator-5554 --names joystick
+"""
+import argparse
+import os
+import sys
+
+import cv2
+
+from utils import tools
+from utils.readiness import HUD_ANCHORS, anchor_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="截取战斗 HUD 锚点模板")
+    parser.add_argument("--device", help="设备 ID（不传时取第一台设备）")
+    parser.add_argument("--names", nargs="+", default=list(HUD_ANCHORS), choices=list(HUD_ANCHORS),
+                        help="要截取的锚点")
+    args = parser.parse_args()
+
+    connector = tools.ensure_adb_connection()
+    device_id = args.device or (tools.list_devices(connector) or [None])[0]
+    if device_id is None:
+        raise SystemExit("错误: 没有可用的设备")
+    tools.init_resolution(connector, device_id)
+
+    raw = tools.grab_screen(connector, device_id)
+    screen = tools.ImageMatcher.to_bgr(raw) if raw is not None else None
+    if screen is None:
+        raise SystemExit("错误: 截图失败")
+
+    for name in args.names:
+        base_region = HUD_ANCHORS[name]
+        x1, y1, x2, y2 = tools.adapt_region(base_region, device_id)
+        crop = screen[y1:y2, x1:x2]
+        if crop.size == 0:
+            print(f"跳过 {name}: 区域超出截图范围")
+            continue
+        size = (base_region[2] - base_region[0], base_region[3] - base_region[1])
+        crop = cv2.resize(crop, size, interpolation=cv2.INTER_AREA)
+        path = os.path.join(tools.BASE_DIR, anchor_path(name))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        cv2.imwrite(path, crop)
+        print(f"已保存 {name}: {path} ({size[0]}x{size[1]})")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(1)
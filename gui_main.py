@@ -4,7 +4,7 @@ import importlib.util
 import os
 import subprocess
 import json
-from PyQt6.QtCore import Qt, QThread, pyqtSignal, QObject, pyqtSlot
+from PyQt6.QtCore import Qt, QThread, QTimer, pyqtSignal, QObject, pyqtSlot
 from PyQt6.QtWidgets import (
     QHBoxLayout, QVBoxLayout, QWidget, QApplication,
     QTableWidgetItem, QHeaderView
@@ -14,7 +14,7 @@ from qfluentwidgets import (
     FluentWindow, SubtitleLabel, BodyLabel, ComboBox, PrimaryPushButton,
     PushButton, TextEdit, CardWidget, FluentIcon as FIF, InfoBar,
     InfoBarPosition, ProgressBar, NavigationItemPosition, ScrollArea,
-    TableWidget, LineEdit, SwitchButton, PasswordLineEdit, MessageBox, SettingCard,
+    TableWidget, LineEdit, SwitchButton, PasswordLineEdit, MessageBox, SettingCard, CheckBox,
 )
 
 
@@ -83,39 +83,42 @@ class Worker(QThread):
         file_name = os.path.basename(self.script_path)
         print(f"=== 正在启动脚本: {file_name} ===")
 
+        # 需要 OCR 的脚本在连接设备的同时后台预热模型（已加载过则直接复用）
+        try:
+            import utils.ocr
+            if utils.ocr.script_uses_ocr(self.script_path):
+                utils.ocr.warm_up_ocr()
+        except Exception as e:
+            print(f"⚠️ OCR 预热异常: {e}")
+
         try:
             connector = ADBConnector()
             utils.tools.init_resolution(connector, self.device_id)
         except Exception as e:
             print(f"⚠️ 动态分辨率初始化异常: {e}")
 
-        original_sleep = time.sleep
-
-        def interruptible_sleep(seconds):
-            end_time = time.time() + seconds
-            while time.time() < end_time:
-                if hasattr(utils.tools, 'check_running'):
-                    utils.tools.check_running()
-                left = end_time - time.time()
-                original_sleep(min(0.1, max(0, left)))
-
-        time.sleep = interruptible_sleep
+        try:
+            count = utils.tools.template_registry.preload(os.path.join(PROJECT_ROOT, "templates"))
+            print(f"✅ 已预加载 {count} 个模板")
+        except Exception as e:
+            print(f"⚠️ 模板预加载异常: {e}")
 
+        mod_name = f"script_{int(time.time())}"
         try:
-            mod_name = f"script_{int(time.time())}"
-            spec = importlib.util.spec_from_file_location(mod_name, self.script_path)
-            module = importlib.util.module_from_spec(spec)
-            sys.modules[mod_name] = module
-
-            os.chdir(PROJECT_ROOT)
-            spec.loader.exec_module(module)
-
-            if hasattr(module, 'run'):
-                module.run(self.device_id)
-            elif hasattr(module, 'main'):
-                module.main()
-            else:
-                print(f"错误: {file_name} 中未找到 run(device_id) 或 main() 函数")
+            with utils.tools.interruptible_time_sleep():
+                spec = importlib.util.spec_from_file_location(mod_name, self.script_path)
+                module = importlib.util.module_from_spec(spec)
+                sys.modules[mod_name] = module
+
+                os.chdir(PROJECT_ROOT)
+                spec.loader.exec_module(module)
+
+                if hasattr(module, 'run'):
+                    module.run(self.device_id)
+                elif hasattr(module, 'main'):
+                    module.main()
+                else:
+                    print(f"错误: {file_name} 中未找到 run(device_id) 或 main() 函数")
         except StopScriptException:
             print(">>> 🛑 脚本已成功停止")
         except Exception as e:
@@ -123,13 +126,60 @@ class Worker(QThread):
             print(f"❌ 运行出错: {e}\n{traceback.format_exc()}")
             self.error_signal.emit(str(e))
         finally:
-            time.sleep = original_sleep
+            # 不再保留已结束的脚本模块，避免每次启动累积一份模块副本
+            sys.modules.pop(mod_name, None)
             self.finished_signal.emit()
 
     def stop(self):
         set_running_state(False)
 
 
+class ProcessWorker(QThread):
+    """子进程运行模式：脚本在独立进程中执行，本线程只负责转发其状态与日志"""
+    finished_signal = pyqtSignal()
+    error_signal = pyqtSignal(str)
+    status_signal = pyqtSignal(object, str, object)
+    log_signal = pyqtSignal(str)
+
+    def __init__(self, script_path, device_id):
+        super().__init__()
+        self.script_path = script_path
+        self.device_id = device_id
+        self.process = None
+
+    def run(self):
+        from utils.process_runner import ScriptProcess
+        try:
+            self.process = ScriptProcess(self.script_path, self.device_id, PROJECT_ROOT).start()
+        except Exception as e:
+            self.error_signal.emit(str(e))
+            self.finished_signal.emit()
+            return
+
+        finished = False
+        while not finished:
+            messages = self.process.poll(timeout=0.2)
+            for msg in messages:
+                kind = msg[0]
+                if kind == "status":
+                    self.status_signal.emit(msg[1], msg[2], msg[3])
+                elif kind == "log":
+                    self.log_signal.emit(msg[1])
+                elif kind == "finished":
+                    finished = True
+                    if msg[1] == "出错":
+                        self.error_signal.emit(msg[2] or "")
+            # 子进程异常崩溃时不会发送 finished
+            if not messages and not self.process.is_alive:
+                break
+        self.process.join(1)
+        self.finished_signal.emit()
+
+    def stop(self):
+        if self.process:
+            self.process.stop()
+
+
 class DeviceInfoWorker(QThread):
     info_signal = pyqtSignal(list)
 
@@ -173,6 +223,17 @@ class DeviceInfoWorker(QThread):
             self.info_signal.emit(data)
 
 
+class DeviceListWorker(QThread):
+    devices_signal = pyqtSignal(list)
+
+    def run(self):
+        try:
+            devs = ADBConnector().list_devices()
+        except Exception:
+            devs = []
+        self.devices_signal.emit(devs)
+
+
 class ScanWifiWorker(QThread):
     scan_finished = pyqtSignal(list)
 
@@ -420,7 +481,12 @@ class HomeInterface(QWidget):
         self.statusTable.setItem(1, 0, QTableWidgetItem("- 次"))
         self.statusTable.setItem(2, 0, QTableWidgetItem("准备中..."))
 
-        self.worker = Worker(script_path, device)
+        if APP_CONFIG and APP_CONFIG.get("run_mode", "thread") == "process":
+            self.worker = ProcessWorker(script_path, device)
+            self.worker.status_signal.connect(self.on_status_updated)
+            if hasattr(main_win, 'logInterface'): self.worker.log_signal.connect(main_win.logInterface.append_log)
+        else:
+            self.worker = Worker(script_path, device)
         self.worker.finished_signal.connect(self.on_finished)
         self.worker.error_signal.connect(lambda e: self.show_info("出错", "请查看侧边栏日志", True))
         self.worker.start()
@@ -531,6 +597,233 @@ class HomeInterface(QWidget):
         super().closeEvent(event)
 
 
+# ============================================
+# 4.1 多设备并行页 (FleetInterface)
+# ============================================
+class FleetSignals(QObject):
+    """把设备线程里的回调转发到 GUI 主线程"""
+    status = pyqtSignal(str, int, str)
+    log = pyqtSignal(str)
+    finished = pyqtSignal(str, str)
+
+
+class FleetInterface(QWidget):
+    COLUMNS = ['设备', '状态', '当前轮次', '已完成', '每小时轮次', '当前操作步骤']
+
+    def __init__(self, parent=None):
+        super().__init__(parent=parent)
+        self.setObjectName('fleetInterface')
+        self.runner = None
+        self.device_checks = {}
+        self.row_of = {}
+        self.device_worker = None
+        self.devices_loaded = False
+
+        self.signals = FleetSignals()
+        self.signals.status.connect(self.on_status_updated)
+        self.signals.finished.connect(self.on_device_finished)
+
+        # 吞吐量按秒刷新，不依赖脚本上报频率
+        self.refreshTimer = QTimer(self)
+        self.refreshTimer.setInterval(1000)
+        self.refreshTimer.timeout.connect(self.refresh_stats)
+
+        self.init_ui()
+
+    def showEvent(self, event):
+        # 首次切到本页时才在后台查询设备，避免启动时同步执行 adb devices
+        super().showEvent(event)
+        if not self.devices_loaded:
+            self.devices_loaded = True
+            self.refresh_devices()
+
+    def init_ui(self):
+        self.vBoxLayout = QVBoxLayout(self)
+        self.vBoxLayout.setContentsMargins(30, 30, 30, 30)
+        self.vBoxLayout.setSpacing(20)
+
+        self.titleLabel = SubtitleLabel('多设备并行', self)
+        self.titleLabel.setFont(QFont("Microsoft YaHei", 18, QFont.Weight.Bold))
+        self.vBoxLayout.addWidget(self.titleLabel)
+
+        # --- 设备勾选卡片 ---
+        self.deviceCard = CardWidget(self)
+        self.deviceLayout = QVBoxLayout(self.deviceCard)
+        self.deviceLayout.setContentsMargins(16, 12, 16, 12)
+        self.deviceLayout.setSpacing(8)
+        head = QHBoxLayout()
+        self.btn_refresh = PushButton("刷新设备", self)
+        self.btn_refresh.setIcon(FIF.SYNC)
+        self.btn_refresh.clicked.connect(self.refresh_devices)
+        head.addWidget(BodyLabel("参与设备", self))
+        head.addStretch(1)
+        head.addWidget(self.btn_refresh)
+        self.deviceLayout.addLayout(head)
+        self.checkLayout = QHBoxLayout()
+        self.deviceLayout.addLayout(self.checkLayout)
+        self.vBoxLayout.addWidget(self.deviceCard)
+
+        # --- 脚本与控制按钮 ---
+        self.scriptCard = CardWidget(self)
+        layout_s = QHBoxLayout(self.scriptCard)
+        layout_s.setContentsMargins(16, 12, 16, 12)
+        layout_s.setSpacing(10)
+        self.scriptCombo = ComboBox(self)
+        self.startBtn = PrimaryPushButton("全部开始", self)
+        self.startBtn.setIcon(FIF.PLAY)
+        self.startBtn.clicked.connect(self.start_fleet)
+        self.stopSelectedBtn = PushButton("停止选中设备", self)
+        self.stopSelectedBtn.setIcon(FIF.PAUSE)
+        self.stopSelectedBtn.setEnabled(False)
+        self.stopSelectedBtn.clicked.connect(self.stop_selected)
+        self.stopBtn = PushButton("全部停止", self)
+        self.stopBtn.setIcon(FIF.CLOSE)
+        self.stopBtn.setEnabled(False)
+        self.stopBtn.clicked.connect(self.stop_fleet)
+        layout_s.addWidget(BodyLabel("脚本", self))
+        layout_s.addWidget(self.scriptCombo, 1)
+        layout_s.addWidget(self.startBtn)
+        layout_s.addWidget(self.stopSelectedBtn)
+        layout_s.addWidget(self.stopBtn)
+        self.vBoxLayout.addWidget(self.scriptCard)
+
+        self.tableTitleLabel = BodyLabel('📊 各设备运行状态与吞吐量', self)
+        self.tableTitleLabel.setFont(QFont("Microsoft YaHei", 10, QFont.Weight.Bold))
+        self.vBoxLayout.addWidget(self.tableTitleLabel)
+
+        self.fleetTable = TableWidget(self)
+        self.fleetTable.setBorderVisible(True)
+        self.fleetTable.setBorderRadius(8)
+        self.fleetTable.setColumnCount(len(self.COLUMNS))
+        self.fleetTable.setHorizontalHeaderLabels(self.COLUMNS)
+        self.fleetTable.verticalHeader().hide()
+        self.fleetTable.setSelectionBehavior(TableWidget.SelectionBehavior.SelectRows)
+        self.fleetTable.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        self.fleetTable.horizontalHeader().setSectionResizeMode(len(self.COLUMNS) - 1, QHeaderView.ResizeMode.Stretch)
+        self.vBoxLayout.addWidget(self.fleetTable, 1)
+
+    def refresh_devices(self):
+        if not ADBConnector: return
+        if self.device_worker is not None and self.device_worker.isRunning(): return
+        self.btn_refresh.setEnabled(False)
+        self.device_worker = DeviceListWorker()
+        self.device_worker.devices_signal.connect(self.on_devices_listed)
+        self.device_worker.start()
+
+    def on_devices_listed(self, devs):
+        self.btn_refresh.setEnabled(not (self.runner and self.runner.is_running))
+        for check in self.device_checks.values():
+            self.checkLayout.removeWidget(check)
+            check.deleteLater()
+        self.device_checks = {}
+        for dev in devs:
+            check = CheckBox(dev, self.deviceCard)
+            check.setChecked(True)
+            self.checkLayout.addWidget(check)
+            self.device_checks[dev] = check
+        if not devs:
+            self.show_info("提示", "未检测到设备", True)
+
+    def set_scripts(self, script_map):
+        """与控制台共用同一份脚本列表"""
+        self.script_map = dict(script_map)
+        self.scriptCombo.clear()
+        if self.script_map:
+            self.scriptCombo.addItems(list(self.script_map.keys()))
+            self.scriptCombo.setCurrentIndex(0)
+
+    def start_fleet(self):
+        devices = [dev for dev, check in self.device_checks.items() if check.isChecked()]
+        if not devices:
+            self.show_info("错误", "请至少勾选一台设备", True); return
+        script_path = getattr(self, "script_map", {}).get(self.scriptCombo.currentText())
+        if not script_path:
+            self.show_info("错误", "请选择有效的脚本", True); return
+
+        from utils.fleet import FleetRunner
+        self.runner = FleetRunner(
+            script_path, devices,
+            on_status=lambda dev, rnd, step, total: self.signals.status.emit(dev, int(rnd), step),
+            on_log=lambda dev, text: self.signals.log.emit(f"[{dev}] {text}"),
+            on_finished=lambda dev, state: self.signals.finished.emit(dev, state),
+        )
+
+        self.fleetTable.setRowCount(len(devices))
+        self.row_of = {}
+        for row, dev in enumerate(devices):
+            self.row_of[dev] = row
+            for col, text in enumerate([dev, "启动中", "-", "0", "0.00", "准备中..."]):
+                self.fleetTable.setItem(row, col, QTableWidgetItem(text))
+
+        try:
+            self.runner.start()
+        except Exception as e:
+            self.show_info("错误", str(e), True); return
+        self.toggle_ui(True)
+        self.refreshTimer.start()
+
+    def stop_selected(self):
+        if not self.runner: return
+        rows = {index.row() for index in self.fleetTable.selectionModel().selectedRows()}
+        for dev, row in self.row_of.items():
+            if row in rows:
+                self.runner.stop(dev)
+        self.refresh_stats()
+
+    def stop_fleet(self):
+        if self.runner:
+            self.stopBtn.setText("停止中...")
+            self.stopBtn.setEnabled(False)
+            self.runner.stop()
+
+    def on_status_updated(self, device_id, current_round, step_desc):
+        row = self.row_of.get(device_id)
+        if row is None: return
+        self.fleetTable.setItem(row, 2, QTableWidgetItem(f"第 {current_round} 轮"))
+        step_item = QTableWidgetItem(step_desc)
+        if "✅" in step_desc or "成功" in step_desc:
+            step_item.setForeground(Qt.GlobalColor.darkGreen)
+        elif "❌" in step_desc or "错误" in step_desc:
+            step_item.setForeground(Qt.GlobalColor.red)
+        self.fleetTable.setItem(row, 5, step_item)
+
+    def refresh_stats(self):
+        if not self.runner: return
+        for stat in self.runner.stats():
+            row = self.row_of.get(stat["device_id"])
+            if row is None: continue
+            self.fleetTable.setItem(row, 1, QTableWidgetItem(stat["state"]))
+            self.fleetTable.setItem(row, 3, QTableWidgetItem(str(stat["rounds_done"])))
+            self.fleetTable.setItem(row, 4, QTableWidgetItem(f"{stat['rounds_per_hour']:.2f}"))
+
+    def on_device_finished(self, device_id, state):
+        self.refresh_stats()
+        if state == "出错":
+            self.show_info("出错", f"{device_id} 运行出错，请查看详细日志", True)
+        if self.runner and not self.runner.is_running:
+            self.refreshTimer.stop()
+            self.toggle_ui(False)
+            self.stopBtn.setText("全部停止")
+            self.show_info("结束", "全部设备已停止")
+
+    def toggle_ui(self, running):
+        self.startBtn.setEnabled(not running)
+        self.stopBtn.setEnabled(running)
+        self.stopSelectedBtn.setEnabled(running)
+        self.btn_refresh.setEnabled(not running)
+        self.scriptCombo.setEnabled(not running)
+        for check in self.device_checks.values():
+            check.setEnabled(not running)
+
+    def show_info(self, title, content, is_error=False):
+        func = InfoBar.error if is_error else InfoBar.success
+        func(title=title, content=content, position=InfoBarPosition.TOP_RIGHT, parent=self, duration=2000)
+
+    def closeEvent(self, event):
+        if self.runner: self.runner.stop()
+        super().closeEvent(event)
+
+
 # ============================================
 # 5. 设置页面与其它设置页面基本类
 # ============================================
@@ -748,6 +1041,20 @@ class OtherSettingInterface(ScrollArea):
         self.emailCard.viewLayout.addWidget(self.emailConfigWidget);
         self.vBoxLayout.addWidget(self.emailCard)
 
+        self.runModeCard = SettingCard(FIF.APPLICATION, "独立进程运行",
+                                       "脚本在子进程中运行，识别计算不再拖慢界面；停止时先通知脚本退出，超时强制结束",
+                                       self.scrollWidget)
+        self.runModeSwitch = SwitchButton();
+        self.runModeSwitch.setOnText("已开启");
+        self.runModeSwitch.setOffText("已关闭")
+        if APP_CONFIG: self.runModeSwitch.setChecked(APP_CONFIG.get("run_mode", "thread") == "process")
+        self.runModeSwitch.checkedChanged.connect(
+            lambda checked: APP_CONFIG.set("run_mode", "process" if checked else "thread") if APP_CONFIG else None)
+        self.runModeCard.hBoxLayout.addStretch(1);
+        self.runModeCard.hBoxLayout.addWidget(self.runModeSwitch);
+        self.runModeCard.hBoxLayout.addSpacing(15)
+        self.vBoxLayout.addWidget(self.runModeCard)
+
         self.reloadUtilsCard = SettingCard(FIF.SYNC, "开发与调试",
                                            "重新加载 utils.tools 和 utils.scripts 模块，修改底层代码后无需重启即可生效",
                                            self.scrollWidget)
@@ -863,6 +1170,12 @@ class MainWindow(FluentWindow):
         self.homeInterface.setObjectName('homeInterface')
         self.addSubInterface(self.homeInterface, FIF.HOME, '控制台')
 
+        # 1.1 多设备并行页 (靠顶部)，脚本列表与控制台共用
+        self.fleetInterface = FleetInterface(self)
+        self.fleetInterface.setObjectName('fleetInterface')
+        self.fleetInterface.set_scripts(self.homeInterface.script_map)
+        self.addSubInterface(self.fleetInterface, FIF.APPLICATION, '多设备')
+
         # 2. 其他设置页面 (靠顶部)
         self.otherSettingInterface = OtherSettingInterface(self)
         self.otherSettingInterface.setObjectName('otherSettingInterface')
@@ -879,6 +1192,7 @@ class MainWindow(FluentWindow):
         # 对系统标准的 print 劫持，加入详细日志面板
         self.emitting_stream = EmittingStream()
         self.emitting_stream.textWritten.connect(self.logInterface.append_log)
+        self.fleetInterface.signals.log.connect(self.logInterface.append_log)
         sys.stdout = self.emitting_stream
 
         # 锁定日志面板在“设置”上方 (NavigationItemPosition.BOTTOM)
@@ -897,12 +1211,16 @@ class MainWindow(FluentWindow):
         w.cancelButton.setText('取消')
         if w.exec():
             sys.stdout = self.original_stdout  # 关闭前恢复系统标准流
+            if self.fleetInterface.runner: self.fleetInterface.runner.stop()  # 并行设备不受全局停止标志影响，需单独停止
             event.accept()
         else:
             event.ignore()
 
 
 if __name__ == '__main__':
+    # 子进程运行模式在打包后的 exe 中需要
+    import multiprocessing
+    multiprocessing.freeze_support()
     if hasattr(Qt.HighDpiScaleFactorRoundingPolicy, 'PassThrough'):
         QApplication.setHighDpiScaleFactorRoundingPolicy(Qt.HighDpiScaleFactorRoundingPolicy.PassThrough)
     app = QApplication(sys.argv)
@@ -0,0 +1,63 @@
+"""
+摇杆路线录制
+
+在设备上手动操作摇杆走一遍路线，从触摸屏事件（getevent）中提取摇杆拖动，切分为 方向/时长/走跑 的路线段，
+保存到 routes/<脚本名>.json，脚本中 load_route(__file__, 名称, default=...) 会优先使用录制的路线。
+- 只保留在摇杆中心附近按下的触点，技能按钮等其它点击会被忽略
+- 松开摇杆的间隔记为停顿段
+- 需要设备支持触摸注入的探测（读取触摸屏节点与坐标范围），不要求可写
+
+用法：
+    python record_route.py --script "scripts/65mod-扼守.py" --name entry --seconds 60
+    python record_route.py --device emulator-5554 --script "scripts/65mod-扼守.py" --name entry --dry-run
+"""
+import argparse
+import sys
+
+from utils import tools
+from utils.input_injector import TouchInjector
+from utils.routes import extract_route, format_route, parse_getevent_trace, record_touches, route_file, save_route
+
+
+def main():
+    parser = argparse.ArgumentParser(description="从设备触摸事件录制摇杆路线")
+    parser.add_argument("--device", help="设备 ID（不传时取第一台设备）")
+    parser.add_argument("--script", required=True, help="路线所属脚本，决定保存的路线文件")
+    parser.add_argument("--name", required=True, help="路线名称，如 entry")
+    parser.add_argument("--seconds", type=float, default=60, help="录制时长（秒），Ctrl+C 可提前结束")
+    parser.add_argument("--center", type=int, nargs=2, default=(450, 1440), help="摇杆中心（基础分辨率）")
+    parser.add_argument("--radius", type=int, default=150, help="摇杆半径（基础分辨率）")
+    parser.add_argument("--dry-run", action="store_true", help="只打印路线，不保存")
+    args = parser.parse_args()
+
+    connector = tools.ensure_adb_connection()
+    device_id = args.device or (tools.list_devices(connector) or [None])[0]
+    if device_id is None:
+        raise SystemExit("错误: 没有可用的设备")
+    tools.init_resolution(connector, device_id)
+
+    injector = TouchInjector(connector, device_id)
+    injector.probe()
+    if injector.device is None:
+        raise SystemExit("错误: 未找到触摸屏设备节点")
+    joystick = tools.JoystickController(connector, *args.center, args.radius, device_id=device_id)
+
+    print(f"开始录制 {args.seconds:g} 秒，请在设备上操作摇杆（Ctrl+C 提前结束）...")
+    lines = record_touches(connector, device_id, injector, args.seconds)
+    route = extract_route(parse_getevent_trace(lines, injector), joystick)
+    if not route:
+        raise SystemExit("错误: 未录制到摇杆移动")
+
+    total = sum(leg.duration for leg in route)
+    print(f"\n路线 {len(route)} 段，共 {total:.1f} 秒：")
+    print(f"  {format_route(route)}")
+    if not args.dry_run:
+        save_route(args.script, args.name, route)
+        print(f"已保存到 {route_file(args.script)} 的 \"{args.name}\"")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(1)
@@ -1,12 +1,8 @@
-import cv2
-import sys
 import time
-from datetime import datetime
-from utils.tools import (
-    ensure_adb_connection, list_devices, click, wait_until_match,
-    JoystickController, StopScriptException, TimeoutException, status_notifier
-)
+from utils.tools import click
 from utils.scripts import fuwei, ult, timeout
+from utils.routes import load_route, play_route
+from utils.state_machine import StateMachine, State, on, goto, click_at
 import utils.notification as notification
 
 # --- 配置区：集中管理坐标和模板路径 ---
@@ -25,125 +21,56 @@ COORDS = {
 # 技能/摇杆参数
 JOYSTICK_CENTER = (450, 1440)  # 摇杆中心点
 
+# 入场跑位路线（可用 record_route.py 录制覆盖，保存于 routes/65mod-扼守.json 的 "entry"）
+ENTRY_ROUTE = "w:3.5 a:8.5 w:6.5 a:22"
 
-def combat_prep(connector, device, joystick, run_count, total_round):
+
+def combat_prep(ctx):
     """封装：确认选择 -> 进场 -> 移动 -> 开大"""
-    status_notifier.update(run_count, "正在确认选择...", total_round)
-    click(*COORDS["confirm_btn"], connector, device)
+    ctx.status("正在确认选择...")
+    click(*COORDS["confirm_btn"], ctx.connector, ctx.device_id)
 
-    status_notifier.update(run_count, "正在等待加载中 (20s)...", total_round)
-    time.sleep(20)
+    ctx.status("正在等待加载中 (≤20s)...")
+    ctx.wait_ready(20)
 
-    status_notifier.update(run_count, "正在执行入场移动跑位...", total_round)
-    joystick.move('w', 3.5)
-    joystick.move('a', 8.5)
-    joystick.move('w', 6.5)
-    joystick.move('a', 22)
+    ctx.status("正在执行入场移动跑位...")
+    play_route(ctx.joystick, load_route(__file__, "entry", default=ENTRY_ROUTE))
 
-    status_notifier.update(run_count, "技能就绪，释放大招...", total_round)
-    fuwei(connector, device)
+    ctx.status("技能就绪，释放大招...")
+    fuwei(ctx.connector, ctx.device_id)
     time.sleep(1)
-    ult(connector, device)
+    ult(ctx.connector, ctx.device_id)
+
+
+def retry_after_timeout(ctx):
+    timeout(ctx.connector, ctx.device_id)
+    time.sleep(2)
+
+
+def give_up(ctx):
+    notification.send_failure("战斗连续超时，已停止。")
+
+
+MACHINE = StateMachine(TEMPLATES, [
+    # 1. 初始状态检测与分流
+    State("probe", status="正在检查设备初始状态...", timeout=5, on_timeout="monitor", transitions=[
+        on("start", "prep", click_at(COORDS["start_btn"])),
+        on("restart", "prep", click_at(COORDS["restart_btn"], delay=1)),
+    ]),
+    State("monitor", status="监控中：直接进入结算监控...", transitions=[goto("fight")]),
+    State("prep", action=combat_prep, transitions=[goto("fight")]),
+    # 2. 主逻辑循环：超时后执行一次超时重试，连续两次等待仍未结算则终止
+    State("fight", status="⚔️ 战斗进行中，等待结算...", timeout=300, retries=1, on_retry=retry_after_timeout,
+          on_timeout="failed", transitions=[on("restart", "restart")]),
+    State("restart", round_end=True, status="点击重开，准备下一轮...",
+          action=click_at(COORDS["restart_btn"], delay=1), transitions=[goto("prep")]),
+    State("failed", status="❌ 连续超时且重试失败，脚本已终止", action=give_up),
+], joystick=(*JOYSTICK_CENTER, 150))
 
 
 def run(device_id=None):
-    run_count = 1
-    total_round = "∞"
-
-    try:
-        connector = ensure_adb_connection()
-        if device_id:
-            dev = device_id
-        else:
-            devices = list_devices(connector)
-            if not devices: return
-            dev = devices[0]
-
-        joystick = JoystickController(
-            connector=connector,
-            center_x=JOYSTICK_CENTER[0],
-            center_y=JOYSTICK_CENTER[1],
-            radius=150,
-            device_id=dev
-        )
-
-        # 1. 初始状态检测与分流
-        status_notifier.update(run_count, "正在检查设备初始状态...", total_round)
-        res_start = wait_until_match(dev, connector, TEMPLATES["start"], timeout=5, raise_err=False)
-
-        if res_start:
-            status_notifier.update(run_count, "点击开始按钮...", total_round)
-            click(*COORDS["start_btn"], connector, dev)
-            combat_prep(connector, dev, joystick, run_count, total_round)
-        else:
-            res_restart = wait_until_match(dev, connector, TEMPLATES["restart"], timeout=5, raise_err=False)
-            if res_restart:
-                status_notifier.update(run_count, "点击再次挑战...", total_round)
-                click(*COORDS["restart_btn"], connector, dev)
-                time.sleep(1)
-                combat_prep(connector, dev, joystick, run_count, total_round)
-            else:
-                status_notifier.update(run_count, "监控中：直接进入结算监控...", total_round)
-
-        # 2. 主逻辑循环
-        while True:
-            retry_limit = 2
-            retry_count = 0
-            found_restart = False
-
-            while retry_count < retry_limit:
-                try:
-                    status_notifier.update(run_count, "⚔️ 战斗进行中，等待结算...", total_round)
-                    wait_until_match(dev, connector, TEMPLATES["restart"], timeout=300, raise_err=True)
-                    found_restart = True
-                    break  # 匹配成功，跳出重试
-                except StopScriptException:
-                    raise StopScriptException  # 如果是手动停止抛出的超时，必须往上层抛
-                except Exception:
-                    retry_count += 1
-                    status_notifier.update(run_count, f"⚠️ 超时重试 ({retry_count}/{retry_limit})...", total_round)
-                    timeout(connector, dev)
-                    time.sleep(2)
-
-            if not found_restart:
-                status_notifier.update(run_count, "❌ 连续超时且重试失败，脚本已终止", total_round)
-                notification.send_failure("战斗连续超时，已停止。")
-                break
-
-            print(f"===== 第 {run_count} 次运行完成 ===== || {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-
-            run_count += 1
-            status_notifier.update(run_count, "点击重开，准备下一轮...", total_round)
-            click(*COORDS["restart_btn"], connector, dev)
-            time.sleep(1)
-            combat_prep(connector, dev, joystick, run_count, total_round)
-
-    except StopScriptException:
-        status_notifier.update(run_count, "🛑 脚本已成功停止", total_round)
-        print("\n[系统提示] 用户手动停止脚本，任务安全终止。")
-
-    except TimeoutException as e:
-        error_msg = f"运行出错: {e}"
-        status_notifier.update(run_count, "❌ 等待超时 / 发生异常", total_round)
-        print(f"\n❌ {error_msg}")
-        try:
-            notification.send_failure(error_msg)
-        except Exception:
-            pass
-
-    except KeyboardInterrupt:
-        print("\n脚本已手动停止。")
-    except Exception as e:
-        error_msg = f"未知错误: {e}"
-        status_notifier.update(run_count, "❌ 脚本遭遇未知错误", total_round)
-        print(f"\n❌ {error_msg}")
-        try:
-            notification.send_failure(error_msg)
-        except Exception:
-            pass
-    finally:
-        cv2.destroyAllWindows()
+    MACHINE.run(device_id)
 
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    run()
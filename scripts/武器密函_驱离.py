@@ -1,19 +1,10 @@
-import cv2
-import sys
 import time
-import re
-from datetime import datetime
-import numpy as np
-import easyocr
-from utils.tools import (
-    ADBConnector, JoystickController, click, wait_until_match, adapt_coord,
-    StopScriptException, TimeoutException, status_notifier
-)
-import utils.notification as notification
-
-# 初始化 OCR 模型
-print("正在加载 OCR 模型...")
-reader = easyocr.Reader(['ch_sim', 'en'])
+from utils.tools import ImageMatcher, click, grab_screen
+from utils.state_machine import StateMachine, State, on, goto, click_at
+from utils.ocr import get_digit_reader, warm_up_ocr
+
+# OCR 模型为进程级共享服务：此处只触发后台预热，脚本重启不会重复加载
+warm_up_ocr()
 
 # --- 配置区：集中管理坐标和路径 ---
 TEMPLATES = {
@@ -41,29 +32,35 @@ CROP_REGIONS = [
 ]
 
 
-def combat_prep(connector, device, joystick, run_count, total_round):
+def combat_prep(ctx):
     """封装：选密函 -> 进场 -> 移动 -> 开大"""
-    status_notifier.update(run_count, "正在自动选择底层首选项...", total_round)
-    click(*COORDS["secret_1"], connector, device, show_log=False)
+    ctx.status("正在自动选择底层首选项...")
+    click(*COORDS["secret_1"], ctx.connector, ctx.device_id, show_log=False)
     time.sleep(0.5)
-    click(*COORDS["confirm_sel"], connector, device, show_log=False)
+    click(*COORDS["confirm_sel"], ctx.connector, ctx.device_id, show_log=False)
+
+    ctx.status("正在等待加载中 (≤15s)...")
+    ctx.wait_ready(15)
+
+    ctx.status("执行大段冲刺跑位...")
+    ctx.joystick.move('w', 18)
+    click(*COORDS["ult_pos"], ctx.connector, ctx.device_id, show_log=False)
 
-    status_notifier.update(run_count, "正在等待加载中 (15s)...", total_round)
-    time.sleep(15)
 
-    status_notifier.update(run_count, "执行大段冲刺跑位...", total_round)
-    joystick.move('w', 18)
-    click(*COORDS["ult_pos"], connector, device, show_log=False)
+def convert_regions(ctx):
+    """分辨率上下文只取一次，识别区域在启动时整体换算为设备像素"""
+    ctx.crop_regions = ctx.device_ctx.convert_table(CROP_REGIONS) if ctx.device_ctx else CROP_REGIONS
 
 
-def select_min_owned_reward(connector, dev, run_count, total_round):
-    """截屏并使用 OCR 识别持有数最少的密函，然后点击"""
-    status_notifier.update(run_count, "🔍 正在进行高级 OCR 密函持有数比对...", total_round)
+def select_min_owned_reward(ctx):
+    """截屏并使用 OCR 识别持有数最少的密函，然后点击（ctx.crop_regions 为已换算好的设备像素区域）"""
+    ctx.status("🔍 正在进行高级 OCR 密函持有数比对...")
 
     try:
-        raw_data = connector.get_screen_raw(dev)
-        if not raw_data: raise RuntimeError("获取截图数据为空")
-        screen = cv2.imdecode(np.frombuffer(raw_data, np.uint8), cv2.IMREAD_COLOR)
+        # 帧源运行时直接复用最新帧，不再单独截图
+        raw_screen = grab_screen(ctx.connector, ctx.device_id)
+        if raw_screen is None: raise RuntimeError("获取截图数据为空")
+        screen = ImageMatcher.to_bgr(raw_screen)
         if screen is None: raise RuntimeError("截图数据解码失败")
     except Exception as e:
         raise RuntimeError(f"截屏环节发生严重错误: {e}")
@@ -73,114 +70,54 @@ def select_min_owned_reward(connector, dev, run_count, total_round):
     min_idx = 0
     cards_coords = [COORDS["card_1"], COORDS["card_2"], COORDS["card_3"]]
 
-    for i, (base_x1, base_y1, base_x2, base_y2) in enumerate(CROP_REGIONS):
-        try:
-            real_x1, real_y1 = adapt_coord(base_x1, base_y1)
-            real_x2, real_y2 = adapt_coord(base_x2, base_y2)
-
-            start_y, end_y = max(0, min(real_y1, real_y2)), max(0, min(real_max := max(real_y1, real_y2), screen_h))
-            start_x, end_x = max(0, min(real_x1, real_x2)), max(0, min(real_max2 := max(real_x1, real_x2), screen_w))
-
-            crop_img = screen[start_y:end_y, start_x:end_x]
-            if crop_img.size == 0: continue
-
-            result = reader.readtext(crop_img, detail=0)
-            text = "".join(result)
-            nums = re.findall(r'\d+', text)
-            if nums:
-                val = int(nums[-1])
-                print(f"      - 卡片 {i + 1} 识别数量: {val}")
-                if val < min_val:
-                    min_val = val
-                    min_idx = i
-        except Exception as e:
-            print(f"      - 卡片 {i + 1} 识别出错: {e}")
+    crops = []
+    for real_x1, real_y1, real_x2, real_y2 in ctx.crop_regions:
+        start_y, end_y = max(0, min(real_y1, real_y2)), max(0, min(max(real_y1, real_y2), screen_h))
+        start_x, end_x = max(0, min(real_x1, real_x2)), max(0, min(max(real_x1, real_x2), screen_w))
+        crops.append(screen[start_y:end_y, start_x:end_x])
+
+    # 三张卡片一次推理完成，未变化的卡片直接命中缓存
+    try:
+        values = get_digit_reader().read_digits(crops)
+    except Exception as e:
+        print(f"      - 卡片识别出错: {e}")
+        values = [None] * len(crops)
+
+    for i, val in enumerate(values):
+        if val is None: continue
+        print(f"      - 卡片 {i + 1} 识别数量: {val}")
+        if val < min_val:
+            min_val = val
+            min_idx = i
 
     print(f"    -> 智能判定选择卡片 {min_idx + 1}")
-    click(*cards_coords[min_idx], connector, dev, show_log=False)
+    click(*cards_coords[min_idx], ctx.connector, ctx.device_id, show_log=False)
     time.sleep(0.5)
 
 
-def run(device_id=None):
-    run_count = 1
-    total_round = "∞"
+MACHINE = StateMachine(TEMPLATES, [
+    # 1. 初始检测进入
+    State("probe", status="正在检查设备初始状态...", timeout=5, on_timeout="monitor", transitions=[
+        on("start", "prep", click_at(COORDS["start_btn"], show_log=False)),
+        on("restart", "prep", click_at(COORDS["restart_btn"], delay=1, show_log=False)),
+    ]),
+    State("monitor", status="监控中：直接进入战斗...", transitions=[goto("fight")]),
+    State("prep", action=combat_prep, transitions=[goto("fight")]),
+    # 2. 主逻辑循环：等待结算 -> 动态识别并点击 -> 结算确认 -> 等待再次挑战 -> 重开
+    State("fight", status="⚔️ 战斗进行中，等待结算...", timeout=300, transitions=[on("confirm", "reward")]),
+    State("reward", action=select_min_owned_reward, transitions=[goto("settle")]),
+    State("settle", status="✅ 识别完成，执行结算确认",
+          action=click_at(COORDS["confirm_btn"], delay=3, show_log=False, settle=True),
+          transitions=[goto("await_restart")]),
+    State("await_restart", status="正在等待再次挑战按钮...", timeout=30, transitions=[on("restart", "restart")]),
+    State("restart", round_end=True, status="点击重开，准备下一轮...",
+          action=click_at(COORDS["restart_btn"], delay=1, show_log=False), transitions=[goto("prep")]),
+], setup=convert_regions)
 
-    try:
-        connector = ADBConnector()
-        if device_id:
-            dev = device_id
-        else:
-            devices = connector.list_devices()
-            if not devices: return
-            dev = devices[0]
-
-        joystick = JoystickController(connector, 450, 1440, 150, dev)
-
-        # 1. 初始检测进入
-        status_notifier.update(run_count, "正在检查设备初始状态...", total_round)
-        res_start = wait_until_match(dev, connector, TEMPLATES["start"], timeout=5, raise_err=False)
-
-        if not res_start:
-            res_restart = wait_until_match(dev, connector, TEMPLATES["restart"], timeout=5, raise_err=False)
-        else:
-            res_restart = None
-
-        if res_start:
-            click(*COORDS["start_btn"], connector, dev, show_log=False)
-            combat_prep(connector, dev, joystick, run_count, total_round)
-        elif res_restart:
-            click(*COORDS["restart_btn"], connector, dev, show_log=False)
-            time.sleep(1)
-            combat_prep(connector, dev, joystick, run_count, total_round)
-        else:
-            status_notifier.update(run_count, "监控中：直接进入战斗...", total_round)
-
-        # 2. 主逻辑循环
-        while True:
-            status_notifier.update(run_count, "⚔️ 战斗进行中，等待结算...", total_round)
-            wait_until_match(dev, connector, TEMPLATES["confirm"], timeout=300, raise_err=True)
-
-            # 动态识别并点击
-            select_min_owned_reward(connector, dev, run_count, total_round)
-
-            status_notifier.update(run_count, "✅ 识别完成，执行结算确认", total_round)
-            click(*COORDS["confirm_btn"], connector, dev, show_log=False)
-            time.sleep(3)
-
-            status_notifier.update(run_count, "正在等待再次挑战按钮...", total_round)
-            wait_until_match(dev, connector, TEMPLATES["restart"], timeout=30, raise_err=True)
-
-            print(f"=== 第 {run_count} 轮 结束 || {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ===\n")
-
-            run_count += 1
-            status_notifier.update(run_count, "点击重开，准备下一轮...", total_round)
-            click(*COORDS["restart_btn"], connector, dev, show_log=False)
-            time.sleep(1)
-            combat_prep(connector, dev, joystick, run_count, total_round)
-
-    except StopScriptException:
-        status_notifier.update(run_count, "🛑 脚本已成功停止", total_round)
-        print("\n[系统提示] 用户手动停止脚本，任务安全终止。")
-
-    except TimeoutException as e:
-        error_msg = f"运行出错: {e}"
-        status_notifier.update(run_count, "❌ 等待超时 / 发生异常", total_round)
-        print(f"\n❌ {error_msg}")
-        try:
-            notification.send_failure(error_msg)
-        except Exception:
-            pass
-    except Exception as e:
-        error_msg = f"未知错误: {e}"
-        status_notifier.update(run_count, "❌ 脚本遭遇未知错误", total_round)
-        print(f"\n❌ {error_msg}")
-        try:
-            notification.send_failure(error_msg)
-        except Exception:
-            pass
-    finally:
-        cv2.destroyAllWindows()
+
+def run(device_id=None):
+    MACHINE.run(device_id)
 
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    run()
@@ -0,0 +1,483 @@
+# -*- coding: utf-8 -*-
+"""
+ADB 智能套接字（smart-socket）协议客户端
+
+直接通过 TCP 5037 与本机 adb server 通信，省去每条命令拉起一个 adb.exe 进程的开销。
+支持的服务：host:version / host:devices / host:transport / shell: / exec: / sync:
+"""
+import itertools
+import queue
+import socket
+import struct
+import subprocess
+import threading
+from typing import List, Optional, Dict
+
+ADB_SERVER_HOST = "127.0.0.1"
+ADB_SERVER_PORT = 5037
+
+# sync 协议单个 DATA 包的最大负载
+SYNC_DATA_MAX = 64 * 1024
+# shell 命令末尾追加的退出码标记：`<cmd>; echo <标记>$?`
+EXIT_MARKER = "__ADB_EXIT__"
+
+
+class AdbProtocolError(Exception):
+    """adb server 返回 FAIL 或协议帧格式异常"""
+    pass
+
+
+class AdbConnectionClosed(AdbProtocolError):
+    """对端在读取完成前关闭了连接"""
+    pass
+
+
+class AdbStreamInterrupted(AdbProtocolError):
+    """服务已在设备端打开后读取中断（超时或连接关闭）：命令可能已经执行，调用方不得换通道重发"""
+    pass
+
+
+class AdbCommandError(Exception):
+    """shell 命令在设备端以非零退出码结束（协议本身正常，不应回退重试）"""
+
+    def __init__(self, exit_code: int, output: bytes):
+        super().__init__(f"退出码 {exit_code}: {output.decode('utf-8', errors='replace').strip()}")
+        self.exit_code = exit_code
+        self.output = output
+
+
+# ============================================
+# 底层帧读写
+# ============================================
+def _read_exact(sock: socket.socket, size: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise AdbConnectionClosed(f"连接提前关闭（期望 {size} 字节，实际 {len(buf)} 字节）")
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def _read_until_close(sock: socket.socket) -> bytes:
+    chunks = []
+    while True:
+        chunk = sock.recv(256 * 1024)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def _send_request(sock: socket.socket, payload: str):
+    """smart-socket 请求格式：4 位十六进制长度 + 请求内容"""
+    data = payload.encode("utf-8")
+    sock.sendall(b"%04x" % len(data) + data)
+
+
+def _read_hex_block(sock: socket.socket) -> bytes:
+    length = int(_read_exact(sock, 4), 16)
+    return _read_exact(sock, length)
+
+
+def _read_status(sock: socket.socket):
+    status = _read_exact(sock, 4)
+    if status == b"OKAY":
+        return
+    if status == b"FAIL":
+        message = _read_hex_block(sock).decode("utf-8", errors="replace")
+        raise AdbProtocolError(message)
+    raise AdbProtocolError(f"未知的响应状态: {status!r}")
+
+
+# ============================================
+# 客户端
+# ============================================
+class AdbWireClient:
+    """
+    adb server 协议客户端（线程安全）
+    - 每个服务请求占用一条独立 TCP 连接（adb 协议规定连接在服务打开后即专用于该服务）
+    - 连接池预先建立空闲连接，取用时省去握手；每次取用后在后台补足，sync 会话按设备长期复用
+    """
+
+    def __init__(self, host: str = ADB_SERVER_HOST, port: int = ADB_SERVER_PORT,
+                 pool_size: int = 4, timeout: float = 30):
+        self.host = host
+        self.port = port
+        self.pool_size = pool_size
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._idle: List[socket.socket] = []
+        self._refilling = False
+        self._sync_sessions: Dict[str, List[socket.socket]] = {}
+
+    # --- 连接池 ---
+
+    def _connect(self) -> socket.socket:
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    def _acquire(self):
+        """返回 (套接字, 是否取自连接池)；取用后在后台补足连接池"""
+        with self._lock:
+            sock = self._idle.pop() if self._idle else None
+        self.refill()
+        if sock is not None:
+            return sock, True
+        return self._connect(), False
+
+    def prewarm(self, count: Optional[int] = None):
+        """预先建立空闲连接，供后续请求直接取用"""
+        count = self.pool_size if count is None else count
+        with self._lock:
+            missing = max(0, min(count, self.pool_size) - len(self._idle))
+        for _ in range(missing):
+            sock = self._connect()
+            with self._lock:
+                self._idle.append(sock)
+
+    def refill(self):
+        """在后台线程补足空闲连接（同一时间只有一个补充线程）；adb server 不可用时放弃，下次取用再试"""
+        with self._lock:
+            if self._refilling or len(self._idle) >= self.pool_size:
+                return
+            self._refilling = True
+
+        def _run():
+            try:
+                self.prewarm()
+            except OSError:
+                pass
+            finally:
+                with self._lock:
+                    self._refilling = False
+
+        threading.Thread(target=_run, daemon=True).start()
+
+    def close(self):
+        with self._lock:
+            sockets = self._idle + [s for group in self._sync_sessions.values() for s in group]
+            self._idle = []
+            self._sync_sessions = {}
+        for sock in sockets:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def _request(self, payload: str) -> socket.socket:
+        """取一条连接并发送首个请求；池中连接若已被对端关闭则换新连接重试一次"""
+        sock, pooled = self._acquire()
+        try:
+            _send_request(sock, payload)
+            _read_status(sock)
+            return sock
+        except (OSError, AdbConnectionClosed):
+            sock.close()
+            if not pooled:
+                raise
+        except Exception:
+            sock.close()
+            raise
+
+        sock = self._connect()
+        try:
+            _send_request(sock, payload)
+            _read_status(sock)
+            return sock
+        except Exception:
+            sock.close()
+            raise
+
+    # --- host 服务 ---
+
+    def host_command(self, request: str) -> str:
+        """执行 host:xxx 类请求，返回长度前缀包裹的文本结果"""
+        sock = self._request(request)
+        try:
+            return _read_hex_block(sock).decode("utf-8", errors="replace")
+        finally:
+            sock.close()
+
+    def version(self) -> int:
+        return int(self.host_command("host:version"), 16)
+
+    def devices(self) -> List[str]:
+        output = self.host_command("host:devices")
+        devices = []
+        for line in output.strip().split("\n"):
+            parts = line.split("\t")
+            if len(parts) >= 2 and parts[1] == "device":
+                devices.append(parts[0])
+        return devices
+
+    # --- 设备服务 ---
+
+    def open_service(self, service: str, serial: Optional[str] = None) -> socket.socket:
+        """切换到指定设备的传输通道并打开服务，返回专用于该服务的套接字"""
+        transport = f"host:transport:{serial}" if serial else "host:transport-any"
+        sock = self._request(transport)
+        try:
+            _send_request(sock, service)
+            _read_status(sock)
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    def _read_service(self, service: str, serial: Optional[str], timeout: Optional[float]) -> bytes:
+        """
+        打开服务并读取全部输出直到设备端关闭；timeout 为读取阶段的超时（None 沿用客户端默认值）
+        打开之前的失败照常抛出（可安全换通道重试），打开之后的失败抛出 AdbStreamInterrupted
+        """
+        sock = self.open_service(service, serial)
+        try:
+            sock.settimeout(self.timeout if timeout is None else timeout)
+            return _read_until_close(sock)
+        except (OSError, AdbProtocolError) as e:
+            raise AdbStreamInterrupted(f"{service.split(':', 1)[0]} 服务已打开后读取中断: {e}") from e
+        finally:
+            sock.close()
+
+    def shell(self, command: str, serial: Optional[str] = None, timeout: Optional[float] = None) -> bytes:
+        """shell:<cmd>，读取全部输出直到设备端关闭"""
+        return self._read_service(f"shell:{command}", serial, timeout)
+
+    def shell_checked(self, command: str, serial: Optional[str] = None, timeout: Optional[float] = None) -> bytes:
+        """
+        同 shell，但按设备端退出码判断成败（与 `adb shell` 进程的返回码一致）：
+        命令后追加 `echo 标记$?`，非零退出码抛出 AdbCommandError；输出中找不到标记时按成功处理
+        """
+        output = self.shell(f"{command}; echo {EXIT_MARKER}$?", serial, timeout)
+        index = output.rfind(EXIT_MARKER.encode())
+        if index < 0:
+            return output
+        status = output[index + len(EXIT_MARKER):].strip()
+        output = output[:index]
+        if status.isdigit() and int(status) != 0:
+            raise AdbCommandError(int(status), output)
+        return output
+
+    def exec_out(self, command: str, serial: Optional[str] = None, timeout: Optional[float] = None) -> bytes:
+        """exec:<cmd>，无 pty 的原始二进制输出（用于 screencap 等）"""
+        return self._read_service(f"exec:{command}", serial, timeout)
+
+    # --- sync 服务（文件传输） ---
+
+    def _acquire_sync(self, serial: Optional[str]) -> socket.socket:
+        key = serial or ""
+        with self._lock:
+            group = self._sync_sessions.get(key)
+            if group:
+                return group.pop()
+        return self.open_service("sync:", serial)
+
+    def _release_sync(self, serial: Optional[str], sock: socket.socket):
+        with self._lock:
+            self._sync_sessions.setdefault(serial or "", []).append(sock)
+
+    @staticmethod
+    def _sync_send(sock: socket.socket, cmd: bytes, data: bytes = b""):
+        sock.sendall(cmd + struct.pack("<I", len(data)) + data)
+
+    @staticmethod
+    def _sync_send_int(sock: socket.socket, cmd: bytes, value: int):
+        sock.sendall(cmd + struct.pack("<I", value))
+
+    @staticmethod
+    def _sync_read_header(sock: socket.socket):
+        header = _read_exact(sock, 8)
+        return header[:4], struct.unpack("<I", header[4:])[0]
+
+    def _sync_call(self, serial: Optional[str], func):
+        """在复用的 sync 会话上执行一次操作，出错则丢弃该会话"""
+        sock = self._acquire_sync(serial)
+        try:
+            result = func(sock)
+        except Exception:
+            sock.close()
+            raise
+        self._release_sync(serial, sock)
+        return result
+
+    def stat(self, remote_path: str, serial: Optional[str] = None):
+        """返回 (mode, size, mtime)，文件不存在时 mode 为 0"""
+        def _stat(sock):
+            self._sync_send(sock, b"STAT", remote_path.encode("utf-8"))
+            resp = _read_exact(sock, 16)
+            if resp[:4] != b"STAT":
+                raise AdbProtocolError(f"STAT 响应异常: {resp[:4]!r}")
+            return struct.unpack("<III", resp[4:])
+
+        return self._sync_call(serial, _stat)
+
+    def pull_bytes(self, remote_path: str, serial: Optional[str] = None) -> bytes:
+        def _recv(sock):
+            self._sync_send(sock, b"RECV", remote_path.encode("utf-8"))
+            chunks = []
+            while True:
+                cmd, length = self._sync_read_header(sock)
+                if cmd == b"DATA":
+                    chunks.append(_read_exact(sock, length))
+                elif cmd == b"DONE":
+                    return b"".join(chunks)
+                elif cmd == b"FAIL":
+                    raise AdbProtocolError(_read_exact(sock, length).decode("utf-8", errors="replace"))
+                else:
+                    raise AdbProtocolError(f"RECV 响应异常: {cmd!r}")
+
+        return self._sync_call(serial, _recv)
+
+    def pull(self, remote_path: str, local_path: str, serial: Optional[str] = None):
+        data = self.pull_bytes(remote_path, serial)
+        with open(local_path, "wb") as f:
+            f.write(data)
+
+    def push_bytes(self, data: bytes, remote_path: str, serial: Optional[str] = None,
+                   mode: int = 0o644, mtime: int = 0):
+        def _send(sock):
+            self._sync_send(sock, b"SEND", f"{remote_path},{mode}".encode("utf-8"))
+            for offset in range(0, len(data), SYNC_DATA_MAX):
+                self._sync_send(sock, b"DATA", data[offset:offset + SYNC_DATA_MAX])
+            self._sync_send_int(sock, b"DONE", mtime)
+            cmd, length = self._sync_read_header(sock)
+            if cmd == b"FAIL":
+                raise AdbProtocolError(_read_exact(sock, length).decode("utf-8", errors="replace"))
+            if cmd != b"OKAY":
+                raise AdbProtocolError(f"SEND 响应异常: {cmd!r}")
+
+        self._sync_call(serial, _send)
+
+    def push(self, local_path: str, remote_path: str, serial: Optional[str] = None, mode: int = 0o644):
+        with open(local_path, "rb") as f:
+            data = f.read()
+        self.push_bytes(data, remote_path, serial, mode)
+
+
+# ============================================
+# 常驻 shell 会话
+# ============================================
+class ShellSession:
+    """
+    设备常驻 sh 会话：命令经 stdin 流水线写入，批次末尾追加哨兵 echo 确认执行完成
+    - 有协议客户端时通过 shell:sh 服务（无 pty，不回显）
+    - 否则退回 `adb shell sh` 子进程，同样走 stdin/stdout 管道
+    """
+
+    SENTINEL = "__ADB_BATCH_DONE__"
+
+    def __init__(self, serial: Optional[str] = None, adb_path: str = "adb",
+                 wire_client: Optional[AdbWireClient] = None):
+        self.serial = serial
+        self.adb_path = adb_path
+        self.wire_client = wire_client
+
+        self._lock = threading.Lock()
+        self._seq = itertools.count(1)
+        self._lines: "queue.Queue[Optional[bytes]]" = queue.Queue()
+        self._sock: Optional[socket.socket] = None
+        self._proc: Optional[subprocess.Popen] = None
+        self._reader: Optional[threading.Thread] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._reader is not None and self._reader.is_alive()
+
+    def _open(self):
+        lines = self._lines = queue.Queue()
+        if self.wire_client:
+            self._sock = self.wire_client.open_service("shell:sh", self.serial)
+            self._sock.settimeout(None)
+            stream = self._sock.makefile("rb")
+        else:
+            cmd = [self.adb_path] + (["-s", self.serial] if self.serial else []) + ["shell", "sh"]
+            self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                          stderr=subprocess.STDOUT, bufsize=0)
+            stream = self._proc.stdout
+
+        def _pump():
+            try:
+                for line in iter(stream.readline, b""):
+                    lines.put(line)
+            except (OSError, ValueError):
+                pass
+            lines.put(None)
+
+        self._reader = threading.Thread(target=_pump, daemon=True)
+        self._reader.start()
+
+    def _write(self, data: bytes):
+        if self._sock is not None:
+            self._sock.sendall(data)
+        else:
+            self._proc.stdin.write(data)
+            self._proc.stdin.flush()
+
+    def run(self, commands: List[str], timeout: float = 30) -> str:
+        """
+        一次往返执行一批命令，返回该批次的合并输出；timeout 应覆盖批内 sleep 等设备端耗时
+        写入前失败抛出 AdbProtocolError；写入后超时或会话断开抛出 AdbStreamInterrupted（批次可能已部分执行，
+        调用方不得重发），两种情况都会关闭会话以便下次重建
+        """
+        with self._lock:
+            if not self.is_open:
+                self._open()
+
+            tag = f"{self.SENTINEL}{next(self._seq)}"
+            script = "\n".join(commands + [f"echo {tag}"]) + "\n"
+            try:
+                self._write(script.encode("utf-8"))
+            except (OSError, ValueError) as e:
+                self._close_locked()
+                raise AdbProtocolError(f"shell 会话写入失败: {e}")
+
+            output = []
+            while True:
+                try:
+                    line = self._lines.get(timeout=timeout)
+                except queue.Empty:
+                    self._close_locked()
+                    raise AdbStreamInterrupted(f"shell 会话等待哨兵超时 ({timeout}s)")
+                if line is None:
+                    self._close_locked()
+                    raise AdbStreamInterrupted("shell 会话已被设备端关闭")
+                text = line.decode("utf-8", errors="replace").rstrip("\r\n")
+                if text == tag:
+                    return "\n".join(output)
+                output.append(text)
+
+    def _close_locked(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+        if self._proc is not None:
+            try:
+                self._proc.stdin.close()
+            except OSError:
+                pass
+            self._proc.kill()
+            self._proc = None
+        self._reader = None
+
+    def close(self):
+        with self._lock:
+            self._close_locked()
+
+
+# 进程级共享客户端，所有 ADBConnector 共用一个连接池
+_SHARED_CLIENT: Optional[AdbWireClient] = None
+_SHARED_LOCK = threading.Lock()
+
+
+def get_wire_client(host: str = ADB_SERVER_HOST, port: int = ADB_SERVER_PORT) -> AdbWireClient:
+    """获取进程级共享的协议客户端"""
+    global _SHARED_CLIENT
+    with _SHARED_LOCK:
+        if _SHARED_CLIENT is None or (_SHARED_CLIENT.host, _SHARED_CLIENT.port) != (host, port):
+            _SHARED_CLIENT = AdbWireClient(host, port)
+        return _SHARED_CLIENT
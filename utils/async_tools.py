@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+asyncio 版自动化接口
+
+与 utils.tools 中的阻塞式函数一一对应，供脚本在同一个事件循环里并发执行
+战斗动作、画面监控与超时控制，不再需要额外的后台线程 + Event。
+- ADB 调用与模板匹配仍是阻塞操作，统一放到线程池执行，不会卡住事件循环
+- 停止：run_async 在取消令牌上挂接回调，用户停止时立即取消主任务，最终以 StopScriptException 抛出；
+  任一任务内抛出的 StopScriptException 同样向上传播（background 中的后台任务出错时立即中断 async with 块）
+
+用法：
+    async def main():
+        async with background(every(0.2, reg, connector, dev, show_log=False)):
+            await wait_until_match(dev, connector, "templates/restart.png", timeout=300)
+
+    run_async(main())
+"""
+import asyncio
+import functools
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from utils.tools import (ADBConnector, ChangeGate, DeviceContext, ImageMatcher, StopScriptException,
+                         TimeoutException, adapt_region, bind_run_context, check_running, current_cancel_token,
+                         current_run_context, get_device_context, grab_screen)
+from utils.poll_scheduler import PollScheduler, wait_key
+
+
+# ============================================
+# 基础：线程池执行、休眠与停止传播
+# ============================================
+async def to_thread(func, *args, **kwargs):
+    """在线程池中执行阻塞函数；多设备模式下把当前设备的运行上下文带入工作线程"""
+    ctx = current_run_context()
+
+    def _call():
+        if ctx is None:
+            return func(*args, **kwargs)
+        with bind_run_context(ctx, register=False):
+            return func(*args, **kwargs)
+
+    return await asyncio.get_running_loop().run_in_executor(None, _call)
+
+
+async def sleep(seconds: float):
+    """可被停止的异步休眠（等待期间其它任务照常运行）"""
+    check_running()
+    await asyncio.sleep(seconds)
+    check_running()
+
+
+async def _supervise(main):
+    loop = asyncio.get_running_loop()
+    task = asyncio.ensure_future(main)
+    token = current_cancel_token()
+
+    def _on_cancel():
+        # 回调可能在任意线程触发，转回事件循环线程取消主任务
+        loop.call_soon_threadsafe(task.cancel)
+
+    token.on_cancel(_on_cancel)
+    try:
+        return await task
+    except asyncio.CancelledError:
+        # 主任务因停止信号被取消：统一转换为 StopScriptException
+        raise StopScriptException("用户请求停止脚本")
+    finally:
+        token.remove_callback(_on_cancel)
+
+
+def run_async(main):
+    """在新的事件循环中运行脚本主协程，返回其结果；用户停止时抛出 StopScriptException"""
+    return asyncio.run(_supervise(main))
+
+
+async def every(interval: float, func, *args, **kwargs):
+    """循环执行阻塞动作（如战斗中的技能连点），每次之间间隔 interval 秒，直到被取消"""
+    while True:
+        await to_thread(func, *args, **kwargs)
+        await sleep(interval)
+
+
+@asynccontextmanager
+async def background(coro):
+    """
+    在 async with 块内并发运行 coro，离开时自动取消并等待其结束
+    coro 异常结束（含 StopScriptException）时立即取消块内代码，并在 async with 处重新抛出该异常
+    """
+    body = asyncio.current_task()
+    task = asyncio.ensure_future(coro)
+    state = {"inside": True, "failed": False}
+
+    def _on_done(t):
+        if state["inside"] and not t.cancelled() and t.exception() is not None:
+            state["failed"] = True
+            body.cancel()
+
+    task.add_done_callback(_on_done)
+    try:
+        yield task
+    except asyncio.CancelledError:
+        # 因后台任务失败而取消的块内代码：吞掉取消，改为抛出后台任务的异常（见 finally）
+        if not state["failed"]:
+            raise
+        if hasattr(body, "uncancel"):
+            body.uncancel()
+    finally:
+        state["inside"] = False
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
+# ============================================
+# 连接器与高层操作
+# ============================================
+class AsyncADBConnector:
+    """ADBConnector 的异步包装，方法与原连接器同名同参"""
+
+    def __init__(self, connector: Optional[ADBConnector] = None):
+        self.connector = connector or ADBConnector()
+
+    def __getattr__(self, name):
+        attr = getattr(self.connector, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def _method(*args, **kwargs):
+            return await to_thread(attr, *args, **kwargs)
+
+        return _method
+
+
+def _sync_connector(connector) -> ADBConnector:
+    return connector.connector if isinstance(connector, AsyncADBConnector) else connector
+
+
+async def click(x: int, y: int, connector=None, device_id: str = None, show_log: bool = False,
+                device_ctx: Optional[DeviceContext] = None):
+    """异步点击，点击后的 0.5 秒间隔不占用事件循环"""
+    connector = _sync_connector(connector) or ADBConnector()
+    await to_thread(connector.click_screen, x, y, device_id, show_log, device_ctx)
+    await sleep(0.5)
+
+
+async def wait_until_match(device_id: str, connector, template_path: str, timeout: float = 60,
+                           raise_err: bool = True, interval: float = 1.5, region=None,
+                           device_ctx: Optional[DeviceContext] = None) -> Optional[Dict]:
+    """异步等待图片出现，参数含义同 tools.wait_until_match"""
+    connector = _sync_connector(connector)
+    print(f"正在等待: {template_path} (超时: {timeout}s)...")
+    ctx = device_ctx or get_device_context(device_id)
+    device_region = adapt_region(region, device_id, ctx)
+    gate = ChangeGate(template_path, device_region)
+    scheduler = PollScheduler(wait_key(template_path, device_id), timeout, interval)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + timeout
+
+    try:
+        while loop.time() < deadline:
+            check_running(device_id)
+            screen = await to_thread(grab_screen, connector, device_id)
+            screen_gray = await to_thread(ImageMatcher.to_gray, screen) if screen is not None else None
+            if screen_gray is not None and not gate.unchanged(screen_gray):
+                res = await to_thread(ImageMatcher.compare_template, screen_gray, template_path, 0.7, device_id,
+                                      device_region, ctx)
+                if res["is_match"]:
+                    scheduler.record(loop.time() - started)
+                    return res
+                gate.mark_miss()
+            await sleep(scheduler.next_delay(loop.time() - started))
+    finally:
+        gate.close()
+
+    if raise_err:
+        raise TimeoutException(f"等待超时：{timeout}秒内未找到目标 {template_path}")
+    return None
+
+
+async def wait_until_any(device_id: str, connector, templates: Dict[str, str], timeout: float = 60,
+                         raise_err: bool = True, interval: float = 1.5, regions: Optional[Dict[str, tuple]] = None,
+                         device_ctx: Optional[DeviceContext] = None) -> Optional[Dict]:
+    """异步等待多个状态中任意一个出现，返回值同 tools.wait_until_any"""
+    connector = _sync_connector(connector)
+    print(f"正在等待任一状态: {list(templates)} (超时: {timeout}s)...")
+    ctx = device_ctx or get_device_context(device_id)
+    device_regions = ctx.convert_table(regions) if ctx is not None and regions else dict(regions or {})
+    gate = ChangeGate(",".join(templates), ChangeGate.union_region(templates, device_regions))
+    scheduler = PollScheduler(wait_key(",".join(templates), device_id), timeout, interval)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + timeout
+
+    try:
+        while loop.time() < deadline:
+            check_running(device_id)
+            screen = await to_thread(grab_screen, connector, device_id)
+            screen_gray = await to_thread(ImageMatcher.to_gray, screen) if screen is not None else None
+            if screen_gray is not None and not gate.unchanged(screen_gray):
+                res = await to_thread(ImageMatcher.match_any, screen_gray, templates, 0.7, device_id,
+                                      device_regions, ctx)
+                if res["name"]:
+                    scheduler.record(loop.time() - started)
+                    return res
+                gate.mark_miss()
+            await sleep(scheduler.next_delay(loop.time() - started))
+    finally:
+        gate.close()
+
+    if raise_err:
+        raise TimeoutException(f"等待超时：{timeout}秒内未找到任一目标 {list(templates)}")
+    return None
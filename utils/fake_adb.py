@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+本地假 adb server（测试替身）
+
+在 127.0.0.1 的随机端口上实现 adb smart-socket 协议的一个子集，
+用于在没有真机的情况下验证 AdbWireClient / ADBConnector 的协议路径。
+
+用法：
+    with FakeAdbServer(shell_handler=lambda serial, cmd: b"ok\\n") as server:
+        client = AdbWireClient(port=server.port)
+        client.shell("echo ok", server.serial)
+"""
+import socket
+import struct
+import threading
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from utils.adb_client import EXIT_MARKER
+
+ShellHandler = Callable[[str, str], Union[bytes, Tuple[bytes, int]]]
+
+
+def _read_exact(conn: socket.socket, size: int) -> Optional[bytes]:
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = conn.recv(size - len(buf))
+        if not chunk:
+            return None
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def _okay(conn: socket.socket):
+    conn.sendall(b"OKAY")
+
+
+def _fail(conn: socket.socket, message: str):
+    data = message.encode("utf-8")
+    conn.sendall(b"FAIL" + b"%04x" % len(data) + data)
+
+
+class FakeAdbServer:
+    """
+    假 adb server
+    - serial: 模拟的唯一在线设备序列号
+    - shell_handler(serial, cmd) -> bytes: 自定义 shell:/exec: 的输出，默认返回空；
+      也可返回 (输出, 退出码)，用于模拟 `; echo 标记$?` 形式的退出码检查
+    - files: sync 服务使用的内存文件系统 {远端路径: 内容}
+    - requests: 按到达顺序记录收到的全部服务请求，供断言使用
+    """
+
+    def __init__(self, serial: str = "fake-device", shell_handler: Optional[ShellHandler] = None,
+                 version: int = 41):
+        self.serial = serial
+        self.shell_handler = shell_handler or (lambda serial, cmd: b"")
+        self.version = version
+        self.files: Dict[str, bytes] = {}
+        self.requests: List[Tuple[str, str]] = []
+
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(("127.0.0.1", 0))
+        self._sock.listen(16)
+        self.port = self._sock.getsockname()[1]
+
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._accept_loop, daemon=True)
+
+    # --- 生命周期 ---
+
+    def start(self) -> "FakeAdbServer":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        try:
+            self._sock.close()
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _record(self, serial: str, request: str):
+        with self._lock:
+            self.requests.append((serial, request))
+
+    # --- 协议处理 ---
+
+    def _accept_loop(self):
+        while not self._stopped.is_set():
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _read_request(self, conn: socket.socket) -> Optional[str]:
+        header = _read_exact(conn, 4)
+        if header is None:
+            return None
+        body = _read_exact(conn, int(header, 16))
+        return body.decode("utf-8") if body is not None else None
+
+    def _handle(self, conn: socket.socket):
+        try:
+            serial = None
+            while True:
+                request = self._read_request(conn)
+                if request is None:
+                    return
+
+                if serial is None:
+                    # 尚未绑定传输通道：处理 host 请求
+                    if request == "host:version":
+                        self._record("", request)
+                        _okay(conn)
+                        payload = b"%04x" % self.version
+                        conn.sendall(b"%04x" % len(payload) + payload)
+                        return
+                    if request == "host:devices":
+                        self._record("", request)
+                        _okay(conn)
+                        payload = f"{self.serial}\tdevice\n".encode("utf-8")
+                        conn.sendall(b"%04x" % len(payload) + payload)
+                        return
+                    if request == "host:transport-any" or request == f"host:transport:{self.serial}":
+                        serial = self.serial
+                        _okay(conn)
+                        continue
+                    _fail(conn, f"device '{request}' not found")
+                    return
+
+                # 已绑定设备：处理设备服务
+                self._record(serial, request)
+                if request == "shell:sh":
+                    _okay(conn)
+                    self._handle_interactive_sh(conn, serial)
+                    return
+                if request.startswith("shell:") or request.startswith("exec:"):
+                    cmd = request.split(":", 1)[1]
+                    suffix = f"; echo {EXIT_MARKER}$?"
+                    checked = cmd.endswith(suffix)
+                    # 与真实 adb 一致：服务先确认打开，命令的输出随后才到达
+                    _okay(conn)
+                    result = self.shell_handler(serial, cmd[:-len(suffix)] if checked else cmd)
+                    output, code = result if isinstance(result, tuple) else (result, 0)
+                    conn.sendall(output + (f"{EXIT_MARKER}{code}\n".encode() if checked else b""))
+                    return
+                if request == "sync:":
+                    _okay(conn)
+                    self._handle_sync(conn, serial)
+                    return
+                _fail(conn, f"unknown service: {request}")
+                return
+        except OSError:
+            pass
+        finally:
+            conn.close()
+
+    def _handle_interactive_sh(self, conn: socket.socket, serial: str):
+        """模拟常驻 sh：逐行执行 stdin，echo 原样返回，其余命令交给 shell_handler"""
+        stream = conn.makefile("rb")
+        for raw in iter(stream.readline, b""):
+            line = raw.decode("utf-8").rstrip("\n")
+            if not line:
+                continue
+            self._record(serial, f"sh:{line}")
+            if line.startswith("echo "):
+                conn.sendall(line[5:].encode("utf-8") + b"\n")
+            elif line == "exit":
+                return
+            else:
+                # 常驻 sh 中的退出码只影响 $?，不追加标记：与非交互路径一样拆出输出
+                result = self.shell_handler(serial, line)
+                conn.sendall(result[0] if isinstance(result, tuple) else result)
+
+    def _handle_sync(self, conn: socket.socket, serial: str):
+        while True:
+            header = _read_exact(conn, 8)
+            if header is None:
+                return
+            cmd, length = header[:4], struct.unpack("<I", header[4:])[0]
+
+            if cmd == b"QUIT":
+                return
+
+            path = _read_exact(conn, length).decode("utf-8")
+            self._record(serial, f"sync:{cmd.decode()} {path}")
+
+            if cmd == b"STAT":
+                data = self.files.get(path)
+                if data is None:
+                    conn.sendall(b"STAT" + struct.pack("<III", 0, 0, 0))
+                else:
+                    conn.sendall(b"STAT" + struct.pack("<III", 0o100644, len(data), 0))
+            elif cmd == b"RECV":
+                data = self.files.get(path)
+                if data is None:
+                    msg = b"No such file or directory"
+                    conn.sendall(b"FAIL" + struct.pack("<I", len(msg)) + msg)
+                    continue
+                for offset in range(0, len(data), 64 * 1024):
+                    chunk = data[offset:offset + 64 * 1024]
+                    conn.sendall(b"DATA" + struct.pack("<I", len(chunk)) + chunk)
+                conn.sendall(b"DONE" + struct.pack("<I", 0))
+            elif cmd == b"SEND":
+                remote_path = path.rsplit(",", 1)[0]
+                chunks = []
+                while True:
+                    sub = _read_exact(conn, 8)
+                    if sub is None:
+                        return
+                    sub_cmd, sub_len = sub[:4], struct.unpack("<I", sub[4:])[0]
+                    if sub_cmd == b"DATA":
+                        chunks.append(_read_exact(conn, sub_len))
+                    elif sub_cmd == b"DONE":
+                        break
+                self.files[remote_path] = b"".join(chunks)
+                conn.sendall(b"OKAY" + struct.pack("<I", 0))
+            else:
+                msg = f"unknown sync command {cmd!r}".encode("utf-8")
+                conn.sendall(b"FAIL" + struct.pack("<I", len(msg)) + msg)
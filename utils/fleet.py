@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+多设备并行运行器
+
+同一个脚本在多台设备上各开一个线程运行，每台设备拥有独立的：
+- 运行标志（RunContext.running，可单独停止某台设备）
+- 分辨率（init_resolution 为每台设备生成 DeviceContext，adapt_coord 按当前线程的设备换算）
+- 脚本模块实例（每台设备单独加载一次脚本文件，模块级全局变量互不干扰）
+- 状态通道（status_notifier 在设备线程内自动分流到 on_status / on_log）
+
+用法：
+    runner = FleetRunner("scripts/活动.py", ["emulator-5554", "127.0.0.1:5555"],
+                         on_status=lambda dev, rnd, step, total: ...)
+    runner.start()
+    ...
+    runner.stop("emulator-5554")   # 只停一台
+    runner.stop()                  # 全部停止
+"""
+import importlib.util
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Callable, Dict, List, Optional
+
+from utils.tools import (ADBConnector, RunContext, StopScriptException, bind_run_context, init_resolution,
+                         interruptible_time_sleep)
+from utils.ocr import script_uses_ocr, warm_up_ocr
+from utils.poll_scheduler import wait_history
+
+StatusCallback = Callable[[str, int, str, Optional[int]], None]
+LogCallback = Callable[[str, str], None]
+
+
+def load_script_module(script_path: str, tag: str):
+    """按文件路径加载一份全新的脚本模块实例（tag 用于区分模块名）"""
+    safe_tag = "".join(c if c.isalnum() else "_" for c in tag)
+    mod_name = f"script_{safe_tag}_{int(time.time() * 1000)}"
+    spec = importlib.util.spec_from_file_location(mod_name, script_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[mod_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+class DeviceRun:
+    """单台设备的运行记录与吞吐量统计"""
+
+    def __init__(self, device_id: str):
+        self.device_id = device_id
+        self.ctx: Optional[RunContext] = None
+        self.thread: Optional[threading.Thread] = None
+        self.state = "等待启动"
+        self.step = "-"
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.first_round: Optional[int] = None
+        self.current_round: Optional[int] = None
+        self.total_round: Optional[int] = None
+
+    @property
+    def rounds_done(self) -> int:
+        """已完成轮次：脚本上报的轮次从开始运行起推进了多少轮"""
+        if self.first_round is None or self.current_round is None:
+            return 0
+        return max(0, self.current_round - self.first_round)
+
+    @property
+    def rounds_per_hour(self) -> float:
+        if not self.started_at:
+            return 0.0
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return self.rounds_done / elapsed * 3600 if elapsed > 0 else 0.0
+
+    def snapshot(self) -> Dict:
+        return {
+            "device_id": self.device_id,
+            "state": self.state,
+            "step": self.step,
+            "current_round": self.current_round,
+            "total_round": self.total_round,
+            "rounds_done": self.rounds_done,
+            "rounds_per_hour": round(self.rounds_per_hour, 2),
+            "elapsed": round((self.finished_at or time.time()) - self.started_at, 1) if self.started_at else 0.0,
+            "error": self.error,
+        }
+
+
+class FleetRunner:
+    """
+    多设备并行运行同一脚本
+    - on_status(device_id, current_round, step_desc, total_round): 设备线程内 status_notifier.update 的转发
+    - on_log(device_id, text): 设备线程内 status_notifier.log 的转发
+    - on_finished(device_id, state): 单台设备线程结束时回调
+    回调均在设备线程中触发，GUI 需自行切回主线程
+    """
+
+    def __init__(self, script_path: str, device_ids: List[str], on_status: Optional[StatusCallback] = None,
+                 on_log: Optional[LogCallback] = None, on_finished: Optional[Callable[[str, str], None]] = None):
+        self.script_path = script_path
+        self.on_status = on_status
+        self.on_log = on_log
+        self.on_finished = on_finished
+        self.runs: Dict[str, DeviceRun] = {dev: DeviceRun(dev) for dev in dict.fromkeys(device_ids)}
+        self._lock = threading.Lock()
+
+    # --- 生命周期 ---
+
+    def start(self) -> "FleetRunner":
+        if not os.path.exists(self.script_path):
+            raise FileNotFoundError(f"错误: 找不到文件 {self.script_path}")
+        # 各设备共用同一个 OCR 模型，在设备线程连接 ADB 的同时预热
+        if script_uses_ocr(self.script_path):
+            warm_up_ocr()
+        for run in self.runs.values():
+            if run.thread is not None and run.thread.is_alive():
+                continue
+            run.ctx = RunContext(run.device_id, on_status=self._handle_status, on_log=self._handle_log)
+            run.state = "启动中"
+            run.error = None
+            run.first_round = run.current_round = None
+            run.started_at, run.finished_at = time.time(), None
+            run.thread = threading.Thread(target=self._run_device, args=(run,),
+                                          name=f"Fleet-{run.device_id}", daemon=True)
+            run.thread.start()
+        return self
+
+    def stop(self, device_id: Optional[str] = None):
+        """停止指定设备；不传则停止全部设备"""
+        targets = [self.runs[device_id]] if device_id is not None else list(self.runs.values())
+        for run in targets:
+            if run.ctx is not None and run.thread is not None and run.thread.is_alive():
+                run.ctx.stop()
+                run.state = "停止中"
+
+    def join(self, timeout: Optional[float] = None):
+        deadline = None if timeout is None else time.time() + timeout
+        for run in self.runs.values():
+            if run.thread is not None:
+                run.thread.join(None if deadline is None else max(0.0, deadline - time.time()))
+
+    @property
+    def is_running(self) -> bool:
+        return any(run.thread is not None and run.thread.is_alive() for run in self.runs.values())
+
+    def stats(self) -> List[Dict]:
+        """每台设备的状态与吞吐量（轮次/小时）"""
+        with self._lock:
+            return [run.snapshot() for run in self.runs.values()]
+
+    # --- 设备线程 ---
+
+    def _run_device(self, run: DeviceRun):
+        file_name = os.path.basename(self.script_path)
+        module = None
+        try:
+            with interruptible_time_sleep(), bind_run_context(run.ctx):
+                run.ctx.on_log(run.device_id, f"=== 正在启动脚本: {file_name} ===")
+                connector = ADBConnector()
+                init_resolution(connector, run.device_id)
+
+                module = load_script_module(self.script_path, run.device_id)
+                run.state = "运行中"
+                if hasattr(module, "run"):
+                    module.run(run.device_id)
+                    # 脚本（如 StateMachine.run）自行捕获了停止异常时也按令牌判断是否为用户停止
+                    run.state = "已停止" if run.ctx.token.cancelled else "已完成"
+                else:
+                    run.state = "出错"
+                    run.error = f"{file_name} 中未找到 run(device_id) 函数"
+        except StopScriptException:
+            run.state = "已停止"
+        except Exception as e:
+            run.state = "出错"
+            run.error = str(e)
+            self._handle_log(run.device_id, f"❌ 运行出错: {e}\n{traceback.format_exc()}")
+        finally:
+            if module is not None:
+                sys.modules.pop(module.__name__, None)
+            run.ctx.token.close()
+            wait_history.flush()
+            run.finished_at = time.time()
+            if self.on_finished:
+                self.on_finished(run.device_id, run.state)
+
+    def _handle_status(self, device_id: str, current_round: int, step_desc: str, total_round: Optional[int] = None):
+        run = self.runs.get(device_id)
+        if run is not None:
+            with self._lock:
+                if run.first_round is None:
+                    run.first_round = current_round
+                run.current_round = current_round
+                run.step = step_desc
+                if total_round is not None:
+                    run.total_round = total_round
+        if self.on_status:
+            self.on_status(device_id, current_round, step_desc, total_round)
+
+    def _handle_log(self, device_id: str, text: str):
+        if self.on_log:
+            self.on_log(device_id, text)
+        else:
+            print(f"[{device_id}] {text}")
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+持续截图帧源
+
+每台设备一个后台线程不断截图写入环形缓冲区，消费者（wait_until_match、OCR、调试窗口）
+直接取最新一帧，不再各自触发截图。脚本停止（check_running 抛出 StopScriptException）时线程自动退出。
+"""
+import threading
+import time
+from collections import deque, namedtuple
+from typing import Dict, Optional
+
+from utils.tools import ADBConnector, StopScriptException, check_running, current_cancel_token
+
+# image: 截图（约定同 ADBConnector.get_screen_frame） timestamp: 截图完成时刻 seq: 递增帧序号
+Frame = namedtuple("Frame", ["image", "timestamp", "seq"])
+
+
+class FrameSource:
+    """
+    单设备持续帧源
+    - buffer_size: 环形缓冲区保留的帧数
+    - min_interval: 两次截图之间的最小间隔（秒），0 表示全速
+    - idle_timeout: 超过该时长无人取帧则暂停截图，下次取帧时恢复
+    """
+
+    def __init__(self, connector: ADBConnector, device_id: Optional[str] = None, buffer_size: int = 3,
+                 min_interval: float = 0.0, idle_timeout: float = 10.0):
+        self.connector = connector
+        self.device_id = device_id
+        self.min_interval = min_interval
+        self.idle_timeout = idle_timeout
+
+        self._frames = deque(maxlen=buffer_size)
+        self._timestamps = deque(maxlen=30)
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._errors = 0
+        self._last_request = time.time()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # --- 生命周期 ---
+
+    @property
+    def is_alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and not self._stopped.is_set()
+
+    def start(self) -> "FrameSource":
+        if not self.is_alive:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._loop, name=f"FrameSource-{self.device_id}", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._wake()
+
+    def _wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def _loop(self):
+        # 停止信号到达时直接唤醒挂起中的等待，不再定时轮询
+        token = current_cancel_token(self.device_id)
+        token.on_cancel(self.stop)
+        try:
+            while not self._stopped.is_set():
+                check_running(self.device_id)
+
+                with self._cond:
+                    # 长时间无人取帧时挂起，避免空耗设备与 ADB 带宽
+                    while (time.time() - self._last_request > self.idle_timeout
+                           and not self._stopped.is_set()):
+                        # 先检查再挂起：注册回调前已到达的停止信号不会再唤醒条件变量
+                        check_running(self.device_id)
+                        self._cond.wait()
+
+                started = time.time()
+                image = self.connector.get_screen_frame(self.device_id)
+                if image is None:
+                    self._errors += 1
+                    time.sleep(0.2)
+                    continue
+
+                now = time.time()
+                with self._cond:
+                    self._seq += 1
+                    self._frames.append(Frame(image, now, self._seq))
+                    self._timestamps.append(now)
+                    self._cond.notify_all()
+
+                wait = self.min_interval - (now - started)
+                if wait > 0:
+                    self._stopped.wait(wait)
+        except StopScriptException:
+            pass
+        finally:
+            token.remove_callback(self.stop)
+            self._stopped.set()
+            self._wake()
+
+    # --- 取帧 ---
+
+    def latest(self) -> Optional[Frame]:
+        """立即返回最新一帧（可能为 None），不会触发额外截图"""
+        with self._cond:
+            self._last_request = time.time()
+            self._cond.notify_all()
+            return self._frames[-1] if self._frames else None
+
+    def wait_for_frame(self, after_seq: int = 0, timeout: float = 5.0) -> Optional[Frame]:
+        """阻塞等待序号大于 after_seq 的新帧，超时或帧源停止时返回 None"""
+        deadline = time.time() + timeout
+        token = current_cancel_token(self.device_id)
+        token.on_cancel(self._wake)
+        try:
+            with self._cond:
+                self._last_request = time.time()
+                self._cond.notify_all()
+                while not self._frames or self._frames[-1].seq <= after_seq:
+                    remaining = deadline - time.time()
+                    if remaining <= 0 or self._stopped.is_set():
+                        return None
+                    # 停止信号经令牌回调唤醒条件变量，无需分段轮询；挂起前先检查，避免错过已到达的停止信号
+                    check_running(self.device_id)
+                    self._cond.wait(remaining)
+                check_running(self.device_id)
+                return self._frames[-1]
+        finally:
+            token.remove_callback(self._wake)
+
+    def stats(self) -> Dict:
+        """帧率与帧龄指标"""
+        with self._cond:
+            stamps = list(self._timestamps)
+            latest = self._frames[-1] if self._frames else None
+            fps = (len(stamps) - 1) / (stamps[-1] - stamps[0]) if len(stamps) > 1 and stamps[-1] > stamps[0] else 0.0
+            return {
+                "fps": round(fps, 2),
+                "frame_age": round(time.time() - latest.timestamp, 3) if latest else None,
+                "frames": self._seq,
+                "errors": self._errors,
+                "running": self.is_alive,
+            }
+
+
+# ============================================
+# 每设备帧源注册表
+# ============================================
+_SOURCES: Dict[Optional[str], FrameSource] = {}
+_SOURCES_LOCK = threading.Lock()
+
+
+def get_frame_source(device_id: Optional[str] = None) -> Optional[FrameSource]:
+    """返回该设备正在运行的帧源，没有则返回 None"""
+    with _SOURCES_LOCK:
+        source = _SOURCES.get(device_id)
+        return source if source is not None and source.is_alive else None
+
+
+def start_frame_source(connector: ADBConnector, device_id: Optional[str] = None, **kwargs) -> FrameSource:
+    """启动（或复用已在运行的）设备帧源"""
+    with _SOURCES_LOCK:
+        source = _SOURCES.get(device_id)
+        if source is None or not source.is_alive:
+            source = FrameSource(connector, device_id, **kwargs)
+            _SOURCES[device_id] = source
+        return source.start()
+
+
+def stop_frame_source(device_id: Optional[str] = None):
+    with _SOURCES_LOCK:
+        source = _SOURCES.pop(device_id, None)
+    if source is not None:
+        source.stop()
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+多点触控手势时间线
+
+JoystickController.move 原本是一次阻塞的 input swipe，移动期间无法释放技能。
+手势时间线把若干触点（摇杆按住拖动、技能点击、长按）按各自的时间排布，编译为一条按时间排列的
+多点触控事件流，经触摸注入（utils/input_injector.py）一次下发：
+- 时间线上的坐标为基础分辨率，添加时即换算为设备像素
+- click / long_press / move 与同名的阻塞函数语义一致，默认依次衔接（时间游标 cursor）；
+  传入 at 时放在指定时刻，可与其它触点并发
+- 事件流按 CHUNK_SECONDS 分段下发，段间检查停止信号；停止或出错提前结束时先抬起所有按下的触点再抛出异常
+- 触摸注入不可用时按开始时间逐个触点退回 input tap / swipe（并发的触点变为先后执行）
+
+用法：
+    gesture = joystick.gesture()
+    gesture.move('a', 22)                                   # 0 ~ 22 秒按住摇杆向左跑
+    gesture.tap_every(*REG_POS, interval=3, start=0.5)      # 移动期间每 3 秒放一次技能
+    gesture.tap(*ULT_POS, at=10)
+    gesture.run()
+"""
+import time
+from typing import List, Optional, Set, Tuple, Union
+
+from utils.adb_client import AdbStreamInterrupted
+from utils.tools import (DeviceContext, _active_batch, adapt_coord, check_running, get_device_context,
+                         smart_sleep)
+
+# 点击的按下时长、tools.click 点击后的间隔、相邻两段摇杆移动之间的抬手间隔（秒）
+TAP_HOLD = 0.05
+CLICK_GAP = 0.5
+LEG_GAP = 0.05
+# 移动中的触点每隔 STEP 秒上报一次位置，每段最多 MAX_STEPS 次
+STEP = 0.05
+MAX_STEPS = 40
+# 事件流分段下发的时长，决定停止信号的最大响应延迟
+CHUNK_SECONDS = 1.0
+
+# 关键帧 (相对开始的秒数, 设备像素 x, 设备像素 y)
+Keyframe = Tuple[float, int, int]
+
+
+def _clip_ratio(p0: Tuple[int, int], p1: Tuple[int, int], width: int, height: int) -> float:
+    """p0 → p1 线段留在屏幕内的最大比例（p0 在屏幕内）"""
+    ratio = 1.0
+    for start, delta, size in ((p0[0], p1[0] - p0[0], width), (p0[1], p1[1] - p0[1], height)):
+        if delta > 0 and start + delta > size - 1:
+            ratio = min(ratio, (size - 1 - start) / delta)
+        elif delta < 0 and start + delta < 0:
+            ratio = min(ratio, -start / delta)
+    return max(0.0, ratio)
+
+
+class Gesture:
+    """
+    一组并发触点的时间线
+    - connector / device_id / device_ctx: 同 click 等阻塞函数
+    - joystick: move() 使用的 JoystickController
+    """
+
+    def __init__(self, connector, device_id: Optional[str] = None, device_ctx: Optional[DeviceContext] = None,
+                 joystick=None):
+        self.connector = connector
+        self.device_id = device_id
+        self.device_ctx = device_ctx or get_device_context(device_id)
+        self.joystick = joystick
+        self.pointers: List[List[Keyframe]] = []
+        self.cursor = 0.0
+
+    # --- 构建 ---
+
+    def _px(self, x: float, y: float) -> Tuple[int, int]:
+        return adapt_coord(x, y, self.device_id, self.device_ctx)
+
+    def add_pointer(self, keyframes: List[Tuple[float, float, float]]) -> "Gesture":
+        """添加一个触点：首个关键帧按下，末个关键帧抬起，其间线性移动（坐标为基础分辨率）"""
+        if len(keyframes) < 2 or keyframes[-1][0] <= keyframes[0][0]:
+            raise ValueError("触点至少需要两个关键帧且持续时间大于 0")
+        self.pointers.append([(round(t, 3), *self._px(x, y)) for t, x, y in keyframes])
+        return self
+
+    def tap(self, x: float, y: float, at: Optional[float] = None, hold: float = TAP_HOLD) -> "Gesture":
+        """在 at 秒（默认当前游标）点击一次，不推进游标"""
+        at = self.cursor if at is None else at
+        return self.add_pointer([(at, x, y), (at + hold, x, y)])
+
+    def tap_every(self, x: float, y: float, interval: float, start: float = 0.0,
+                  until: Optional[float] = None) -> "Gesture":
+        """从 start 到 until 秒（默认时间线结束）每隔 interval 秒点击一次"""
+        until = self.duration if until is None else until
+        at = start
+        while at + TAP_HOLD <= until:
+            self.tap(x, y, at)
+            at += interval
+        return self
+
+    def click(self, x: float, y: float, at: Optional[float] = None) -> "Gesture":
+        """同 tools.click：点击后间隔 0.5 秒；未指定 at 时推进游标"""
+        self.tap(x, y, at)
+        if at is None:
+            self.cursor += CLICK_GAP
+        return self
+
+    def long_press(self, x: float, y: float, duration: float, at: Optional[float] = None) -> "Gesture":
+        """同 tools.long_press：原地按住 duration 秒；未指定 at 时推进游标"""
+        start = self.cursor if at is None else at
+        self.add_pointer([(start, x, y), (start + duration, x, y)])
+        if at is None:
+            self.cursor = start + duration
+        return self
+
+    def drag(self, x1: float, y1: float, x2: float, y2: float, duration: float,
+             at: Optional[float] = None) -> "Gesture":
+        """按下后 duration 秒内从 (x1, y1) 线性移动到 (x2, y2) 再抬起；未指定 at 时推进游标"""
+        start = self.cursor if at is None else at
+        self.add_pointer([(start, x1, y1), (start + duration, x2, y2)])
+        if at is None:
+            self.cursor = start + duration
+        return self
+
+    def move(self, direction: Union[str, Tuple[float, float]], duration: float = 1.0, mode: str = 'run', at: Optional[float] = None,
+             debug: bool = False) -> "Gesture":
+        """同 JoystickController.move（direction 也可以是方向向量）；连续的 move 之间自动留出抬手间隔"""
+        if self.joystick is None:
+            raise ValueError("move 需要绑定 JoystickController")
+        plan = self.joystick.plan(direction, duration, mode, debug)
+        if plan is None:
+            return self
+        sx, sy, ex, ey, seconds = plan
+        start = self.cursor if at is None else at
+        self.add_pointer([(start, sx, sy), (start + seconds, ex, ey)])
+        if at is None:
+            self.cursor = start + seconds + LEG_GAP
+        return self
+
+    def wait(self, seconds: float) -> "Gesture":
+        """推进游标，后续按顺序添加的动作延后 seconds 秒"""
+        self.cursor += seconds
+        return self
+
+    @property
+    def duration(self) -> float:
+        return max([self.cursor] + [keyframes[-1][0] for keyframes in self.pointers])
+
+    # --- 编译 ---
+
+    def compile(self, injector) -> List[Tuple[float, str, Set[int]]]:
+        """
+        编译为 [(时刻, 写入指令, 该帧之后仍按下的槽位)]
+        同一时刻先处理按下、再移动、最后抬起，保证接力的触点不会复用同一槽位
+        """
+        ctx = injector._context()
+        actions = {}
+        for index, keyframes in enumerate(self.pointers):
+            actions.setdefault(keyframes[0][0], []).append((0, index, keyframes[0][1:]))
+            for (t0, x0, y0), (t1, x1, y1) in zip(keyframes, keyframes[1:]):
+                if (x0, y0) != (x1, y1):
+                    # 摇杆越界拖拽的终点可能在屏幕外：沿轨迹截断到屏幕边缘，保持拖动方向不变
+                    limit = _clip_ratio((x0, y0), (x1, y1), ctx.width, ctx.height) if ctx else 1.0
+                    steps = min(MAX_STEPS, max(1, int((t1 - t0) / STEP)))
+                    for k in range(1, steps + 1):
+                        r = min(k / steps, limit)
+                        point = (int(x0 + (x1 - x0) * r), int(y0 + (y1 - y0) * r))
+                        actions.setdefault(round(t0 + (t1 - t0) * r, 3), []).append((1, index, point))
+            actions.setdefault(keyframes[-1][0], []).append((2, index, None))
+
+        device = injector.device
+        slots, positions, free = {}, {}, list(range(device.slots))
+        compiled = []
+        for t in sorted(actions):
+            events = []
+            for kind, index, point in sorted(actions[t], key=lambda a: a[0]):
+                if kind == 0:
+                    if not free:
+                        raise ValueError(f"同时按下的触点超过设备支持的 {device.slots} 个")
+                    slots[index] = free.pop(0)
+                    positions[index] = point
+                    if device.protocol_b:
+                        events += injector.contact_events(slots[index], *point, injector.next_tracking_id())
+                elif kind == 1 and index in slots:
+                    positions[index] = point
+                    if device.protocol_b:
+                        events += injector.contact_events(slots[index], *point)
+                elif kind == 2 and index in slots:
+                    slot = slots.pop(index)
+                    positions.pop(index)
+                    free.append(slot)
+                    free.sort()
+                    if device.protocol_b:
+                        events += injector.release_events(slot)
+            if not device.protocol_b:
+                # A 类协议每帧需列出全部按下的触点
+                for index, point in positions.items():
+                    events += injector.contact_events(slots[index], *point, 0)
+            compiled.append((t, injector.frame(events, bool(slots)), set(slots.values())))
+        return compiled
+
+    # --- 执行 ---
+
+    def run(self) -> bool:
+        """阻塞执行整条时间线，耗时约为 duration"""
+        if not self.pointers:
+            return True
+        from utils.input_injector import disable_injector, get_injector
+        injector = get_injector(self.connector, self.device_id)
+        if injector is None:
+            return self._run_sequential()
+
+        steps = self.compile(injector)
+        batch = _active_batch(self.device_id)
+        if batch is not None:
+            batch.commands.extend(self._with_sleeps(steps))
+            return True
+
+        active, written = set(), False
+        try:
+            start = 0.0
+            while steps:
+                if steps[0][0] - start >= CHUNK_SECONDS:
+                    # 长时间没有事件（如按住不动）：在本机可中断地等待，不占用设备端会话
+                    smart_sleep(steps[0][0] - start)
+                    start = steps[0][0]
+                chunk = [step for step in steps if step[0] - start < CHUNK_SECONDS]
+                steps = steps[len(chunk):]
+                check_running(self.device_id)
+                try:
+                    ok = injector.run(self._with_sleeps(chunk, start), chunk[-1][0] - start)
+                except AdbStreamInterrupted as e:
+                    # 本段事件可能已部分执行：不重发、也不改用 input，抬起触点后结束
+                    print(f"触摸事件下发中断: {e}")
+                    active = active.union(*(step[2] for step in chunk))
+                    return False
+                if not ok:
+                    # 写入失败：停用注入器；尚未写入任何事件时整条时间线改用 input 指令执行
+                    disable_injector(self.device_id)
+                    return self._run_sequential() if not written else False
+                written = True
+                active = chunk[-1][2]
+                start = chunk[-1][0]
+        finally:
+            # 无论因停止、异常还是写入失败提前结束，都抬起仍按住的触点，避免设备上残留按下状态
+            if active:
+                release = [e for slot in sorted(active) for e in injector.release_events(slot)]
+                try:
+                    injector.run([injector.frame(release, False)])
+                except Exception as e:
+                    print(f"抬起残留触点失败: {e}")
+        return True
+
+    @staticmethod
+    def _with_sleeps(steps, start: float = 0.0) -> List[str]:
+        commands, previous = [], start
+        for t, command, _ in steps:
+            if t - previous > 0:
+                commands.append(f"sleep {t - previous:.3f}")
+            commands.append(command)
+            previous = t
+        return commands
+
+    def _run_sequential(self) -> bool:
+        """无触摸注入时按开始时间逐个执行触点（input 指令无法并发多指）"""
+        batch = _active_batch(self.device_id)
+        started, elapsed, ok = time.time(), 0.0, True
+        for keyframes in sorted(self.pointers, key=lambda k: k[0][0]):
+            if batch is not None:
+                if keyframes[0][0] > elapsed:
+                    batch.sleep(round(keyframes[0][0] - elapsed, 3))
+                elapsed = max(elapsed, keyframes[-1][0])
+            else:
+                wait = keyframes[0][0] - (time.time() - started)
+                if wait > 0:
+                    smart_sleep(wait)
+            for (t0, x0, y0), (t1, x1, y1) in zip(keyframes, keyframes[1:]):
+                duration_ms = int((t1 - t0) * 1000)
+                if (x0, y0) == (x1, y1) and duration_ms <= TAP_HOLD * 1000:
+                    ok = self.connector.run_input(["tap", x0, y0], self.device_id) and ok
+                else:
+                    ok = self.connector.run_input(["swipe", x0, y0, x1, y1, duration_ms], self.device_id) and ok
+        return ok
@@ -0,0 +1,401 @@
+# -*- coding: utf-8 -*-
+"""
+设备端触摸事件注入
+
+`adb shell input tap/swipe` 每次都要在设备上启动 Java 版 input 工具，单次点击有数百毫秒的设备端延迟。
+本模块改为直接向触摸屏的 /dev/input/eventX 写入多点触控事件：
+- 启动时用 `getevent -pl` 找到触摸屏设备及其坐标范围，读取屏幕旋转方向与用户态位数（决定事件结构体大小）
+- 每一步触摸动作编码为一条 `printf '<八进制转义的 input_event 序列>' > /dev/input/eventX`，
+  经设备常驻 sh 会话下发，设备端只需执行 printf，无需启动 Java 进程
+- 不可用（找不到触摸屏、无写权限）时返回 None，调用方回退到 input 指令
+- 每条写入指令附带 `|| echo <WRITE_FAILED>`，运行中写入失败时 run 返回 False，调用方停用注入器并改用 input 指令
+
+由配置项 "input_backend" 选择："input"（默认）或 "evdev"
+
+用法：
+    injector = get_injector(connector, device_id)
+    if injector is not None:
+        injector.tap(1200, 800)
+        injector.swipe(300, 1400, 300, 900, 2000)
+"""
+import re
+import struct
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from utils.adb_client import AdbProtocolError, AdbStreamInterrupted
+from utils.tools import DeviceContext, config_mgr, get_device_context
+
+# linux/input-event-codes.h
+EV_SYN, EV_KEY, EV_ABS = 0x00, 0x01, 0x03
+SYN_REPORT, SYN_MT_REPORT = 0x00, 0x02
+BTN_TOUCH = 0x14a
+ABS_MT_SLOT = 0x2f
+ABS_MT_TOUCH_MAJOR = 0x30
+ABS_MT_POSITION_X = 0x35
+ABS_MT_POSITION_Y = 0x36
+ABS_MT_TRACKING_ID = 0x39
+ABS_MT_PRESSURE = 0x3a
+
+# 写入成功 / 失败时设备端回显的标记（探测要求回显成功标记，subprocess 后端失败时输出为空也能识别）
+PROBE_OK = "__EVDEV_OK__"
+WRITE_FAILED = "__EVDEV_WRITE_FAILED__"
+
+# 滑动时相邻两次移动事件的间隔（秒）与单次滑动的最多步数
+SWIPE_STEP = 0.05
+SWIPE_MAX_STEPS = 40
+
+Event = Tuple[int, int, int]
+
+
+class TouchDevice(NamedTuple):
+    """getevent -pl 中解析出的触摸屏设备"""
+    path: str
+    min_x: int
+    max_x: int
+    min_y: int
+    max_y: int
+    slots: int
+    protocol_b: bool
+    has_pressure: bool
+    has_touch_major: bool
+    has_btn_touch: bool
+
+
+_ABS_RE = re.compile(r"(ABS_MT_\w+)\s*:\s*value\s*-?\d+,\s*min\s*(-?\d+),\s*max\s*(-?\d+)")
+
+
+def parse_getevent(output: str) -> Optional[TouchDevice]:
+    """从 `getevent -pl` 输出中挑出多点触控屏（优先带 INPUT_PROP_DIRECT 的设备）"""
+    candidates = []
+    for block in re.split(r"(?=add device \d+:)", output or ""):
+        path = re.match(r"add device \d+:\s*(\S+)", block)
+        if not path:
+            continue
+        axes = {name: (int(lo), int(hi)) for name, lo, hi in _ABS_RE.findall(block)}
+        if "ABS_MT_POSITION_X" not in axes or "ABS_MT_POSITION_Y" not in axes:
+            continue
+        (min_x, max_x), (min_y, max_y) = axes["ABS_MT_POSITION_X"], axes["ABS_MT_POSITION_Y"]
+        device = TouchDevice(
+            path=path.group(1), min_x=min_x, max_x=max_x, min_y=min_y, max_y=max_y,
+            slots=axes["ABS_MT_SLOT"][1] + 1 if "ABS_MT_SLOT" in axes else 1,
+            protocol_b="ABS_MT_SLOT" in axes,
+            has_pressure="ABS_MT_PRESSURE" in axes,
+            has_touch_major="ABS_MT_TOUCH_MAJOR" in axes,
+            has_btn_touch="BTN_TOUCH" in block,
+        )
+        candidates.append(("INPUT_PROP_DIRECT" in block, device))
+    if not candidates:
+        return None
+    return max(candidates, key=lambda item: item[0])[1]
+
+
+def encode_events(events: List[Event], event_size: int = 24) -> bytes:
+    """编码为 struct input_event 序列；时间戳由内核在注入时填写，这里置零"""
+    fmt = "<qqHHi" if event_size == 24 else "<iiHHi"
+    return b"".join(struct.pack(fmt, 0, 0, ev_type, code, value) for ev_type, code, value in events)
+
+
+def printf_command(data: bytes, path: str) -> str:
+    """生成把二进制数据原样写入设备文件的 shell 指令（printf 的 \\ooo 八进制转义）"""
+    return "printf '" + "".join(f"\\{byte:03o}" for byte in data) + f"' > {path}"
+
+
+class TouchInjector:
+    """
+    单台设备的触摸注入器（坐标均为设备实际像素，按当前横竖屏方向）
+    - tap / swipe: 阻塞执行，语义与 input tap / swipe 一致（长按即起止点相同的 swipe）
+    - *_commands: 只生成 shell 指令，可并入 input_batch 批处理
+    """
+
+    def __init__(self, connector, device_id: Optional[str] = None, device_ctx: Optional[DeviceContext] = None):
+        self.connector = connector
+        self.device_id = device_id
+        self.device_ctx = device_ctx
+        self.device: Optional[TouchDevice] = None
+        self.event_size = 24
+        self.rotation = 0
+        self._tracking_id = 0
+        self._lock = threading.Lock()
+
+    # --- 探测 ---
+
+    def _shell(self, command: str) -> str:
+        return self.connector.execute_adb(["shell", command], self.device_id) or ""
+
+    def probe(self) -> bool:
+        """查找触摸屏并确认有写权限，成功返回 True"""
+        self.device = parse_getevent(self._shell("getevent -pl"))
+        if self.device is None:
+            print("⚠️ 未找到多点触控设备，触摸注入不可用")
+            return False
+
+        abi = self._shell("getprop ro.product.cpu.abi").strip()
+        self.event_size = 24 if "64" in abi else 16
+        rotation = re.search(r"SurfaceOrientation:\s*(\d)|orientation=(\d)", self._shell("dumpsys input"))
+        if rotation:
+            self.rotation = int(rotation.group(1) or rotation.group(2))
+        else:
+            # 读不到旋转方向时按触摸屏自然方向与脚本画面方向（已对齐基础分辨率的宽高）是否一致推断
+            ctx = self._context()
+            panel_landscape = self.device.max_x - self.device.min_x > self.device.max_y - self.device.min_y
+            self.rotation = 0 if ctx is None or panel_landscape == (ctx.width >= ctx.height) else 1
+
+        # 单独写一个 SYN_REPORT 验证写权限，不会产生任何触摸；只有写入成功才会回显 PROBE_OK
+        probe = printf_command(encode_events([(EV_SYN, SYN_REPORT, 0)], self.event_size), self.device.path)
+        output = self._shell(f"{probe} && echo {PROBE_OK}")
+        if PROBE_OK not in output:
+            print(f"⚠️ 无法写入 {self.device.path}: {output.strip() or '无输出'}，触摸注入不可用")
+            return False
+        print(f"✅ 触摸注入已启用: {self.device.path} (旋转 {self.rotation}, 事件 {self.event_size} 字节)")
+        return True
+
+    def _context(self) -> Optional[DeviceContext]:
+        if self.device_ctx is None:
+            self.device_ctx = get_device_context(self.device_id)
+        return self.device_ctx
+
+    # --- 坐标与事件 ---
+
+    def to_touch(self, x: float, y: float) -> Tuple[int, int]:
+        """屏幕像素（当前方向）→ 触摸屏原始坐标"""
+        ctx = self._context()
+        nx = x / max(1, ctx.width - 1) if ctx else 0.0
+        ny = y / max(1, ctx.height - 1) if ctx else 0.0
+        nx, ny = min(max(nx, 0.0), 1.0), min(max(ny, 0.0), 1.0)
+        if self.rotation == 1:
+            nx, ny = 1 - ny, nx
+        elif self.rotation == 2:
+            nx, ny = 1 - nx, 1 - ny
+        elif self.rotation == 3:
+            nx, ny = ny, 1 - nx
+        dev = self.device
+        return (int(round(dev.min_x + nx * (dev.max_x - dev.min_x))),
+                int(round(dev.min_y + ny * (dev.max_y - dev.min_y))))
+
+    def from_touch(self, tx: int, ty: int) -> Tuple[float, float]:
+        """触摸屏原始坐标 → 屏幕像素（当前方向），to_touch 的逆变换"""
+        dev = self.device
+        nx = (tx - dev.min_x) / max(1, dev.max_x - dev.min_x)
+        ny = (ty - dev.min_y) / max(1, dev.max_y - dev.min_y)
+        if self.rotation == 1:
+            nx, ny = ny, 1 - nx
+        elif self.rotation == 2:
+            nx, ny = 1 - nx, 1 - ny
+        elif self.rotation == 3:
+            nx, ny = 1 - ny, nx
+        ctx = self._context()
+        return (nx * (ctx.width - 1), ny * (ctx.height - 1)) if ctx else (nx, ny)
+
+    def next_tracking_id(self) -> int:
+        with self._lock:
+            self._tracking_id = (self._tracking_id + 1) % 0xFFFF
+            return self._tracking_id
+
+    def contact_events(self, slot: int, x: float, y: float, tracking_id: Optional[int] = None) -> List[Event]:
+        """单个触点按下（传 tracking_id）或移动到 (x, y) 的事件，不含 SYN"""
+        tx, ty = self.to_touch(x, y)
+        events = []
+        if self.device.protocol_b:
+            events.append((EV_ABS, ABS_MT_SLOT, slot))
+            if tracking_id is not None:
+                events.append((EV_ABS, ABS_MT_TRACKING_ID, tracking_id))
+        else:
+            events.append((EV_ABS, ABS_MT_TRACKING_ID, slot))
+        if tracking_id is not None and self.device.has_touch_major:
+            events.append((EV_ABS, ABS_MT_TOUCH_MAJOR, 5))
+        if tracking_id is not None and self.device.has_pressure:
+            events.append((EV_ABS, ABS_MT_PRESSURE, 50))
+        events.append((EV_ABS, ABS_MT_POSITION_X, tx))
+        events.append((EV_ABS, ABS_MT_POSITION_Y, ty))
+        if not self.device.protocol_b:
+            events.append((EV_SYN, SYN_MT_REPORT, 0))
+        return events
+
+    def release_events(self, slot: int) -> List[Event]:
+        if self.device.protocol_b:
+            return [(EV_ABS, ABS_MT_SLOT, slot), (EV_ABS, ABS_MT_TRACKING_ID, -1)]
+        return []
+
+    def frame(self, events: List[Event], touching: bool) -> str:
+        """一帧事件（末尾补 BTN_TOUCH 与 SYN_REPORT）编码为一条写入指令"""
+        events = list(events)
+        if self.device.has_btn_touch:
+            events.append((EV_KEY, BTN_TOUCH, 1 if touching else 0))
+        if not touching and not self.device.protocol_b:
+            events.append((EV_SYN, SYN_MT_REPORT, 0))
+        events.append((EV_SYN, SYN_REPORT, 0))
+        return printf_command(encode_events(events, self.event_size), self.device.path) + f" || echo {WRITE_FAILED}"
+
+    # --- 指令生成 ---
+
+    def tap_commands(self, x: int, y: int, hold: float = 0.04) -> List[str]:
+        return self.swipe_commands(x, y, x, y, int(hold * 1000))
+
+    def swipe_commands(self, x1: int, y1: int, x2: int, y2: int, duration_ms: int = 300, slot: int = 0) -> List[str]:
+        """按下 → 按 SWIPE_STEP 线性插值移动 → 抬起，总时长约 duration_ms"""
+        duration = max(0, duration_ms) / 1000
+        commands = [self.frame(self.contact_events(slot, x1, y1, self.next_tracking_id()), True)]
+        steps = min(SWIPE_MAX_STEPS, int(duration / SWIPE_STEP)) if (x1, y1) != (x2, y2) else 0
+        if steps:
+            for i in range(1, steps + 1):
+                commands.append(f"sleep {duration / steps:.3f}")
+                t = i / steps
+                commands.append(self.frame(self.contact_events(slot, x1 + (x2 - x1) * t, y1 + (y2 - y1) * t), True))
+        elif duration > 0:
+            commands.append(f"sleep {duration:.3f}")
+        commands.append(self.frame(self.release_events(slot), False))
+        return commands
+
+    # --- 执行 ---
+
+    def run(self, commands: List[str], duration: float = 0.0) -> bool:
+        """
+        经常驻 sh 会话一次下发；会话不可用时合并为单次 adb shell
+        执行失败或任一事件写入失败时返回 False；已写入会话后中断时抛出 AdbStreamInterrupted（不会重发）
+        """
+        try:
+            output = self.connector.get_shell_session(self.device_id).run(commands, timeout=duration + 30)
+        except AdbStreamInterrupted:
+            raise
+        except (AdbProtocolError, OSError) as e:
+            print(f"常驻 shell 会话执行失败，回退到单次调用: {e}")
+            output = self.connector.execute_adb(["shell", " ; ".join(commands)], self.device_id,
+                                                timeout=int(duration) + 30)
+        if output is None:
+            return False
+        if WRITE_FAILED in output:
+            print(f"⚠️ 写入 {self.device.path} 失败")
+            return False
+        return True
+
+    def tap(self, x: int, y: int) -> bool:
+        return self.run(self.tap_commands(x, y))
+
+    def swipe(self, x1: int, y1: int, x2: int, y2: int, duration_ms: int = 300) -> bool:
+        return self.run(self.swipe_commands(x1, y1, x2, y2, duration_ms), duration_ms / 1000)
+
+
+# ============================================
+# 按设备缓存的注入器
+# ============================================
+_INJECTORS: Dict[Optional[str], Optional[TouchInjector]] = {}
+_INJECTORS_LOCK = threading.Lock()
+
+
+def get_injector(connector, device_id: Optional[str] = None) -> Optional[TouchInjector]:
+    """input_backend 为 evdev 时返回该设备的注入器（首次调用时探测），不可用时返回 None"""
+    if config_mgr.get("input_backend", "input") != "evdev":
+        return None
+    with _INJECTORS_LOCK:
+        if device_id not in _INJECTORS:
+            injector = TouchInjector(connector, device_id)
+            _INJECTORS[device_id] = injector if injector.probe() else None
+        return _INJECTORS[device_id]
+
+
+def disable_injector(device_id: Optional[str] = None):
+    """运行中写入失败：该设备之后的点击与滑动改用 input 指令（reset_injectors 后重新探测）"""
+    with _INJECTORS_LOCK:
+        _INJECTORS[device_id] = None
+    print("⚠️ 触摸注入已停用，改用 input 指令")
+
+
+def reset_injectors(device_id: Optional[str] = None):
+    """丢弃已探测的注入器（设备重连或旋转方向变化后调用）"""
+    with _INJECTORS_LOCK:
+        if device_id is None:
+            _INJECTORS.clear()
+        else:
+            _INJECTORS.pop(device_id, None)
+
+
+# ============================================
+# 测试替身
+# ============================================
+FAKE_GETEVENT = """add device 1: /dev/input/event2
+  name:     "fake_touchscreen"
+  events:
+    KEY (0001): BTN_TOUCH
+    ABS (0003): ABS_MT_SLOT           : value 0, min 0, max 9, fuzz 0, flat 0, resolution 0
+                ABS_MT_TOUCH_MAJOR    : value 0, min 0, max 255, fuzz 0, flat 0, resolution 0
+                ABS_MT_POSITION_X     : value 0, min 0, max 1839, fuzz 0, flat 0, resolution 0
+                ABS_MT_POSITION_Y     : value 0, min 0, max 2799, fuzz 0, flat 0, resolution 0
+                ABS_MT_TRACKING_ID    : value 0, min 0, max 65535, fuzz 0, flat 0, resolution 0
+                ABS_MT_PRESSURE       : value 0, min 0, max 255, fuzz 0, flat 0, resolution 0
+  input props:
+    INPUT_PROP_DIRECT
+"""
+
+
+class FakeInputDevice:
+    """
+    离线替身：实现注入器用到的 ADBConnector 接口，解码写入的事件并记录触点轨迹
+    - input_latency: 模拟 `input` 指令的设备端耗时（秒）
+    - touches: [(tracking_id, [(x, y), ...])]，坐标为触摸屏原始坐标
+    """
+
+    def __init__(self, input_latency: float = 0.3, rotation: int = 1):
+        self.input_latency = input_latency
+        self.rotation = rotation
+        self.events: List[Event] = []
+        self.touches: List[Tuple[int, List[Tuple[int, int]]]] = []
+        self._slots: Dict[int, Tuple[int, List[Tuple[int, int]]]] = {}
+        self._slot = 0
+
+    def execute_adb(self, command: List[str], device_id: Optional[str] = None, timeout: int = 30) -> Optional[str]:
+        text = " ".join(command[1:])
+        if text.startswith("getevent"):
+            return FAKE_GETEVENT
+        if text.startswith("getprop"):
+            return "arm64-v8a\n"
+        if text.startswith("dumpsys input"):
+            return f"    SurfaceOrientation: {self.rotation}\n"
+        if text.startswith("input"):
+            time.sleep(self.input_latency)
+            return ""
+        return self._run_script(text.split(" ; "))
+
+    def get_shell_session(self, device_id: Optional[str] = None):
+        return self
+
+    def run(self, commands: List[str], timeout: float = 30) -> str:
+        return self._run_script(commands)
+
+    def _run_script(self, commands: List[str]) -> str:
+        """执行指令并返回回显：写入总是成功，`&& echo` 的标记原样输出"""
+        output = []
+        for command in commands:
+            if command.startswith("sleep "):
+                time.sleep(float(command.split()[1]))
+            elif command.startswith("printf '"):
+                payload = command[len("printf '"):command.rindex("'")]
+                data = bytes(int(code, 8) for code in re.findall(r"\\([0-7]{3})", payload))
+                for offset in range(0, len(data), 24):
+                    self._apply(struct.unpack_from("<qqHHi", data, offset)[2:])
+                if " && echo " in command:
+                    output.append(command.rsplit(" && echo ", 1)[1] + "\n")
+            elif command.startswith("input"):
+                time.sleep(self.input_latency)
+        return "".join(output)
+
+    def _apply(self, event: Event):
+        self.events.append(event)
+        ev_type, code, value = event
+        if ev_type != EV_ABS:
+            return
+        if code == ABS_MT_SLOT:
+            self._slot = value
+        elif code == ABS_MT_TRACKING_ID:
+            if value >= 0:
+                self._slots[self._slot] = (value, [])
+                self.touches.append(self._slots[self._slot])
+            else:
+                self._slots.pop(self._slot, None)
+        elif code in (ABS_MT_POSITION_X, ABS_MT_POSITION_Y) and self._slot in self._slots:
+            points = self._slots[self._slot][1]
+            if code == ABS_MT_POSITION_X:
+                points.append((value, points[-1][1] if points else 0))
+            else:
+                points[-1] = (points[-1][0], value)
@@ -0,0 +1,412 @@
+# -*- coding: utf-8 -*-
+"""
+OCR 服务与批量数字识别
+
+- OcrService: 进程级共享的 easyocr 模型，后台线程预热，脚本重启与 reload_utils 热重载后继续复用
+- BatchedDigitReader: 把同一帧上的多个数字区域（如密函卡片的持有数）拼成一次 OCR 推理，
+  只允许输出数字；每个区域按感知哈希缓存识别结果，画面未变化的区域不再重复识别。
+- GlyphDigitRecognizer: 基于游戏字体数字模板的轻量识别（连通域切分 + 逐字相关匹配），
+  与 easyocr.Reader 的 readtext_batched 接口兼容，可作为 BatchedDigitReader 的后端。
+  由配置项 "ocr_backend" 选择："easyocr"（默认）或 "glyph"
+"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from utils.tools import BASE_DIR, check_running, config_mgr, current_cancel_token
+
+DIGIT_ALLOWLIST = "0123456789"
+
+# 数字字形模板目录：文件名首字符为数字，如 0.png、7_1.png（同一数字可有多个变体）
+DIGIT_TEMPLATE_DIR = os.path.join(BASE_DIR, "templates", "digits")
+
+# 感知哈希中相邻像素的最小灰度差
+HASH_MARGIN = 6
+
+
+def crop_hash(image: np.ndarray, hash_width: int = 48, hash_height: int = 16) -> int:
+    """
+    差值哈希 (dHash)：缩放到小尺寸灰度后比较相邻像素，轻微噪声与亮度变化下保持不变
+    数字区域通常是扁长条，默认 48x16 的网格足以区分不同的数字串
+    相邻差值需超过 HASH_MARGIN 才记为 1，纯色背景上的像素噪声不会翻转哈希位
+    """
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (hash_width + 1, hash_height), interpolation=cv2.INTER_AREA).astype(np.int16)
+    bits = (small[:, 1:] - small[:, :-1] > HASH_MARGIN).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def parse_digits(texts: List[str]) -> Optional[int]:
+    """取识别文本中的最后一组数字，没有数字时返回 None"""
+    nums = re.findall(r'\d+', " ".join(texts))
+    return int(nums[-1]) if nums else None
+
+
+class BatchedDigitReader:
+    """
+    批量数字识别
+    - reader: easyocr.Reader 或 GlyphDigitRecognizer（任何提供 readtext_batched 的后端）
+    - cache_size: 感知哈希缓存保留的区域数量
+    多个设备线程共用同一实例，缓存与计数由 _lock 保护（推理本身不持锁）
+    """
+
+    def __init__(self, reader, cache_size: int = 256):
+        self.reader = reader
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[int, Optional[int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _pad_to(image: np.ndarray, height: int, width: int) -> np.ndarray:
+        """边缘复制填充到统一尺寸（不缩放，避免数字变形）"""
+        h, w = image.shape[:2]
+        return cv2.copyMakeBorder(image, 0, height - h, 0, width - w, cv2.BORDER_REPLICATE)
+
+    def _recognize(self, crops: List[np.ndarray]) -> List[Optional[int]]:
+        height = max(c.shape[0] for c in crops)
+        width = max(c.shape[1] for c in crops)
+        batch = [self._pad_to(c, height, width) for c in crops]
+        results = self.reader.readtext_batched(batch, allowlist=DIGIT_ALLOWLIST, detail=0)
+        return [parse_digits(texts) for texts in results]
+
+    def read_digits(self, crops: List[np.ndarray]) -> List[Optional[int]]:
+        """识别每个区域中的数字，返回与 crops 等长的列表（空区域或未识别为 None）"""
+        started = time.perf_counter()
+        values: List[Optional[int]] = [None] * len(crops)
+        pending, pending_keys = [], []
+        hits = 0
+
+        keys = [None if crop is None or crop.size == 0 else crop_hash(crop) for crop in crops]
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key is None:
+                    continue
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    values[i] = self._cache[key]
+                    hits += 1
+                else:
+                    pending.append(i)
+                    pending_keys.append(key)
+            self.hits += hits
+            self.misses += len(pending)
+
+        if pending:
+            results = self._recognize([crops[i] for i in pending])
+            with self._lock:
+                for i, key, value in zip(pending, pending_keys, results):
+                    values[i] = value
+                    self._cache[key] = value
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        elapsed = (time.perf_counter() - started) * 1000
+        print(f"      - OCR 批量识别 {len(crops)} 个区域（推理 {len(pending)} 个，缓存命中 {hits} 个）"
+              f"，耗时 {elapsed:.1f} ms")
+        return values
+
+
+# ============================================
+# 字形模板数字识别
+# ============================================
+# 归一化字形尺寸 (宽, 高)；宽高比与常见数字字形接近
+GLYPH_SIZE = (20, 32)
+# 粘连数字按 “字宽(含间距) / 字高” 估算个数
+GLYPH_PITCH = 0.8
+
+
+def binarize(image: np.ndarray) -> np.ndarray:
+    """Otsu 二值化，并统一为白色前景（前景像素占少数）"""
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    if cv2.countNonZero(binary) > binary.size / 2:
+        binary = 255 - binary
+    return binary
+
+
+def segment_glyphs(image: np.ndarray, min_height_ratio: float = 0.5) -> List[np.ndarray]:
+    """
+    连通域切分出从左到右的字形（二值图）
+    高度不足最高字形 min_height_ratio 的连通域（标点、噪点）被忽略；水平方向重叠的连通域合并为一个字形；
+    宽度大于高度的字形视为相邻数字粘连，按数字的常见宽高比等分
+    """
+    binary = binarize(image)
+    count, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    boxes = [tuple(int(v) for v in stats[i][:4]) for i in range(1, count) if stats[i][4] >= 4]
+    if not boxes:
+        return []
+    max_h = max(h for _, _, _, h in boxes)
+    boxes = sorted((b for b in boxes if b[3] >= max_h * min_height_ratio), key=lambda b: b[0])
+
+    merged = []
+    for x, y, w, h in boxes:
+        if merged and x < merged[-1][0] + merged[-1][2]:
+            mx, my, mw, mh = merged[-1]
+            nx, ny = min(mx, x), min(my, y)
+            merged[-1] = (nx, ny, max(mx + mw, x + w) - nx, max(my + mh, y + h) - ny)
+        else:
+            merged.append((x, y, w, h))
+
+    glyphs = []
+    for x, y, w, h in merged:
+        parts = max(2, int(round(w / (h * GLYPH_PITCH)))) if w > h else 1
+        bounds = np.linspace(x, x + w, parts + 1).astype(int)
+        glyphs.extend(binary[y:y + h, left:right] for left, right in zip(bounds[:-1], bounds[1:]))
+    return glyphs
+
+
+def normalize_glyph(glyph: np.ndarray) -> np.ndarray:
+    """按 GLYPH_SIZE 的宽高比居中填充后缩放，窄字形（如 1）保持其窄的特征"""
+    h, w = glyph.shape[:2]
+    target_w = max(w, int(round(h * GLYPH_SIZE[0] / GLYPH_SIZE[1])))
+    target_h = max(h, int(round(w * GLYPH_SIZE[1] / GLYPH_SIZE[0])))
+    left, top = (target_w - w) // 2, (target_h - h) // 2
+    padded = cv2.copyMakeBorder(glyph, top, target_h - h - top, left, target_w - w - left,
+                                cv2.BORDER_CONSTANT, value=0)
+    return cv2.resize(padded, GLYPH_SIZE, interpolation=cv2.INTER_AREA)
+
+
+def _unit_vectors(glyphs: np.ndarray) -> np.ndarray:
+    """(N, H, W) 字形展平为去均值的单位向量，两两点积即 TM_CCOEFF_NORMED 相关度"""
+    flat = glyphs.reshape(len(glyphs), -1).astype(np.float32)
+    flat -= flat.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(flat, axis=1, keepdims=True)
+    return flat / np.maximum(norms, 1e-6)
+
+
+class GlyphDigitRecognizer:
+    """
+    字形模板数字识别
+    - template_dir: 数字模板目录（见 DIGIT_TEMPLATE_DIR），可用 extract_templates 从已标注截图生成
+    - threshold: 字形与最佳模板的最低相关度，低于该值的字形（非数字字符）被忽略
+    """
+
+    def __init__(self, template_dir: str = DIGIT_TEMPLATE_DIR, threshold: float = 0.7):
+        self.template_dir = template_dir
+        self.threshold = threshold
+        self.templates: List[Tuple[str, np.ndarray]] = []
+        self._labels: List[str] = []
+        self._matrix: Optional[np.ndarray] = None
+        self.load()
+
+    def load(self) -> int:
+        self.templates = []
+        if os.path.isdir(self.template_dir):
+            for name in sorted(os.listdir(self.template_dir)):
+                if not (name[:1].isdigit() and name.lower().endswith(".png")):
+                    continue
+                data = np.fromfile(os.path.join(self.template_dir, name), dtype=np.uint8)
+                image = cv2.imdecode(data, cv2.IMREAD_GRAYSCALE) if data.size else None
+                if image is not None:
+                    glyph = image if image.shape[::-1] == GLYPH_SIZE else normalize_glyph(binarize(image))
+                    self.templates.append((name[0], glyph))
+        # 全部模板预先展平为矩阵，一次矩阵乘法即可得到字形与所有模板的相关度
+        self._labels = [digit for digit, _ in self.templates]
+        self._matrix = _unit_vectors(np.stack([glyph for _, glyph in self.templates])) if self.templates else None
+        return len(self.templates)
+
+    def classify_all(self, glyphs: List[np.ndarray]) -> List[Tuple[Optional[str], float]]:
+        """逐个字形返回 (最相似的数字, 相关度)"""
+        if self._matrix is None or not glyphs:
+            return [(None, 0.0)] * len(glyphs)
+        scores = _unit_vectors(np.stack([normalize_glyph(g) for g in glyphs])) @ self._matrix.T
+        best = scores.argmax(axis=1)
+        return [(self._labels[j], float(scores[i, j])) for i, j in enumerate(best)]
+
+    def classify(self, glyph: np.ndarray) -> Tuple[Optional[str], float]:
+        return self.classify_all([glyph])[0]
+
+    def recognize(self, image: np.ndarray) -> str:
+        return "".join(digit for digit, score in self.classify_all(segment_glyphs(image))
+                       if digit is not None and score >= self.threshold)
+
+    def readtext_batched(self, images: List[np.ndarray], allowlist: Optional[str] = None, detail: int = 0, **kwargs):
+        """与 easyocr.Reader.readtext_batched(detail=0) 返回格式一致：每张图一个文本列表"""
+        results = []
+        for image in images:
+            text = self.recognize(image)
+            results.append([text] if text else [])
+        return results
+
+    def extract_templates(self, image: np.ndarray, label: str) -> int:
+        """
+        从已知数值的截图区域切出字形保存为模板，返回保存数量
+        字形多于 label 位数时取最右侧的若干个（数字通常位于“持有：”等文字之后）；
+        存在宽度大于高度的字形（相邻数字粘连）时整张跳过，避免错位生成错误模板
+        """
+        glyphs = segment_glyphs(image)
+        if len(glyphs) < len(label) or any(g.shape[1] > g.shape[0] for g in glyphs[len(glyphs) - len(label):]):
+            return 0
+        os.makedirs(self.template_dir, exist_ok=True)
+        saved = 0
+        for digit, glyph in zip(label, glyphs[len(glyphs) - len(label):]):
+            index = sum(1 for name in os.listdir(self.template_dir) if name.startswith(digit))
+            path = os.path.join(self.template_dir, f"{digit}_{index}.png")
+            ok, buf = cv2.imencode(".png", normalize_glyph(glyph))
+            if ok:
+                buf.tofile(path)
+                saved += 1
+        return saved
+
+
+# ============================================
+# 进程级共享 OCR 服务
+# ============================================
+class OcrService:
+    """
+    共享的 easyocr 模型
+    - warm_up(): 在后台线程加载模型并做一次空推理，立即返回（可重复调用）
+    - get_reader(): 返回已加载的 Reader，尚未加载完成时阻塞等待（可被停止信号打断）
+    - digit_reader(): 共享的 BatchedDigitReader，识别缓存在脚本重启之间保留
+    """
+
+    def __init__(self, langs: Tuple[str, ...] = ("ch_sim", "en")):
+        self.langs = tuple(langs)
+        self.load_seconds: Optional[float] = None
+        self._reader = None
+        self._digit_reader: Optional[BatchedDigitReader] = None
+        self._error: Optional[Exception] = None
+        self._ready = threading.Event()
+        self._waiters: List[threading.Event] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set() and self._reader is not None
+
+    def warm_up(self) -> "OcrService":
+        with self._lock:
+            if self._thread is None or (self._ready.is_set() and self._error is not None):
+                self._ready.clear()
+                self._error = None
+                self._thread = threading.Thread(target=self._load, name="OcrWarmUp", daemon=True)
+                self._thread.start()
+        return self
+
+    def _load(self):
+        started = time.perf_counter()
+        try:
+            import easyocr
+            print(f"正在后台加载 OCR 模型 {list(self.langs)}...")
+            reader = easyocr.Reader(list(self.langs))
+            # 空推理一次，触发推理后端的懒初始化
+            reader.readtext(np.zeros((32, 96, 3), dtype=np.uint8), detail=0)
+            self._reader = reader
+            self.load_seconds = time.perf_counter() - started
+            print(f"✅ OCR 模型已就绪，耗时 {self.load_seconds:.1f}s")
+        except Exception as e:
+            self._error = e
+            print(f"❌ OCR 模型加载失败: {e}")
+        finally:
+            with self._lock:
+                self._ready.set()
+                waiters, self._waiters = self._waiters, []
+            for wake in waiters:
+                wake.set()
+
+    def get_reader(self, timeout: Optional[float] = None):
+        self.warm_up()
+        if not self._ready.is_set():
+            # 等待加载完成或停止信号，二者任一到达即唤醒
+            wake = threading.Event()
+            with self._lock:
+                if self._ready.is_set():
+                    wake.set()
+                else:
+                    self._waiters.append(wake)
+            token = current_cancel_token()
+            token.on_cancel(wake.set)
+            try:
+                wake.wait(timeout)
+            finally:
+                token.remove_callback(wake.set)
+                with self._lock:
+                    if wake in self._waiters:
+                        self._waiters.remove(wake)
+            check_running()
+        if self._error is not None:
+            raise RuntimeError(f"OCR 模型加载失败: {self._error}")
+        if self._reader is None:
+            raise RuntimeError("OCR 模型加载超时")
+        return self._reader
+
+    def digit_reader(self) -> BatchedDigitReader:
+        if self._digit_reader is None:
+            # 等待模型加载可能阻塞，放在锁外；创建合批识别器在锁内完成，保证多个设备线程共用同一实例
+            reader = self.get_reader()
+            with self._lock:
+                if self._digit_reader is None:
+                    self._digit_reader = BatchedDigitReader(reader)
+        return self._digit_reader
+
+
+def script_uses_ocr(script_path: str) -> bool:
+    """脚本源码中引用了 utils.ocr 时返回 True，用于在连接设备前提前预热模型"""
+    try:
+        with open(script_path, "r", encoding="utf-8") as f:
+            return "utils.ocr" in f.read()
+    except OSError:
+        return False
+
+
+# reload_utils 热重载会重新执行本模块：保留已加载的服务，避免重复加载模型
+try:
+    _OCR_SERVICES
+except NameError:
+    _OCR_SERVICES: Dict[Tuple[str, ...], OcrService] = {}
+    _GLYPH_READERS: Dict[str, BatchedDigitReader] = {}
+_OCR_SERVICES_LOCK = threading.Lock()
+
+
+def get_ocr_service(langs: Tuple[str, ...] = ("ch_sim", "en")) -> OcrService:
+    """按语言组合返回进程级共享的 OCR 服务（不会触发加载，需要时调用 warm_up / get_reader）"""
+    key = tuple(langs)
+    with _OCR_SERVICES_LOCK:
+        service = _OCR_SERVICES.get(key)
+        if service is None:
+            service = _OCR_SERVICES[key] = OcrService(key)
+        return service
+
+
+_fallback_warned = False
+
+
+def get_digit_backend() -> str:
+    """当前配置的数字识别后端；选择 glyph 但没有数字模板时回退 easyocr（只提示一次）"""
+    global _fallback_warned
+    backend = config_mgr.get("ocr_backend", "easyocr")
+    if backend == "glyph" and DIGIT_TEMPLATE_DIR not in _GLYPH_READERS and not (
+            os.path.isdir(DIGIT_TEMPLATE_DIR) and any(n[:1].isdigit() for n in os.listdir(DIGIT_TEMPLATE_DIR))):
+        if not _fallback_warned:
+            _fallback_warned = True
+            print(f"⚠️ 未找到数字模板 ({DIGIT_TEMPLATE_DIR})，数字识别回退到 easyocr")
+        return "easyocr"
+    return backend
+
+
+def get_digit_reader(backend: Optional[str] = None) -> BatchedDigitReader:
+    """按配置返回共享的批量数字识别器"""
+    backend = backend or get_digit_backend()
+    if backend == "glyph":
+        with _OCR_SERVICES_LOCK:
+            if DIGIT_TEMPLATE_DIR not in _GLYPH_READERS:
+                _GLYPH_READERS[DIGIT_TEMPLATE_DIR] = BatchedDigitReader(GlyphDigitRecognizer(DIGIT_TEMPLATE_DIR))
+            return _GLYPH_READERS[DIGIT_TEMPLATE_DIR]
+    return get_ocr_service().digit_reader()
+
+
+def warm_up_ocr():
+    """按配置预热数字识别后端：easyocr 在后台加载模型，glyph 后端只需读取少量模板"""
+    if get_digit_backend() == "glyph":
+        get_digit_reader("glyph")
+    else:
+        get_ocr_service().warm_up()
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+自适应轮询调度
+
+wait_until_match / wait_until_any 在逐次截图模式下不再按固定间隔轮询：
+- 按 (脚本, 设备, 模板) 记录历次等待成功所用的时间，持久化到 wait_history.json（设备快慢不同，互不混用）
+- 有历史时：距离最早的典型完成时间还远则稀疏轮询，进入预期完成区间后加密；
+  超过历史最长用时仍未出现则回到默认间隔
+- 无历史时：短等待按超时的 1/10 轮询（5 秒的状态探测也能尝试约 10 次），长等待沿用默认间隔
+休眠时长总会截断到剩余超时时间内，超时语义不变；休眠由调用方通过取消令牌执行，停止信号立即生效
+
+用法：
+    scheduler = PollScheduler(wait_key("templates/restart.png", device_id), timeout=300, interval=1.5)
+    ...
+    smart_sleep(scheduler.next_delay(elapsed))
+    ...
+    scheduler.record(elapsed)   # 等待成功时记录用时
+"""
+import atexit
+import json
+import os
+import sys
+import threading
+from typing import Dict, List, Optional
+
+from utils.tools import BASE_DIR, config_mgr
+
+HISTORY_PATH = os.path.join(BASE_DIR, "wait_history.json")
+SCRIPTS_DIR = os.path.normcase(os.path.join(BASE_DIR, "scripts"))
+# 记录后延迟写盘的时长（秒），期间的多次记录合并为一次写入
+SAVE_DELAY = 5.0
+# 每个等待目标保留的历史条数
+HISTORY_SIZE = 20
+# 历史样本不少于该数量时才按历史调度
+MIN_SAMPLES = 3
+# 加密轮询的最短间隔与稀疏轮询的最长间隔（秒）
+MIN_INTERVAL = 0.3
+MAX_INTERVAL = 15.0
+
+
+class WaitHistory:
+    """
+    各等待目标的历史用时（秒），首次使用时从磁盘读取
+    记录只更新内存，SAVE_DELAY 秒后由后台定时器合并写盘；运行结束与进程退出时调用 flush 立即写回
+    """
+
+    def __init__(self, path: str = HISTORY_PATH):
+        self.path = path
+        self._data: Optional[Dict[str, List[float]]] = None
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self._timer: Optional[threading.Timer] = None
+
+    def _load(self) -> Dict[str, List[float]]:
+        if self._data is None:
+            self._data = {}
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        self._data = json.load(f)
+                except Exception as e:
+                    print(f"读取等待历史失败: {e}")
+        return self._data
+
+    def _mark_dirty(self):
+        """持锁调用：标记有未写盘的记录，并在没有待执行的定时器时安排一次延迟写盘"""
+        self._dirty = True
+        if self._timer is None:
+            self._timer = threading.Timer(SAVE_DELAY, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """立即写回未保存的记录（序列化在锁内完成，文件读写不占用记录锁）"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return
+            self._dirty = False
+            text = json.dumps(self._data, ensure_ascii=False, indent=2)
+        with self._save_lock:
+            try:
+                tmp_path = self.path + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(text)
+                os.replace(tmp_path, self.path)
+            except Exception as e:
+                print(f"保存等待历史失败: {e}")
+
+    def durations(self, key: str) -> List[float]:
+        with self._lock:
+            return list(self._load().get(key, []))
+
+    def record(self, key: str, seconds: float):
+        with self._lock:
+            samples = self._load().setdefault(key, [])
+            samples.append(round(seconds, 2))
+            del samples[:-HISTORY_SIZE]
+            self._mark_dirty()
+
+    def clear(self, key: Optional[str] = None):
+        with self._lock:
+            data = self._load()
+            if key is None:
+                data.clear()
+            else:
+                data.pop(key, None)
+            self._dirty = True
+        self.flush()
+
+
+wait_history = WaitHistory()
+atexit.register(wait_history.flush)
+
+
+def current_script_name() -> str:
+    """调用栈中最近的 scripts/ 下脚本文件名；不在脚本中调用时返回空字符串"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        path = frame.f_code.co_filename
+        if os.path.normcase(os.path.dirname(os.path.abspath(path))) == SCRIPTS_DIR:
+            return os.path.basename(path)
+        frame = frame.f_back
+    return ""
+
+
+def wait_key(target: str, device_id: Optional[str] = None) -> str:
+    """等待目标的历史键：脚本名|设备|模板（多个模板以逗号连接；未知的部分省略）"""
+    parts = [current_script_name(), device_id, target]
+    return "|".join(part for part in parts if part)
+
+
+class PollScheduler:
+    """
+    单次等待的轮询间隔
+    - key: 历史键（见 wait_key）
+    - timeout / interval: 等待函数的超时与默认轮询间隔
+    """
+
+    def __init__(self, key: str, timeout: float, interval: float, history: WaitHistory = wait_history):
+        self.key = key
+        self.timeout = timeout
+        self.interval = interval
+        self.history = history
+        self.polls = 0
+        # (最早典型完成时间, 中位数, 最长用时)
+        self.expected = None
+        if config_mgr.get("adaptive_polling", True):
+            samples = sorted(history.durations(key))
+            if len(samples) >= MIN_SAMPLES:
+                # 最早典型完成时间留 10% 余量：早于它出现时记录的用时会更短，历史得以向更快的设备/版本收敛
+                self.expected = (samples[len(samples) // 10] * 0.9, samples[len(samples) // 2], samples[-1])
+                print(f"  预计 {self.expected[1]:.1f}s 内出现（历史 {len(samples)} 次，"
+                      f"{self.expected[0]:.1f}s ~ {self.expected[2]:.1f}s）")
+
+    def next_delay(self, elapsed: float) -> float:
+        """本次未命中后到下一次截图的休眠时长"""
+        self.polls += 1
+        if not config_mgr.get("adaptive_polling", True):
+            delay = self.interval
+        elif self.expected is None:
+            # 无历史：短等待加密，保证短探测也有足够的尝试次数
+            delay = self.interval if self.timeout >= 10 * self.interval else max(MIN_INTERVAL, self.timeout / 10)
+        else:
+            earliest, _, latest = self.expected
+            if elapsed < earliest:
+                # 每次休眠剩余距离的一半，越接近预期完成时间越密
+                delay = min(MAX_INTERVAL, max(self.interval, (earliest - elapsed) / 2), earliest - elapsed)
+            elif elapsed <= latest * 1.1:
+                delay = max(MIN_INTERVAL, self.interval / 3)
+            else:
+                delay = self.interval
+        return max(0.0, min(delay, self.timeout - elapsed))
+
+    def record(self, elapsed: float):
+        """等待成功：记录用时供下次调度（超时的等待不记录）"""
+        if config_mgr.get("adaptive_polling", True):
+            self.history.record(self.key, elapsed)
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+子进程脚本运行器
+
+脚本在独立子进程中运行：OCR / 模板匹配等 CPU 密集计算不再与 GUI 争抢同一个 GIL，
+time.sleep 的可中断替换也只发生在子进程内部，GUI 进程中的 Qt 线程不受影响。
+- 状态与日志：子进程经 multiprocessing.Queue 回传 ("status", ...) / ("log", ...) / ("finished", ...) 消息
+- 停止：父进程置位 multiprocessing.Event，子进程监听线程收到后立即设置停止标志；
+  超过宽限时间仍未退出则 terminate 强制结束
+
+用法：
+    proc = ScriptProcess("scripts/活动.py", "emulator-5554").start()
+    for msg in proc.poll(timeout=0.2): ...
+    proc.stop()
+"""
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import traceback
+from typing import List, Optional, Tuple
+
+# Windows 与 macOS 默认即为 spawn；统一使用 spawn，避免 fork 带入 GUI 进程的 Qt 状态
+_MP = multiprocessing.get_context("spawn")
+
+
+class _QueueStream:
+    """子进程的 stdout：按行转发到父进程日志"""
+
+    def __init__(self, out_queue):
+        self.out_queue = out_queue
+
+    def write(self, text):
+        # 与 GUI 的 EmittingStream 一致，过滤空行
+        if text.strip():
+            self.out_queue.put(("log", str(text)))
+
+    def flush(self):
+        pass
+
+
+def _child_main(script_path: str, device_id: str, project_root: str, stop_event, out_queue):
+    """子进程入口（需为模块级函数才能被 spawn 序列化）"""
+    sys.stdout = _QueueStream(out_queue)
+    if project_root not in sys.path:
+        sys.path.insert(0, project_root)
+    os.chdir(project_root)
+
+    state, error = "已完成", None
+    try:
+        from utils import tools
+        from utils.tools import StopScriptException
+    except Exception as e:
+        print(f"❌ 运行出错: {e}\n{traceback.format_exc()}")
+        out_queue.put(("finished", "出错", str(e)))
+        return
+
+    try:
+        tools.status_notifier.callback = lambda current_round, step_desc, total_round=None: out_queue.put(
+            ("status", current_round, step_desc, total_round))
+        tools.status_notifier.log_callback = lambda text: out_queue.put(("log", text))
+        tools.set_running_state(True)
+
+        def _watch_stop():
+            stop_event.wait()
+            tools.set_running_state(False)
+
+        threading.Thread(target=_watch_stop, name="StopWatcher", daemon=True).start()
+
+        file_name = os.path.basename(script_path)
+        print(f"=== 正在子进程中启动脚本: {file_name} (PID {os.getpid()}) ===")
+        from utils import ocr
+        if ocr.script_uses_ocr(script_path):
+            ocr.warm_up_ocr()
+        connector = tools.ADBConnector()
+        tools.init_resolution(connector, device_id)
+        count = tools.template_registry.preload(os.path.join(project_root, "templates"))
+        print(f"✅ 已预加载 {count} 个模板")
+
+        from utils.fleet import load_script_module
+        with tools.interruptible_time_sleep():
+            module = load_script_module(script_path, device_id or "default")
+            if hasattr(module, "run"):
+                module.run(device_id)
+            elif hasattr(module, "main"):
+                module.main()
+            else:
+                state, error = "出错", f"{file_name} 中未找到 run(device_id) 或 main() 函数"
+                print(f"错误: {error}")
+        # 脚本（如 StateMachine.run）自行捕获了停止异常时也按令牌判断是否为用户停止
+        if state == "已完成" and tools.get_run_token().cancelled:
+            state = "已停止"
+    except StopScriptException:
+        state = "已停止"
+        print(">>> 🛑 脚本已成功停止")
+    except Exception as e:
+        state, error = "出错", str(e)
+        print(f"❌ 运行出错: {e}\n{traceback.format_exc()}")
+    finally:
+        # 子进程退出时不执行 atexit，需在此写回等待历史
+        from utils.poll_scheduler import wait_history
+        wait_history.flush()
+        out_queue.put(("finished", state, error))
+
+
+class ScriptProcess:
+    """
+    单个脚本子进程
+    - poll(timeout): 取回子进程发来的全部消息，timeout 为等待第一条消息的最长时间
+    - stop(grace): 发送停止事件，grace 秒后仍未退出则强制结束
+    """
+
+    def __init__(self, script_path: str, device_id: Optional[str] = None, project_root: Optional[str] = None):
+        self.script_path = script_path
+        self.device_id = device_id
+        self.project_root = project_root or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self._stop_event = _MP.Event()
+        self._queue = _MP.Queue()
+        self._process = None
+        self._kill_timer: Optional[threading.Timer] = None
+
+    def start(self) -> "ScriptProcess":
+        if not os.path.exists(self.script_path):
+            raise FileNotFoundError(f"错误: 找不到文件 {self.script_path}")
+        self._process = _MP.Process(
+            target=_child_main,
+            args=(self.script_path, self.device_id, self.project_root, self._stop_event, self._queue),
+            name=f"Script-{self.device_id}",
+            daemon=True,
+        )
+        self._process.start()
+        return self
+
+    @property
+    def is_alive(self) -> bool:
+        return self._process is not None and self._process.is_alive()
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self._process.pid if self._process is not None else None
+
+    def stop(self, grace: float = 5.0):
+        self._stop_event.set()
+        if self.is_alive and self._kill_timer is None:
+            self._kill_timer = threading.Timer(grace, self._terminate)
+            self._kill_timer.daemon = True
+            self._kill_timer.start()
+
+    def _terminate(self):
+        if self.is_alive:
+            print(f"⚠️ 脚本子进程 {self.pid} 未在宽限时间内退出，强制结束")
+            self._process.terminate()
+            # 子进程被强杀时不会再发送 finished，这里补发一条
+            self._queue.put(("finished", "已停止", None))
+
+    def poll(self, timeout: float = 0.0) -> List[Tuple]:
+        messages = []
+        try:
+            messages.append(self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait())
+            while True:
+                messages.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return messages
+
+    def join(self, timeout: Optional[float] = None):
+        if self._process is not None:
+            self._process.join(timeout)
+        if self._kill_timer is not None and not self.is_alive:
+            self._kill_timer.cancel()
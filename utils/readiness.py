@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+画面就绪检测
+
+脚本原本在进场后固定 time.sleep(15/20)、点击结算确认后固定 time.sleep(3)：快设备上白等，慢设备上又不够。
+就绪检测把固定时长只当作上限：
+- wait_until_ready：以 templates/hud/ 下的摇杆、大招按钮模板为 HUD 锚点（用 capture_hud.py 在战斗中截取），
+  连续两次检测到任一锚点即视为加载完成；尚未截取锚点时仍按固定时长等待
+  （加载图本身常是静止画面，不能用画面静止判断加载完成）
+- wait_until_settled：点击后画面出现变化、且之后静止 SETTLE_SECONDS 秒即继续（用于结算确认等过渡动画）
+每次等待较固定时长节省的时间按设备累计，StateMachine 在每轮结束时打印本轮节省（report_round）
+
+用法：
+    wait_until_ready(connector, dev, 20, label="加载")   # 代替 time.sleep(20)
+    wait_until_settled(connector, dev, 3)                # 代替 点击后的 time.sleep(3)
+"""
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from utils.tools import (BASE_DIR, ADBConnector, ChangeGate, DeviceContext, ImageMatcher, adapt_region,
+                         check_running, config_mgr, get_device_context, grab_screen, smart_sleep)
+
+HUD_DIR = "templates/hud"
+# HUD 锚点：名称 → 基础分辨率下的截取区域 (x1, y1, x2, y2)（摇杆中心 (450, 1440)、大招按钮 (2050, 1650)）
+HUD_ANCHORS: Dict[str, Tuple[int, int, int, int]] = {
+    "joystick": (270, 1260, 630, 1620),
+    "ult": (1950, 1550, 2150, 1750),
+}
+# 匹配锚点时在截取区域外扩的搜索范围（基础分辨率像素）
+ANCHOR_PAD = 120
+# 锚点需连续命中的次数（HUD 淡入过程中单帧命中不算）
+ANCHOR_HITS = 2
+# 画面静止的分块灰度差阈值与判定时长（秒）
+STILL_THRESHOLD = 2.0
+SETTLE_SECONDS = 0.5
+POLL_INTERVAL = 0.3
+
+# 尚未截取 HUD 锚点的提示只打印一次
+_anchor_hint_shown = False
+
+
+def anchor_path(name: str) -> str:
+    return f"{HUD_DIR}/{name}.png"
+
+
+def available_anchors() -> Dict[str, str]:
+    """已截取的 HUD 锚点模板 {名称: 模板路径}"""
+    return {name: anchor_path(name) for name in HUD_ANCHORS
+            if os.path.exists(os.path.join(BASE_DIR, anchor_path(name)))}
+
+
+def anchor_search_regions(device_id: Optional[str] = None,
+                          device_ctx: Optional[DeviceContext] = None) -> Dict[str, tuple]:
+    """各锚点的搜索区域（设备像素）"""
+    return {name: adapt_region((x1 - ANCHOR_PAD, y1 - ANCHOR_PAD, x2 + ANCHOR_PAD, y2 + ANCHOR_PAD),
+                               device_id, device_ctx)
+            for name, (x1, y1, x2, y2) in HUD_ANCHORS.items()}
+
+
+class ReadinessStats:
+    """各设备就绪等待的用时与节省时间（相对固定等待时长）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[str, float] = {}
+        self.total_saved: Dict[str, float] = {}
+        self.waits: Dict[str, int] = {}
+
+    def record(self, device_id: Optional[str], saved: float):
+        key = device_id or ""
+        with self._lock:
+            self._pending[key] = self._pending.get(key, 0.0) + saved
+            self.total_saved[key] = self.total_saved.get(key, 0.0) + saved
+            self.waits[key] = self.waits.get(key, 0) + 1
+
+    def round_saved(self, device_id: Optional[str]) -> Optional[float]:
+        """取出自上次调用以来该设备节省的时间；期间没有就绪等待时返回 None"""
+        with self._lock:
+            return self._pending.pop(device_id or "", None)
+
+
+readiness_stats = ReadinessStats()
+
+
+def report_round(device_id: Optional[str]):
+    """打印本轮就绪检测较固定等待节省的时间（每轮结束时调用）"""
+    saved = readiness_stats.round_saved(device_id)
+    if saved is not None:
+        total = readiness_stats.total_saved.get(device_id or "", 0.0)
+        print(f"  本轮就绪检测较固定等待节省 {saved:.1f}s（累计 {total:.1f}s）")
+
+
+def _finish(device_id: Optional[str], label: str, fixed: float, elapsed: float, reason: str) -> float:
+    saved = max(0.0, fixed - elapsed)
+    readiness_stats.record(device_id, saved)
+    print(f"  ✓ {label}就绪（{reason}）用时 {elapsed:.1f}s，较固定等待 {fixed:g}s 节省 {saved:.1f}s")
+    return elapsed
+
+
+class StillnessTracker:
+    """
+    画面静止跟踪（沿用 ChangeGate 的缩略图与分块差异，但不参与门控统计）：
+    记录画面是否变化过及最近一次变化的时刻
+    """
+
+    def __init__(self):
+        self.reference = None
+        self.changed = False
+        self.still_since = time.time()
+
+    def update(self, gray) -> float:
+        """送入一帧，返回画面已静止的秒数"""
+        thumb = ChangeGate.thumbnail(gray)
+        if self.reference is None or self.reference.shape != thumb.shape:
+            # 首帧只作为比较基准
+            self.reference = thumb
+        elif ChangeGate.tile_diff(thumb, self.reference) >= STILL_THRESHOLD:
+            self.reference = thumb
+            self.changed = True
+            self.still_since = time.time()
+        return time.time() - self.still_since
+
+
+def _grab_gray(connector: ADBConnector, device_id: Optional[str]):
+    screen = grab_screen(connector, device_id)
+    return ImageMatcher.to_gray(screen) if screen is not None else None
+
+
+def wait_until_ready(connector: ADBConnector, device_id: Optional[str], max_wait: float, label: str = "加载",
+                     device_ctx: Optional[DeviceContext] = None) -> float:
+    """
+    等待进场加载完成，最多 max_wait 秒（原固定等待时长），返回实际用时
+    没有 HUD 锚点模板或关闭 readiness_detection 时等同固定等待
+    """
+    global _anchor_hint_shown
+    anchors = available_anchors()
+    if not config_mgr.get("readiness_detection", True) or not anchors:
+        if not anchors and not _anchor_hint_shown:
+            _anchor_hint_shown = True
+            print(f"  提示: {HUD_DIR}/ 下没有 HUD 锚点模板，加载按固定时长等待；可在战斗中运行 capture_hud.py 截取")
+        smart_sleep(max_wait)
+        return max_wait
+
+    ctx = device_ctx or get_device_context(device_id)
+    regions = anchor_search_regions(device_id, ctx)
+    start = time.time()
+    hits = 0
+
+    while True:
+        check_running(device_id)
+        elapsed = time.time() - start
+        if elapsed >= max_wait:
+            return _finish(device_id, label, max_wait, max_wait, "达到上限")
+        gray = _grab_gray(connector, device_id)
+        if gray is not None:
+            res = ImageMatcher.match_any(gray, anchors, device_id=device_id, regions=regions, device_ctx=ctx)
+            hits = hits + 1 if res["name"] else 0
+            if hits >= ANCHOR_HITS:
+                return _finish(device_id, label, max_wait, time.time() - start, f"HUD 锚点 {res['name']}")
+        smart_sleep(min(POLL_INTERVAL, max(0.0, max_wait - (time.time() - start))))
+
+
+def wait_until_settled(connector: ADBConnector, device_id: Optional[str], max_wait: float,
+                       label: str = "过渡动画") -> float:
+    """点击后等待画面变化并恢复静止 SETTLE_SECONDS 秒，最多 max_wait 秒（原固定等待时长），返回实际用时"""
+    if not config_mgr.get("readiness_detection", True):
+        smart_sleep(max_wait)
+        return max_wait
+
+    tracker = StillnessTracker()
+    start = time.time()
+
+    while True:
+        check_running(device_id)
+        if time.time() - start >= max_wait:
+            return _finish(device_id, label, max_wait, max_wait, "达到上限")
+        gray = _grab_gray(connector, device_id)
+        if gray is not None and tracker.update(gray) >= SETTLE_SECONDS and tracker.changed:
+            return _finish(device_id, label, max_wait, time.time() - start, "画面静止")
+        smart_sleep(min(POLL_INTERVAL, max(0.0, max_wait - (time.time() - start))))
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""
+摇杆路线：录制与回放
+
+入场跑位原本写成一串 joystick.move('w', 3.5); joystick.move('a', 8.5); ...，每一段都是一次单独的 ADB 往返。
+路线把这些移动写成紧凑的记录列表，回放时一次性算好每段的随机扰动，编译为一条手势时间线整体下发。
+
+路线格式（两种写法等价）：
+- 文本：空格分隔的 "方向:秒数[:walk]"，方向为 w/a/s/d 组合或 "@dx,dy" 向量；"wait:秒数" 表示抬手停顿
+      "w:3.5 a:8.5 w:6.5 a:22"
+- JSON 记录（routes/<脚本名>.json 中按路线名保存，录制器输出此格式）：
+      {"entry": [{"vector": [0, -1], "duration": 3.5, "mode": "run"}, {"wait": 0.3}, ...]}
+
+用法：
+    route = load_route(__file__, "entry", default="w:3.5 a:8.5 w:6.5 a:22")
+    play_route(joystick, route)
+
+录制：见根目录 record_route.py（在设备上手动走一遍，从触摸事件中提取摇杆路线）
+"""
+import json
+import math
+import os
+import re
+import subprocess
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+
+from utils.tools import BASE_DIR, DeviceContext, current_cancel_token, get_device_context
+
+ROUTES_DIR = os.path.join(BASE_DIR, "routes")
+
+# 录制时：方向变化超过该角度（度）即切分为新的一段；位移小于摇杆半径该比例时视为未推动
+SPLIT_ANGLE = 25.0
+DEADZONE_RATIO = 0.3
+# 短于该时长的段与停顿忽略（秒）
+MIN_LEG = 0.15
+
+
+class RouteLeg(NamedTuple):
+    """路线中的一段：vector 为 None 时表示抬手停顿 duration 秒"""
+    vector: Optional[Tuple[float, float]]
+    duration: float
+    mode: str = "run"
+
+    def to_record(self) -> Dict:
+        if self.vector is None:
+            return {"wait": round(self.duration, 2)}
+        return {"vector": [round(self.vector[0], 3), round(self.vector[1], 3)],
+                "duration": round(self.duration, 2), "mode": self.mode}
+
+
+Route = Tuple[RouteLeg, ...]
+
+_DIRECTIONS = {"w": (0, -1), "s": (0, 1), "a": (-1, 0), "d": (1, 0)}
+
+
+def _direction_vector(text: str) -> Tuple[float, float]:
+    if text.startswith("@"):
+        dx, dy = (float(v) for v in text[1:].split(","))
+    else:
+        if not text or set(text) - set(_DIRECTIONS):
+            raise ValueError(f"无效的方向: {text}")
+        dx = sum(_DIRECTIONS[c][0] for c in text)
+        dy = sum(_DIRECTIONS[c][1] for c in text)
+    norm = math.hypot(dx, dy)
+    if norm == 0:
+        raise ValueError(f"方向向量为零: {text}")
+    return dx / norm, dy / norm
+
+
+@lru_cache(maxsize=128)
+def parse_route(text: str) -> Route:
+    """解析文本路线（结果按文本缓存）"""
+    legs = []
+    for token in text.split():
+        parts = token.lower().split(":")
+        if parts[0] == "wait":
+            legs.append(RouteLeg(None, float(parts[1])))
+            continue
+        if len(parts) not in (2, 3):
+            raise ValueError(f"无效的路线片段: {token}")
+        mode = parts[2] if len(parts) == 3 else "run"
+        legs.append(RouteLeg(_direction_vector(parts[0]), float(parts[1]), mode))
+    return tuple(legs)
+
+
+def route_from_records(records: List[Dict]) -> Route:
+    legs = []
+    for record in records:
+        if "wait" in record:
+            legs.append(RouteLeg(None, float(record["wait"])))
+        else:
+            dx, dy = record["vector"]
+            norm = math.hypot(dx, dy) or 1.0
+            legs.append(RouteLeg((dx / norm, dy / norm), float(record["duration"]), record.get("mode", "run")))
+    return tuple(legs)
+
+
+def format_route(route: Route) -> str:
+    """路线转为文本写法（轴向用 w/a/s/d，其余写成向量）"""
+    tokens = []
+    for leg in route:
+        if leg.vector is None:
+            tokens.append(f"wait:{leg.duration:g}")
+            continue
+        name = next((k for k, v in _WASD_VECTORS.items() if math.isclose(v[0], leg.vector[0], abs_tol=1e-3)
+                     and math.isclose(v[1], leg.vector[1], abs_tol=1e-3)), None)
+        direction = name or f"@{leg.vector[0]:.3f},{leg.vector[1]:.3f}"
+        tokens.append(f"{direction}:{leg.duration:g}" + (":walk" if leg.mode == "walk" else ""))
+    return " ".join(tokens)
+
+
+_WASD_VECTORS = {name: _direction_vector(name) for name in ("w", "s", "a", "d", "wa", "wd", "sa", "sd")}
+
+
+# ============================================
+# 按脚本缓存的路线文件
+# ============================================
+_ROUTE_FILES: Dict[str, Tuple[float, Dict[str, Route]]] = {}
+_ROUTE_LOCK = threading.Lock()
+
+
+def route_file(script_path: str) -> str:
+    return os.path.join(ROUTES_DIR, os.path.splitext(os.path.basename(script_path))[0] + ".json")
+
+
+def load_routes(script_path: str) -> Dict[str, Route]:
+    """读取脚本对应的 routes/<脚本名>.json；文件未修改时直接返回缓存"""
+    path = route_file(script_path)
+    if not os.path.exists(path):
+        return {}
+    mtime = os.path.getmtime(path)
+    with _ROUTE_LOCK:
+        cached = _ROUTE_FILES.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            routes = {name: parse_route(value) if isinstance(value, str) else route_from_records(value)
+                      for name, value in data.items()}
+        except Exception as e:
+            print(f"读取路线文件失败 {path}: {e}")
+            routes = {}
+        _ROUTE_FILES[path] = (mtime, routes)
+        return routes
+
+
+def load_route(script_path: str, name: str, default: Union[str, Route, None] = None) -> Route:
+    """按名称取脚本的路线：优先录制保存的路线文件，其次使用脚本内置的默认路线"""
+    route = load_routes(script_path).get(name)
+    if route is not None:
+        return route
+    if default is None:
+        raise KeyError(f"{os.path.basename(script_path)} 没有名为 {name} 的路线")
+    return parse_route(default) if isinstance(default, str) else tuple(default)
+
+
+def save_route(script_path: str, name: str, route: Route):
+    path = route_file(script_path)
+    data = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    data[name] = [leg.to_record() for leg in route]
+    os.makedirs(ROUTES_DIR, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+# ============================================
+# 回放
+# ============================================
+def build_route_gesture(joystick, route: Route):
+    """把整条路线编入一条手势时间线（每段的起点漂移与时长扰动在此一次算好），可继续追加点击后再 run"""
+    gesture = joystick.gesture()
+    for leg in route:
+        if leg.vector is None:
+            gesture.wait(leg.duration)
+        else:
+            gesture.move(leg.vector, leg.duration, leg.mode)
+    return gesture
+
+
+def play_route(joystick, route: Union[str, Route]) -> bool:
+    """阻塞回放整条路线"""
+    if isinstance(route, str):
+        route = parse_route(route)
+    return build_route_gesture(joystick, route).run()
+
+
+# ============================================
+# 录制
+# ============================================
+_GETEVENT_RE = re.compile(r"\[\s*([\d.]+)\]\s+(\w+)\s+(\w+)\s+([0-9a-fA-F]+)")
+
+
+def parse_getevent_trace(lines, injector) -> List[List[Tuple[float, float, float]]]:
+    """
+    解析 `getevent -lt <触摸屏>` 的输出（B 类多点触控协议）
+    返回每个触点的 [(时间秒, 屏幕像素 x, 屏幕像素 y)]，按按下顺序排列
+    """
+    contacts, slots, slot = [], {}, 0
+    pending = set()
+    for line in lines:
+        match = _GETEVENT_RE.search(line)
+        if not match:
+            continue
+        t, ev_type, code, raw = float(match.group(1)), match.group(2), match.group(3), int(match.group(4), 16)
+        value = raw - (1 << 32) if raw >= 1 << 31 else raw
+        if ev_type == "EV_ABS":
+            if code == "ABS_MT_SLOT":
+                slot = value
+            elif code == "ABS_MT_TRACKING_ID":
+                if value < 0:
+                    slots.pop(slot, None)
+                else:
+                    slots[slot] = {"x": None, "y": None, "points": []}
+                    contacts.append(slots[slot]["points"])
+            elif code in ("ABS_MT_POSITION_X", "ABS_MT_POSITION_Y") and slot in slots:
+                slots[slot]["x" if code.endswith("X") else "y"] = value
+                pending.add(slot)
+        elif ev_type == "EV_SYN" and code == "SYN_REPORT":
+            for s in pending:
+                state = slots.get(s)
+                if state is not None and state["x"] is not None and state["y"] is not None:
+                    state["points"].append((t, *injector.from_touch(state["x"], state["y"])))
+            pending.clear()
+    return [points for points in contacts if points]
+
+
+def extract_route(contacts: List[List[Tuple[float, float, float]]], joystick,
+                  device_ctx: Optional[DeviceContext] = None) -> Route:
+    """
+    从录制的触点中提取摇杆路线：只保留在摇杆中心附近按下的触点，
+    按相对按下点的拖动方向切分成段，位移超过跑步阈值的段记为 run，否则为 walk
+    """
+    ctx = device_ctx or get_device_context(joystick.device_id)
+    sx, sy = (ctx.scale_x, ctx.scale_y) if ctx else (1.0, 1.0)
+    legs: List[RouteLeg] = []
+    last_end = None
+
+    for points in contacts:
+        base = [(t, x / sx, y / sy) for t, x, y in points]
+        t0, ox, oy = base[0]
+        if math.hypot(ox - joystick.cx, oy - joystick.cy) > joystick.radius * 2:
+            continue  # 不是摇杆上的触点（技能按钮等）
+        if last_end is not None and t0 - last_end >= MIN_LEG:
+            legs.append(RouteLeg(None, t0 - last_end))
+        last_end = base[-1][0]
+
+        leg_start, leg_angle, leg_reach = None, None, 0.0
+        for t, x, y in base + [(base[-1][0], ox, oy)]:
+            dx, dy = x - ox, y - oy
+            reach = math.hypot(dx, dy)
+            pushed = reach >= joystick.radius * DEADZONE_RATIO
+            angle = math.degrees(math.atan2(dy, dx)) if pushed else None
+            turned = angle is not None and leg_angle is not None and \
+                abs((angle - leg_angle + 180) % 360 - 180) > SPLIT_ANGLE
+            if leg_start is not None and (not pushed or turned or t == base[-1][0]):
+                duration = t - leg_start
+                if duration >= MIN_LEG:
+                    mode = "run" if leg_reach >= joystick.run_threshold else "walk"
+                    rad = math.radians(leg_angle)
+                    legs.append(RouteLeg((math.cos(rad), math.sin(rad)), duration, mode))
+                leg_start, leg_angle, leg_reach = None, None, 0.0
+            if pushed and leg_start is None:
+                leg_start, leg_angle = t, angle
+            if pushed:
+                leg_reach = max(leg_reach, reach)
+    return tuple(legs)
+
+
+def record_touches(connector, device_id: Optional[str], injector, seconds: float) -> List[str]:
+    """在设备上录制 seconds 秒的触摸事件（getevent -lt），用户停止或 Ctrl+C 时提前结束"""
+    cmd = [connector.adb_path] + (["-s", device_id] if device_id else []) + \
+        ["shell", "getevent", "-lt", injector.device.path]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    lines: List[str] = []
+    reader = threading.Thread(target=lambda: lines.extend(iter(proc.stdout.readline, "")), daemon=True)
+    reader.start()
+    token = current_cancel_token()
+    callback = token.on_cancel(proc.kill)
+    try:
+        deadline = time.time() + seconds
+        while time.time() < deadline and proc.poll() is None and not token.cancelled:
+            time.sleep(0.2)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        token.remove_callback(callback)
+        proc.kill()
+        reader.join(timeout=2)
+    return lines
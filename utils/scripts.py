@@ -26,27 +26,33 @@ def select_commission_multiplier(connector, device_id):
 
 def fuwei(connector, device_id):
     print("-> 执行角色复位...")
-    # esc
-    click(100, 80, connector, device_id)
-    time.sleep(0.1)
-    # 设置
-    click(2000, 1700, connector, device_id)
-    time.sleep(0.1)
-    # 复位角色
-    click(110, 870, connector, device_id)
-    time.sleep(0.1)
-    click(2400, 1290, connector, device_id)
-    time.sleep(0.1)
-    click(1470, 1030, connector, device_id)
+    # 五次点击合并为一次下发，间隔在设备端执行
+    with input_batch(connector, device_id) as batch:
+        # esc
+        click(100, 80, connector, device_id)
+        batch.sleep(0.1)
+        # 设置
+        click(2000, 1700, connector, device_id)
+        batch.sleep(0.1)
+        # 复位角色
+        click(110, 870, connector, device_id)
+        batch.sleep(0.1)
+        click(2400, 1290, connector, device_id)
+        batch.sleep(0.1)
+        click(1470, 1030, connector, device_id)
+
+# 大招 / 技能按钮坐标（也可用于 Gesture.tap 在移动中释放）
+ULT_POS = (2050, 1650)
+REG_POS = (1950, 1650)
 
 def ult(connector, device_id):
     print("-> 执行大招...")
-    click(2050, 1650, connector, device_id)
+    click(*ULT_POS, connector, device_id)
 
 def reg(connector, device_id, show_log=True):
     if show_log:
         print("-> 执行技能...")
-    click(1950, 1650, connector, device_id, show_log)
+    click(*REG_POS, connector, device_id, show_log)
 
 
 def spiral(connector, device_id, num):
@@ -63,10 +69,11 @@ def sprint(connector, device_id):
 
 def timeout(connector, device_id):
     print("-> 执行超时重试...")
-    # esc
-    click(100, 80, connector, device_id)
-    time.sleep(0.1)
-    click(2600, 1667, connector, device_id)
-    time.sleep(0.1)
-    click(1465, 1030, connector, device_id)
+    with input_batch(connector, device_id) as batch:
+        # esc
+        click(100, 80, connector, device_id)
+        batch.sleep(0.1)
+        click(2600, 1667, connector, device_id)
+        batch.sleep(0.1)
+        click(1465, 1030, connector, device_id)
 
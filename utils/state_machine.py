@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+"""
+声明式脚本状态机
+
+scripts/ 下的脚本原本各自复制同一套结构：探测开始/再次挑战 → combat_prep → 等待结算 → 点击重开 → 循环，
+以及各自的超时重试与异常处理。状态机把这套流程收拢为一份运行时，脚本只需声明：
+- 状态：进入时更新的看板状态、进入动作、检测超时（可先重试若干次）与超时后的去向
+- 转移：检测器（模板名）→ 目标状态，命中后先执行转移动作
+同一状态的全部检测器对同一帧并行匹配（wait_until_any），无需逐个模板先后探测；
+帧源、静态画面门控与自适应轮询均沿用等待函数的实现
+没有转移的状态为终止状态，执行完进入动作后脚本结束
+
+用法：
+    MACHINE = StateMachine(TEMPLATES, [
+        State("probe", status="正在检查设备初始状态...", timeout=5, on_timeout="fight", transitions=[
+            on("start", "prep", click_at(COORDS["start_btn"])),
+            on("restart", "prep", click_at(COORDS["restart_btn"], delay=1)),
+        ]),
+        State("prep", action=combat_prep, transitions=[goto("fight")]),
+        State("fight", status="⚔️ 战斗进行中，等待结算...", timeout=300, transitions=[on("restart", "restart")]),
+        State("restart", round_end=True, status="点击重开，准备下一轮...",
+              action=click_at(COORDS["restart_btn"], delay=1), transitions=[goto("prep")]),
+    ])
+
+    def run(device_id=None):
+        MACHINE.run(device_id)
+"""
+from datetime import datetime
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import cv2
+
+import utils.notification as notification
+from utils.readiness import report_round, wait_until_ready, wait_until_settled
+from utils.tools import (ADBConnector, DeviceContext, JoystickController, StopScriptException, TimeoutException,
+                         check_running, click, ensure_adb_connection, get_device_context, list_devices, smart_sleep,
+                         status_notifier, wait_until_any)
+
+# 未设超时的状态按该时长分段等待（每段结束时重新打印等待信息）
+WAIT_CHUNK = 600
+# 默认摇杆参数：中心 x, 中心 y, 半径（基础分辨率）
+JOYSTICK = (450, 1440, 150)
+
+Action = Callable[["ScriptContext"], Any]
+
+
+class Transition(NamedTuple):
+    """状态转移：detector 为模板名（StateMachine.templates 的键），None 表示进入状态后无条件转移"""
+    detector: Optional[str]
+    target: str
+    action: Optional[Action] = None
+
+
+class State(NamedTuple):
+    """
+    脚本状态
+    - status: 进入时更新的看板状态；action: 进入时执行的动作
+    - transitions: 转移列表，为空时是终止状态
+    - timeout: 检测超时（秒），None 表示一直等待；超时后先执行 on_retry 重试 retries 次，
+      仍未命中时进入 on_timeout 状态，未指定 on_timeout 则抛出 TimeoutException
+    - interval: 逐次截图模式下的默认轮询间隔
+    - round_end: 进入时记一轮完成
+    """
+    name: str
+    transitions: Sequence[Transition] = ()
+    status: Optional[str] = None
+    action: Optional[Action] = None
+    timeout: Optional[float] = 60
+    on_timeout: Optional[str] = None
+    retries: int = 0
+    on_retry: Optional[Action] = None
+    interval: float = 1.5
+    round_end: bool = False
+
+
+def on(detector: str, target: str, action: Optional[Action] = None) -> Transition:
+    """检测到 detector 对应的模板时执行 action 并进入 target"""
+    return Transition(detector, target, action)
+
+
+def goto(target: str, action: Optional[Action] = None) -> Transition:
+    """无条件转移"""
+    return Transition(None, target, action)
+
+
+def click_at(coord: Tuple[int, int], delay: float = 0.0, show_log: bool = True, settle: bool = False) -> Action:
+    """
+    点击基础分辨率坐标后等待 delay 秒的动作
+    settle=True 时 delay 只作为上限：画面变化后恢复静止即继续（见 utils/readiness.py 的 wait_until_settled）
+    """
+    def _action(ctx: "ScriptContext"):
+        click(*coord, ctx.connector, ctx.device_id, show_log)
+        if delay and settle:
+            wait_until_settled(ctx.connector, ctx.device_id, delay)
+        elif delay:
+            smart_sleep(delay)
+    return _action
+
+
+class ScriptContext:
+    """
+    一次脚本运行的共享状态，作为参数传给所有动作
+    - run_count / total_round: 当前轮次与目标轮次（"∞" 表示不限）
+    - match: 最近一次命中的匹配结果（ImageMatcher.match_any 的返回值）
+    脚本可在 setup 或动作中自由挂载其它属性
+    """
+
+    def __init__(self, connector: ADBConnector, device_id: str, total_round: Union[int, str] = "∞",
+                 joystick: Tuple[int, int, int] = JOYSTICK):
+        self.connector = connector
+        self.device_id = device_id
+        self.device_ctx: Optional[DeviceContext] = get_device_context(device_id)
+        self.run_count = 1
+        self.total_round = total_round
+        self.state: Optional[str] = None
+        self.match: Optional[Dict] = None
+        self._joystick_params = joystick
+        self._joystick: Optional[JoystickController] = None
+
+    @property
+    def joystick(self) -> JoystickController:
+        if self._joystick is None:
+            self._joystick = JoystickController(self.connector, *self._joystick_params, device_id=self.device_id,
+                                                device_ctx=self.device_ctx)
+        return self._joystick
+
+    def status(self, text: str):
+        status_notifier.update(self.run_count, text, self.total_round)
+
+    def wait_ready(self, max_wait: float, label: str = "加载") -> float:
+        """代替固定的加载等待：画面就绪即返回，最多 max_wait 秒（见 utils/readiness.py）"""
+        return wait_until_ready(self.connector, self.device_id, max_wait, label, self.device_ctx)
+
+
+class StateMachine:
+    """
+    - templates: {检测器名: 模板路径}
+    - states: 状态列表，首个状态为初始状态
+    - regions: {检测器名: 基础分辨率搜索区域}，可选
+    - total_round: 目标轮次，为整数时完成该轮数后发送成功通知并结束
+    - setup: 连接设备后、进入初始状态前执行一次的动作
+    - joystick: ScriptContext.joystick 的 (中心 x, 中心 y, 半径)
+    """
+
+    def __init__(self, templates: Dict[str, str], states: List[State], regions: Optional[Dict[str, tuple]] = None,
+                 total_round: Union[int, str] = "∞", setup: Optional[Action] = None,
+                 joystick: Tuple[int, int, int] = JOYSTICK):
+        self.templates = templates
+        self.states = {state.name: state for state in states}
+        self.initial = states[0].name
+        self.regions = regions or {}
+        self.total_round = total_round
+        self.setup = setup
+        self.joystick = joystick
+        self._validate()
+
+    def _validate(self):
+        for state in self.states.values():
+            targets = [t.target for t in state.transitions] + ([state.on_timeout] if state.on_timeout else [])
+            for target in targets:
+                if target not in self.states:
+                    raise ValueError(f"状态 {state.name} 的转移目标 {target} 不存在")
+            detectors = [t.detector for t in state.transitions]
+            if None in detectors and len(detectors) > 1:
+                raise ValueError(f"状态 {state.name} 的无条件转移不能与其它转移并存")
+            for detector in detectors:
+                if detector is not None and detector not in self.templates:
+                    raise ValueError(f"状态 {state.name} 的检测器 {detector} 没有对应模板")
+
+    # --- 执行 ---
+
+    def run(self, device_id: Optional[str] = None):
+        """脚本入口：连接设备并从初始状态开始执行，统一处理停止、超时与异常"""
+        ctx = None
+        try:
+            connector = ensure_adb_connection()
+            if not device_id:
+                devices = list_devices(connector)
+                if not devices:
+                    print("❌ 未找到有效设备，脚本退出")
+                    return
+                device_id = devices[0]
+            ctx = ScriptContext(connector, device_id, self.total_round, self.joystick)
+            if self.setup:
+                self.setup(ctx)
+            self.execute(ctx)
+
+        except StopScriptException:
+            if ctx is not None:
+                ctx.status("🛑 脚本已成功停止")
+            print("\n[系统提示] 用户手动停止脚本，任务安全终止。")
+        except KeyboardInterrupt:
+            print("\n脚本已停止")
+        except Exception as e:
+            timed_out = isinstance(e, TimeoutException)
+            error_msg = f"运行出错: {e}" if timed_out else f"未知错误: {e}"
+            if ctx is not None:
+                ctx.status("❌ 等待超时 / 发生异常" if timed_out else "❌ 脚本遭遇未知错误")
+            print(f"\n❌ {error_msg}")
+            try:
+                notification.send_failure(error_msg)
+            except Exception:
+                pass
+        finally:
+            cv2.destroyAllWindows()
+
+    def execute(self, ctx: ScriptContext):
+        """从初始状态运行到终止状态（或目标轮次完成）"""
+        state = self.states[self.initial]
+        while True:
+            check_running(ctx.device_id)
+            ctx.state = state.name
+            if state.round_end and self._complete_round(ctx):
+                return
+            if state.status:
+                ctx.status(state.status)
+            if state.action:
+                state.action(ctx)
+            if not state.transitions:
+                return
+            transition = self._evaluate(state, ctx)
+            if transition is None:
+                state = self.states[state.on_timeout]
+                continue
+            if transition.action:
+                transition.action(ctx)
+            state = self.states[transition.target]
+
+    def _evaluate(self, state: State, ctx: ScriptContext) -> Optional[Transition]:
+        """等待当前状态任一检测器命中，返回对应转移；超时且指定了 on_timeout 时返回 None"""
+        if state.transitions[0].detector is None:
+            return state.transitions[0]
+        by_detector = {t.detector: t for t in state.transitions}
+        templates = {name: self.templates[name] for name in by_detector}
+        regions = {name: self.regions[name] for name in by_detector if name in self.regions}
+        timeout = state.timeout if state.timeout is not None else WAIT_CHUNK
+
+        attempts = 0
+        while True:
+            res = wait_until_any(ctx.device_id, ctx.connector, templates, timeout=timeout, raise_err=False,
+                                 interval=state.interval, regions=regions, device_ctx=ctx.device_ctx)
+            if res is not None:
+                ctx.match = res
+                print(f"✓ [{state.name}] 检测到 {res['name']}")
+                return by_detector[res["name"]]
+            if state.timeout is None:
+                continue
+            if attempts < state.retries:
+                attempts += 1
+                ctx.status(f"⚠️ 超时重试 ({attempts}/{state.retries})...")
+                if state.on_retry:
+                    state.on_retry(ctx)
+                continue
+            if state.on_timeout:
+                return None
+            raise TimeoutException(f"等待超时：状态 {state.name} 在 {timeout} 秒内未检测到 {list(templates)}")
+
+    def _complete_round(self, ctx: ScriptContext) -> bool:
+        """记一轮完成；达到目标轮次时发送成功通知并返回 True"""
+        print(f"===== 第 {ctx.run_count} 次运行完成 ===== || {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        report_round(ctx.device_id)
+        if isinstance(ctx.total_round, int) and ctx.run_count >= ctx.total_round:
+            try:
+                notification.send_success(ctx.run_count)
+            except Exception:
+                pass
+            ctx.status(f"🎉 已完成 {ctx.run_count} 轮！")
+            return True
+        ctx.run_count += 1
+        return False
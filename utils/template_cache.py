@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+模板图片缓存
+
+每个模板文件只读盘、灰度化一次，并预先生成多尺度金字塔；文件修改时间变化后自动重新加载。
+hits / misses 计数用于确认轮询热路径中已没有磁盘读取。
+"""
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# 与 ImageMatcher 多尺度匹配一致的缩放序列
+TEMPLATE_SCALES: Tuple[float, ...] = tuple(float(s) for s in np.linspace(0.4, 1.2, 9))
+
+# 缩放后边长小于该值的模板不参与匹配
+MIN_TEMPLATE_SIDE = 10
+
+# templates/ 下不属于界面匹配模板的子目录：digits 为数字识别字形，hud 为就绪检测锚点，预加载与基准测试均跳过
+NON_MATCH_DIRS = ("digits", "hud")
+
+# 项目根目录（同 tools.BASE_DIR，tools 依赖本模块故不反向导入）：脚本中的相对模板路径据此解析，不依赖当前工作目录
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TemplateEntry:
+    """单个模板的缓存内容：原始灰度图 + 各尺度缩放结果"""
+
+    def __init__(self, path: str, mtime: float, gray: np.ndarray):
+        self.path = path
+        self.mtime = mtime
+        self.gray = gray
+        self.height, self.width = gray.shape[:2]
+        self.checked_at = time.time()
+        self.pyramid: List[Tuple[float, np.ndarray]] = []
+        for scale in TEMPLATE_SCALES:
+            nw, nh = int(self.width * scale), int(self.height * scale)
+            if nw < MIN_TEMPLATE_SIDE or nh < MIN_TEMPLATE_SIDE:
+                continue
+            interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_CUBIC
+            self.pyramid.append((scale, cv2.resize(gray, (nw, nh), interpolation=interpolation)))
+        self._coarse: Dict[Tuple[int, int], np.ndarray] = {}
+
+    def coarse(self, index: int, factor: int) -> np.ndarray:
+        """金字塔第 index 档模板再按 factor 倍缩小的结果（用于粗匹配，按需生成后缓存）"""
+        key = (index, factor)
+        image = self._coarse.get(key)
+        if image is None:
+            full = self.pyramid[index][1]
+            h, w = full.shape[:2]
+            image = cv2.resize(full, (max(1, w // factor), max(1, h // factor)), interpolation=cv2.INTER_AREA)
+            self._coarse[key] = image
+        return image
+
+
+class TemplateRegistry:
+    """
+    进程级模板注册表（线程安全）
+    - check_interval: 两次检查文件修改时间的最小间隔（秒），避免每次匹配都 stat 文件
+    """
+
+    def __init__(self, check_interval: float = 1.0):
+        self.check_interval = check_interval
+        self._entries: Dict[str, TemplateEntry] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    @staticmethod
+    def _key(path: str) -> str:
+        return os.path.normcase(os.path.abspath(os.path.join(PROJECT_ROOT, path)))
+
+    def _load(self, key: str, mtime: float) -> TemplateEntry:
+        # cv2.imread 不支持中文路径，统一用 imdecode 读取
+        data = np.fromfile(key, dtype=np.uint8)
+        gray = cv2.imdecode(data, cv2.IMREAD_GRAYSCALE) if data.size else None
+        if gray is None:
+            raise ValueError(f"无法读取模板图片: {key}")
+        return TemplateEntry(key, mtime, gray)
+
+    def get(self, path: str) -> TemplateEntry:
+        key = self._key(path)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry.checked_at < self.check_interval:
+                self.hits += 1
+                return entry
+
+        try:
+            mtime = os.path.getmtime(key)
+        except OSError:
+            raise ValueError(f"无法读取模板图片: {path}")
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.mtime == mtime:
+                entry.checked_at = now
+                self.hits += 1
+                return entry
+
+        new_entry = self._load(key, mtime)
+        with self._lock:
+            if key in self._entries:
+                self.reloads += 1
+            self.misses += 1
+            self._entries[key] = new_entry
+        return new_entry
+
+    def preload(self, directory: str, skip_dirs: Tuple[str, ...] = NON_MATCH_DIRS) -> int:
+        """预加载目录（含子目录，跳过 skip_dirs 中的子目录名）下的全部图片模板，返回加载数量"""
+        count = 0
+        for root, dirs, files in os.walk(directory):
+            dirs[:] = [d for d in dirs if d not in skip_dirs]
+            for name in files:
+                if name.lower().endswith((".png", ".jpg", ".jpeg", ".bmp")):
+                    try:
+                        self.get(os.path.join(root, name))
+                        count += 1
+                    except ValueError as e:
+                        print(f"预加载模板失败: {e}")
+        return count
+
+    def invalidate(self, path: Optional[str] = None):
+        """清除指定模板（或全部模板）的缓存"""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(self._key(path), None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "templates": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "reloads": self.reloads,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+# 全局单例，所有 ImageMatcher 调用共享
+template_registry = TemplateRegistry()
@@ -7,19 +7,24 @@ from datetime import datetime
 import math
 import socket
 import re
-from typing import List, Optional, Dict, Any
+import struct
+import threading
+import zlib
+from contextlib import contextmanager
+from typing import List, Optional, Dict, Any, NamedTuple, Set, Tuple
 from concurrent.futures import ThreadPoolExecutor
 
 import cv2
 import numpy as np
 from PIL import Image
 
+from utils.adb_client import (AdbWireClient, AdbCommandError, AdbProtocolError, AdbStreamInterrupted, ShellSession,
+                              get_wire_client)
+from utils.template_cache import template_registry, MIN_TEMPLATE_SIDE
+
 # ============================================
 # 全局运行控制与异常
 # ============================================
-_IS_RUNNING = True  # 全局运行标志
-
-
 class StopScriptException(Exception):
     """自定义异常，用于在停止时跳出深层循环"""
     pass
@@ -30,22 +35,192 @@ class TimeoutException(Exception):
     pass
 
 
+class CancellationToken:
+    """
+    一次运行的取消令牌（基于 threading.Event）
+    - 休眠与等待直接阻塞在事件上，停止时立即唤醒，空闲时不产生任何轮询
+    - on_cancel 注册的回调在取消时执行一次（用于结束挂起的 adb 进程、唤醒条件变量等）
+    - parent: 父令牌取消时本令牌随之取消；子令牌用完后调用 close() 从父令牌注销，避免父令牌的回调列表无限增长
+    """
+
+    def __init__(self, parent: Optional["CancellationToken"] = None):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List = []
+        self._parent = parent
+        if parent is not None:
+            parent.on_cancel(self.cancel)
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"取消回调执行失败: {e}")
+
+    def on_cancel(self, callback):
+        """注册取消回调；已取消时立即执行。返回值用于 remove_callback"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return callback
+        callback()
+        return callback
+
+    def remove_callback(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def close(self):
+        """结束使用：从父令牌注销本令牌的取消回调（不会取消本令牌）"""
+        parent, self._parent = self._parent, None
+        if parent is not None:
+            parent.remove_callback(self.cancel)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """阻塞至取消或超时，返回是否已取消"""
+        return self._event.wait(timeout)
+
+    def sleep(self, seconds: float):
+        """休眠 seconds 秒，期间被取消则立即抛出 StopScriptException"""
+        if self._event.wait(max(0.0, seconds)):
+            raise StopScriptException("用户请求停止脚本")
+
+
+# 全局运行令牌：每次开始运行时更换，停止时取消
+_RUN_TOKEN = CancellationToken()
+
+
 def set_running_state(state: bool):
-    global _IS_RUNNING
-    _IS_RUNNING = state
+    global _RUN_TOKEN
+    if state:
+        if _RUN_TOKEN.cancelled:
+            _RUN_TOKEN = CancellationToken()
+    else:
+        _RUN_TOKEN.cancel()
+
+
+def get_run_token() -> CancellationToken:
+    """当前全局运行令牌"""
+    return _RUN_TOKEN
+
+
+# ============================================
+# 每设备运行上下文（多设备并行时隔离运行标志与状态通道）
+# ============================================
+class RunContext:
+    """
+    单台设备一次脚本运行的隔离状态
+    - token: 该设备独立的取消令牌，stop() 只停止这一台设备；不受全局运行令牌影响，
+      控制台停止单设备脚本时不会波及并行运行的设备
+    - on_status(device_id, current_round, step_desc, total_round) / on_log(device_id, text): 该设备的状态通道
+    """
+
+    def __init__(self, device_id: str, on_status=None, on_log=None):
+        self.device_id = device_id
+        self.token = CancellationToken()
+        self.on_status = on_status
+        self.on_log = on_log
+
+    @property
+    def running(self) -> bool:
+        return not self.token.cancelled
+
+    def stop(self):
+        self.token.cancel()
 
 
-def check_running():
-    if not _IS_RUNNING:
+_RUN_CONTEXTS: Dict[str, RunContext] = {}
+_THREAD_CONTEXT = threading.local()
+
+
+@contextmanager
+def bind_run_context(ctx: RunContext, register: bool = True):
+    """
+    在当前线程绑定设备运行上下文
+    register=True 时同时按设备 ID 登记，供该设备的帧源等后台线程查找；
+    辅助线程临时借用已登记的上下文时传 False，退出时不会注销
+    """
+    previous = getattr(_THREAD_CONTEXT, "ctx", None)
+    _THREAD_CONTEXT.ctx = ctx
+    if register:
+        _RUN_CONTEXTS[ctx.device_id] = ctx
+    try:
+        yield ctx
+    finally:
+        _THREAD_CONTEXT.ctx = previous
+        if register and _RUN_CONTEXTS.get(ctx.device_id) is ctx:
+            del _RUN_CONTEXTS[ctx.device_id]
+
+
+def current_run_context(device_id: Optional[str] = None) -> Optional[RunContext]:
+    """优先按设备 ID 查找，其次取当前线程绑定的上下文；单设备 GUI 模式下为 None"""
+    if device_id is not None:
+        ctx = _RUN_CONTEXTS.get(device_id)
+        if ctx is not None:
+            return ctx
+    return getattr(_THREAD_CONTEXT, "ctx", None)
+
+
+def current_cancel_token(device_id: Optional[str] = None) -> CancellationToken:
+    """当前线程（或指定设备）生效的取消令牌：多设备模式下为设备令牌，否则为全局令牌"""
+    ctx = current_run_context(device_id)
+    return ctx.token if ctx is not None else _RUN_TOKEN
+
+
+def check_running(device_id: Optional[str] = None):
+    """多设备模式下只检查设备令牌，否则检查全局令牌"""
+    ctx = current_run_context(device_id)
+    if ctx is not None:
+        if not ctx.running:
+            raise StopScriptException(f"用户请求停止设备 {ctx.device_id} 上的脚本")
+    elif _RUN_TOKEN.cancelled:
         raise StopScriptException("用户请求停止脚本")
 
 
 def smart_sleep(seconds: float):
-    """智能休眠：替代 time.sleep，支持被全局停止信号随时中断"""
-    end_time = time.time() + seconds
-    while time.time() < end_time:
-        check_running()
-        time.sleep(min(0.1, end_time - time.time()))
+    """智能休眠：替代 time.sleep，停止信号到达时立即中断"""
+    check_running()
+    current_cancel_token().sleep(seconds)
+
+
+_SLEEP_PATCH = {"depth": 0, "original": None}
+_SLEEP_PATCH_LOCK = threading.Lock()
+
+
+@contextmanager
+def interruptible_time_sleep():
+    """
+    脚本运行期间把 time.sleep 替换为可被停止信号打断的版本
+    多个设备线程可同时进入，最后一个退出时才恢复原函数
+    """
+    with _SLEEP_PATCH_LOCK:
+        if _SLEEP_PATCH["depth"] == 0:
+            _SLEEP_PATCH["original"] = time.sleep
+
+            def _interruptible_sleep(seconds):
+                check_running()
+                current_cancel_token().sleep(seconds)
+
+            time.sleep = _interruptible_sleep
+        _SLEEP_PATCH["depth"] += 1
+    try:
+        yield
+    finally:
+        with _SLEEP_PATCH_LOCK:
+            _SLEEP_PATCH["depth"] -= 1
+            if _SLEEP_PATCH["depth"] == 0:
+                time.sleep = _SLEEP_PATCH["original"]
 
 
 # ============================================
@@ -62,19 +237,38 @@ class ConfigManager:
         "email_port": "465",
         "email_sender": "",
         "email_pwd": "",
-        "email_receiver": ""
+        "email_receiver": "",
+        "adb_backend": "subprocess",  # subprocess: 每条命令启动 adb 进程; wire: 直连 adb server 协议
+        "adb_shell_session": False,  # True: input 指令经设备常驻 sh 会话发送
+        "screencap_mode": "png",  # png: 设备端 PNG 编码; raw: 直接传输帧缓冲像素
+        "screencap_compress": False,  # raw 模式下在设备端 gzip 压缩，适合无线连接
+        "frame_stream": False,  # True: 等待匹配时由后台帧源持续截图，消费者直接取最新帧
+        "coarse_factor": 0,  # 粗到精匹配的降采样倍数 (4 / 8)，0 表示关闭
+        "coarse_verify_rate": 0.0,  # 按该比例抽样，用全分辨率穷举匹配校验粗到精结果
+        "run_mode": "thread",  # thread: 脚本在 GUI 进程的线程中运行; process: 在独立子进程中运行
+        "ocr_backend": "easyocr",  # 数字识别后端 easyocr / glyph（templates/digits 下的字形模板）
+        "frame_gate_threshold": 2.0,  # 等待匹配时画面缩略图平均灰度差低于该值视为未变化并跳过匹配，0 表示关闭
+        "adaptive_polling": True,  # 按历史用时调整等待匹配的截图间隔（记录于 wait_history.json）
+        "input_backend": "input",  # input: adb shell input 指令; evdev: 直接向触摸屏 /dev/input 写入事件
+        "readiness_detection": True  # 进场加载、结算过渡按 HUD 锚点/画面静止判断就绪，固定等待时长只作为上限
     }
 
     def __init__(self, config_path: str):
         self.config_path = config_path
         self.data = self.DEFAULT_CONFIG.copy()
+        self._mtime = None
         self.load()
 
     def load(self):
         if os.path.exists(self.config_path):
             try:
+                # 文件未修改时跳过解析，截图/匹配热路径上频繁读取配置也不会反复读盘
+                mtime = os.path.getmtime(self.config_path)
+                if mtime == self._mtime:
+                    return
                 with open(self.config_path, 'r', encoding='utf-8') as f:
                     self.data.update(json.load(f))
+                self._mtime = mtime
             except Exception as e:
                 print(f"读取配置失败: {e}")
 
@@ -82,6 +276,7 @@ class ConfigManager:
         try:
             with open(self.config_path, 'w', encoding='utf-8') as f:
                 json.dump(self.data, f, ensure_ascii=False, indent=4)
+            self._mtime = os.path.getmtime(self.config_path)
         except Exception as e:
             print(f"保存配置失败: {e}")
 
@@ -107,47 +302,227 @@ config_mgr = ConfigManager(CONFIG_PATH)
 # ============================================
 # 动态分辨率配置与转换(不需要改动)
 # ============================================
-RESOLUTION_CONFIG = {
-    "base_width": 2800,
-    "base_height": 1840,
-    "curr_width": None,
-    "curr_height": None
-}
+# 脚本坐标与模板统一以该分辨率为基准
+BASE_RESOLUTION = (2800, 1840)
 
 
-def init_resolution(connector, device_id: Optional[str] = None):
+class DeviceContext(NamedTuple):
+    """
+    单台设备的不可变分辨率上下文，init_resolution 时创建一次，之后只读
+    - width / height: 已按基础分辨率横竖方向对齐的实际像素
+    - scale_x / scale_y: 预先算好的 基础坐标 → 设备像素 缩放系数
+    - orientation: 设备上报的原始尺寸的方向 "landscape" / "portrait"（对齐基础分辨率之前）
+    - density: 屏幕 dpi（wm density），读取失败为 None
+    """
+    device_id: Optional[str]
+    width: int
+    height: int
+    scale_x: float
+    scale_y: float
+    orientation: str
+    density: Optional[int] = None
+
+    @classmethod
+    def create(cls, device_id: Optional[str], width: int, height: int,
+               density: Optional[int] = None) -> "DeviceContext":
+        base_w, base_h = BASE_RESOLUTION
+        orientation = "landscape" if width >= height else "portrait"
+        # 自动防呆：保证基础横竖屏逻辑一致
+        if base_w > base_h:
+            width, height = max(width, height), min(width, height)
+        else:
+            width, height = min(width, height), max(width, height)
+        return cls(device_id, width, height, width / base_w, height / base_h, orientation, density)
+
+    def to_device(self, x: int, y: int) -> Tuple[int, int]:
+        """基础分辨率坐标 → 设备像素"""
+        return int(x * self.scale_x), int(y * self.scale_y)
+
+    def to_device_region(self, region) -> tuple:
+        """基础分辨率区域 (x1, y1, x2, y2) → 设备像素区域"""
+        x1, y1 = self.to_device(region[0], region[1])
+        x2, y2 = self.to_device(region[2], region[3])
+        return x1, y1, x2, y2
+
+    def convert_table(self, table):
+        """
+        把整张坐标表一次性换算为设备像素（如脚本的 COORDS / CROP_REGIONS，脚本启动时调用一次）
+        table 为 dict 或 list，值为 (x, y) 点或 (x1, y1, x2, y2) 区域；返回同结构的新表
+        """
+        items = list(table.items()) if isinstance(table, dict) else list(enumerate(table))
+        converted = {}
+        # 相同长度的条目拼成一个矩阵，整体乘以缩放系数
+        for size in {len(value) for _, value in items}:
+            if size % 2:
+                raise ValueError(f"坐标表条目长度必须为偶数 (点或区域)，实际为 {size}")
+            keys = [key for key, value in items if len(value) == size]
+            points = np.asarray([table[key] for key in keys], dtype=np.float64).reshape(-1, 2)
+            scaled = (points * (self.scale_x, self.scale_y)).astype(np.int64).reshape(len(keys), size)
+            for key, row in zip(keys, scaled.tolist()):
+                converted[key] = tuple(row)
+        if isinstance(table, dict):
+            return {key: converted[key] for key in table}
+        return [converted[i] for i in range(len(items))]
+
+
+# {device_id: DeviceContext}
+_DEVICE_CONTEXTS: Dict[str, DeviceContext] = {}
+
+
+def init_resolution(connector, device_id: Optional[str] = None) -> Optional[DeviceContext]:
     """
     初始化设备真实分辨率，建议在脚本启动连接ADB后调用一次
+    返回该设备的 DeviceContext，失败返回 None
     """
     try:
         size = connector.get_screen_size(device_id)
         if size:
-            w, h = size
-            # 自动防呆：保证基础横竖屏逻辑一致
-            if RESOLUTION_CONFIG["base_width"] > RESOLUTION_CONFIG["base_height"]:
-                RESOLUTION_CONFIG["curr_width"] = max(w, h)
-                RESOLUTION_CONFIG["curr_height"] = min(w, h)
-            else:
-                RESOLUTION_CONFIG["curr_width"] = min(w, h)
-                RESOLUTION_CONFIG["curr_height"] = max(w, h)
+            ctx = DeviceContext.create(device_id, size[0], size[1], connector.get_screen_density(device_id))
+            if device_id is not None:
+                _DEVICE_CONTEXTS[device_id] = ctx
 
+            # 分辨率可能已变化，之前锁定的模板尺度与位置作废
+            ImageMatcher.reset_learned_state(device_id)
             print("✅ 动态分辨率初始化 → 成功")
-            return True
+            return ctx
         else:
             print("❌ 获取分辨率失败: 未能从设备读取到有效的分辨率信息")
     except Exception as e:
         print(f"❌ 获取分辨率失败，详细异常信息: {e}")
-    return False
+    return None
+
+
+def get_device_context(device_id: Optional[str] = None) -> Optional[DeviceContext]:
+    """
+    查找设备的分辨率上下文：按设备 ID，未指明设备时取当前线程绑定的运行设备
+    尚未初始化、或既没有设备 ID 也没有绑定运行上下文时返回 None（坐标按原值使用），
+    不会借用其它设备的分辨率
+    """
+    if device_id is None:
+        run_ctx = current_run_context()
+        if run_ctx is None:
+            return None
+        device_id = run_ctx.device_id
+    return _DEVICE_CONTEXTS.get(device_id)
 
 
-def adapt_coord(x: int, y: int):
+def adapt_coord(x: int, y: int, device_id: Optional[str] = None, device_ctx: Optional[DeviceContext] = None):
     """坐标转换计算"""
-    if not RESOLUTION_CONFIG["curr_width"] or not RESOLUTION_CONFIG["curr_height"]:
+    ctx = device_ctx or get_device_context(device_id)
+    if ctx is None:
         return x, y  # 未初始化时，按原绝对坐标返回
+    return ctx.to_device(x, y)
+
+
+# ============================================
+# 输入指令批处理
+# ============================================
+_INPUT_BATCH = threading.local()
+_SLEEP_RE = re.compile(r"^sleep\s+([\d.]+)")
+_SWIPE_RE = re.compile(r"^input\s+swipe(?:\s+-?\d+){4}\s+(\d+)")
+
+
+def batch_seconds(commands: List[str]) -> float:
+    """估算一批 shell 指令在设备端的执行时长（sleep 与 input swipe 时长之和），用于设置等待超时"""
+    total = 0.0
+    for command in commands:
+        match = _SLEEP_RE.match(command)
+        if match:
+            total += float(match.group(1))
+            continue
+        match = _SWIPE_RE.match(command)
+        if match:
+            total += int(match.group(1)) / 1000
+    return total
+
+
+class InputBatch:
+    """收集同一设备的一组 input 指令，退出批处理时一次往返下发"""
+
+    def __init__(self, connector, device_id: Optional[str] = None):
+        self.connector = connector
+        self.device_id = device_id
+        self.commands: List[str] = []
+
+    def append(self, command: str):
+        self.commands.append(command)
+
+    def sleep(self, seconds: float):
+        """在设备端等待，保持批内指令之间的节奏"""
+        self.commands.append(f"sleep {seconds:g}")
 
-    scale_x = RESOLUTION_CONFIG["curr_width"] / RESOLUTION_CONFIG["base_width"]
-    scale_y = RESOLUTION_CONFIG["curr_height"] / RESOLUTION_CONFIG["base_height"]
-    return int(x * scale_x), int(y * scale_y)
+    def flush(self) -> bool:
+        commands, self.commands = self.commands, []
+        if not commands:
+            return True
+        return self.connector.run_shell_batch(commands, self.device_id)
+
+
+def _active_batch(device_id: Optional[str]) -> Optional[InputBatch]:
+    batch = getattr(_INPUT_BATCH, "current", None)
+    if batch is not None and batch.device_id == device_id:
+        return batch
+    return None
+
+
+@contextmanager
+def input_batch(connector, device_id: Optional[str] = None):
+    """
+    批处理上下文：块内的 click/swipe/long_press 等只入队，退出时合并为一次下发
+    用法：
+        with input_batch(connector, device_id):
+            click(100, 80, connector, device_id)
+            click(2000, 1700, connector, device_id)
+    """
+    existing = _active_batch(device_id)
+    if existing is not None:
+        # 嵌套批处理直接并入外层
+        yield existing
+        return
+
+    batch = InputBatch(connector, device_id)
+    previous = getattr(_INPUT_BATCH, "current", None)
+    _INPUT_BATCH.current = batch
+    try:
+        yield batch
+    finally:
+        _INPUT_BATCH.current = previous
+    batch.flush()
+
+
+# ============================================
+# 原始帧缓冲解析
+# ============================================
+# screencap 像素格式编号 -> 每像素字节数 (1:RGBA_8888 2:RGBX_8888 3:RGB_888 4:RGB_565 5:BGRA_8888)
+RAW_PIXEL_FORMATS = {1: 4, 2: 4, 3: 3, 4: 2, 5: 4}
+
+
+def parse_raw_screencap(data: bytes) -> Optional[np.ndarray]:
+    """
+    解析 `screencap`（不带 -p）的输出
+    头部为 width/height/format 三个小端 uint32，较新系统额外带一个 dataspace 字段（共 16 字节）
+    返回值约定与 OpenCV 一致：4 通道为 RGBA、3 通道为 BGR；RGBA/RGBX 格式直接返回接收缓冲区上的零拷贝视图
+    """
+    if not data or len(data) < 12:
+        return None
+    width, height, fmt = struct.unpack_from("<III", data, 0)
+    bpp = RAW_PIXEL_FORMATS.get(fmt)
+    if not bpp or width == 0 or height == 0:
+        return None
+
+    pixel_bytes = width * height * bpp
+    header_size = len(data) - pixel_bytes
+    if header_size not in (12, 16):
+        return None
+
+    pixels = np.frombuffer(data, np.uint8, count=pixel_bytes, offset=header_size)
+    if fmt in (1, 2):
+        return pixels.reshape(height, width, 4)
+    if fmt == 5:
+        return cv2.cvtColor(pixels.reshape(height, width, 4), cv2.COLOR_BGRA2RGBA)
+    if fmt == 3:
+        return cv2.cvtColor(pixels.reshape(height, width, 3), cv2.COLOR_RGB2BGR)
+    return cv2.cvtColor(pixels.reshape(height, width, 2), cv2.COLOR_BGR5652BGR)
 
 
 # ============================================
@@ -156,8 +531,25 @@ def adapt_coord(x: int, y: int):
 class ADBConnector:
     """管理与Android设备的ADB连接及基础操作"""
 
-    def __init__(self, adb_path: str = None):
+    # 可以直接走 adb server 协议的命令，其余命令仍由 adb 进程执行
+    WIRE_COMMANDS = ("shell", "exec-out", "pull", "push")
+
+    # 常驻 shell 会话按 (adb 路径, 设备) 进程级共享，ADBConnector 实例本身可随建随弃
+    _SHELL_SESSIONS: Dict[tuple, ShellSession] = {}
+    _SHELL_LOCK = threading.Lock()
+
+    def __init__(self, adb_path: str = None, wire_client: Optional[AdbWireClient] = None,
+                 use_shell_session: Optional[bool] = None):
         self.adb_path = self._resolve_adb_path(adb_path)
+        if wire_client is None and config_mgr.get("adb_backend", "subprocess") == "wire":
+            wire_client = get_wire_client()
+        self.wire_client = wire_client
+        if wire_client is not None:
+            # 后台预建连接池，首批命令即可省去握手
+            wire_client.refill()
+        if use_shell_session is None:
+            use_shell_session = bool(config_mgr.get("adb_shell_session", False))
+        self.use_shell_session = use_shell_session
 
     def _resolve_adb_path(self, adb_path: str) -> str:
         if adb_path:
@@ -174,21 +566,69 @@ class ADBConnector:
         return "adb"  # Fallback to system PATH
 
     def _run_cmd(self, cmd: List[str], timeout: int = 30) -> Optional[subprocess.CompletedProcess]:
-        """内部统一命令执行器，处理异常和超时"""
+        """内部统一命令执行器，处理异常和超时；运行中的命令在用户停止时被立即结束"""
+        token = current_cancel_token()
+        callback = None
         try:
-            return subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
-        except subprocess.TimeoutExpired:
-            print(f"命令执行超时: {' '.join(cmd)}")
-            return None
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            # 令牌已取消（停止后的界面操作）时不再挂接，命令照常执行
+            if not token.cancelled:
+                callback = token.on_cancel(proc.kill)
+            try:
+                stdout, stderr = proc.communicate(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.communicate()
+                print(f"命令执行超时: {' '.join(cmd)}")
+                return None
+            if callback is not None and token.cancelled:
+                return None
+            return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
         except FileNotFoundError:
             print(f"找不到命令: {cmd[0]}")
             return None
         except Exception as e:
             print(f"执行命令发生异常: {e}")
             return None
+        finally:
+            if callback is not None:
+                token.remove_callback(callback)
+
+    def _execute_wire(self, command: List[str], device_id: Optional[str] = None,
+                      timeout: Optional[float] = None) -> Optional[bytes]:
+        """通过协议客户端执行命令，返回原始输出；不支持的命令返回 None"""
+        # 与 adb 命令行行为一致：shell 参数按空格直接拼接后交给设备端 sh 解析
+        name, args = command[0], command[1:]
+        if name == "shell":
+            return self.wire_client.shell_checked(" ".join(args), device_id, timeout)
+        if name == "exec-out":
+            return self.wire_client.exec_out(" ".join(args), device_id, timeout)
+        if name == "pull" and len(args) == 2:
+            self.wire_client.pull(args[0], args[1], device_id)
+            return b""
+        if name == "push" and len(args) == 2:
+            self.wire_client.push(args[0], args[1], device_id)
+            return b""
+        return None
 
     def execute_adb(self, command: List[str], device_id: Optional[str] = None, timeout: int = 30) -> Optional[str]:
         """执行 ADB 专用命令"""
+        if self.wire_client and command and command[0] in self.WIRE_COMMANDS:
+            try:
+                output = self._execute_wire(command, device_id, timeout)
+                if output is not None:
+                    return output.decode("utf-8", errors="replace").replace("\r\n", "\n")
+            except AdbCommandError as e:
+                # 与进程调用一致：设备端命令失败返回 None，不再重复执行
+                print(f"ADB命令执行失败: {e}")
+                return None
+            except AdbStreamInterrupted as e:
+                # 命令已在设备端开始执行，换进程调用重发会导致重复点击 / 重复截图
+                print(f"ADB命令执行中断: {e}")
+                return None
+            except (AdbProtocolError, OSError) as e:
+                print(f"ADB协议通道执行失败，回退到进程调用: {e}")
+
         full_cmd = [self.adb_path]
         if device_id:
             full_cmd.extend(["-s", device_id])
@@ -201,6 +641,80 @@ class ADBConnector:
             print(f"ADB命令执行失败: {result.stderr}")
         return None
 
+    # --- 常驻 shell 会话与 input 指令 ---
+
+    def get_shell_session(self, device_id: Optional[str] = None) -> ShellSession:
+        """获取（必要时创建）该设备的常驻 shell 会话"""
+        key = (self.adb_path, device_id, id(self.wire_client) if self.wire_client else None)
+        with self._SHELL_LOCK:
+            session = self._SHELL_SESSIONS.get(key)
+            if session is None:
+                session = ShellSession(device_id, self.adb_path, self.wire_client)
+                self._SHELL_SESSIONS[key] = session
+            return session
+
+    @classmethod
+    def close_shell_sessions(cls):
+        with cls._SHELL_LOCK:
+            sessions, cls._SHELL_SESSIONS = list(cls._SHELL_SESSIONS.values()), {}
+        for session in sessions:
+            session.close()
+
+    def run_shell_batch(self, commands: List[str], device_id: Optional[str] = None) -> bool:
+        """
+        一次往返执行多条 shell 指令：优先走常驻会话，否则合并为一条 adb shell
+        超时按批内 sleep / swipe 的总时长放宽；批次已写入会话后中断的不再重发（避免重复点击）
+        """
+        timeout = batch_seconds(commands) + 30
+        if self.use_shell_session:
+            try:
+                self.get_shell_session(device_id).run(commands, timeout=timeout)
+                return True
+            except AdbStreamInterrupted as e:
+                print(f"常驻 shell 会话执行中断，批次不再重发: {e}")
+                return False
+            except (AdbProtocolError, OSError) as e:
+                print(f"常驻 shell 会话执行失败，回退到单次调用: {e}")
+        return self.execute_adb(["shell", " ; ".join(commands)], device_id, timeout=int(timeout)) is not None
+
+    def run_input(self, args: List[str], device_id: Optional[str] = None) -> bool:
+        """
+        执行 input 子命令（已是设备实际坐标），处于批处理中时仅入队
+        input_backend 为 evdev 且触摸注入可用时，tap / swipe 改为直接写入触摸事件
+        """
+        batch = _active_batch(device_id)
+        if args and args[0] in ("tap", "swipe"):
+            from utils.input_injector import get_injector
+            injector = get_injector(self, device_id)
+            if injector is not None:
+                coords = [int(a) for a in args[1:]]
+                if args[0] == "tap":
+                    commands, duration = injector.tap_commands(*coords[:2]), 0.0
+                else:
+                    duration_ms = coords[4] if len(coords) > 4 else 300
+                    commands, duration = injector.swipe_commands(*coords[:4], duration_ms), duration_ms / 1000
+                if batch is not None:
+                    batch.commands.extend(commands)
+                    return True
+                try:
+                    if injector.run(commands, duration):
+                        return True
+                except AdbStreamInterrupted as e:
+                    # 事件已写入会话，不能确定是否执行完毕：不再改用 input 重发
+                    print(f"触摸事件下发中断: {e}")
+                    return False
+                # 写入失败（如节点权限被收回）：停用注入器，本次改用 input 指令
+                from utils.input_injector import disable_injector
+                disable_injector(device_id)
+
+        command = "input " + " ".join(str(a) for a in args)
+        if batch is not None:
+            batch.append(command)
+            return True
+        if self.use_shell_session:
+            return self.run_shell_batch([command], device_id)
+        return self.execute_adb(["shell", "input"] + [str(a) for a in args], device_id) is not None
+
     def get_screen_size(self, device_id: Optional[str] = None):
         """获取设备当前的屏幕分辨率"""
         try:
@@ -219,6 +733,21 @@ class ADBConnector:
             print(f"获取分辨率失败: {e}")
             return None
 
+    def get_screen_density(self, device_id: Optional[str] = None) -> Optional[int]:
+        """获取设备屏幕 dpi，优先取 Override density"""
+        try:
+            result = self.execute_adb(["shell", "wm", "density"], device_id)
+            if result:
+                match = re.search(r'Override density:\s*(\d+)', result)
+                if not match:
+                    match = re.search(r'Physical density:\s*(\d+)', result)
+                if match:
+                    return int(match.group(1))
+            return None
+        except Exception as e:
+            print(f"获取屏幕密度失败: {e}")
+            return None
+
     # --- 设备状态与连接 ---
 
     def check_adb_installed(self) -> bool:
@@ -267,16 +796,61 @@ class ADBConnector:
 
     # --- 屏幕与交互操作 ---
 
-    def get_screen_raw(self, device_id: Optional[str] = None) -> Optional[bytes]:
-        """获取屏幕原始字节数据"""
-        cmd = [self.adb_path] + (["-s", device_id] if device_id else []) + ["exec-out", "screencap", "-p"]
+    def _exec_out(self, command: str, device_id: Optional[str] = None, timeout: int = 30) -> Optional[bytes]:
+        """exec-out 方式执行设备命令并返回二进制输出"""
+        if self.wire_client:
+            try:
+                return self.wire_client.exec_out(command, device_id, timeout) or None
+            except AdbCommandError as e:
+                # 与进程调用一致：设备端命令失败返回 None，不再重复执行
+                print(f"ADB命令执行失败: {e}")
+                return None
+            except AdbStreamInterrupted as e:
+                print(f"ADB命令执行中断: {e}")
+                return None
+            except (AdbProtocolError, OSError) as e:
+                print(f"ADB协议通道执行失败，回退到进程调用: {e}")
+
+        cmd = [self.adb_path] + (["-s", device_id] if device_id else []) + ["exec-out", command]
         try:
-            res = subprocess.run(cmd, capture_output=True, timeout=30)
+            res = subprocess.run(cmd, capture_output=True, timeout=timeout)
             return res.stdout if res.returncode == 0 else None
         except Exception as e:
             print(f"获取屏幕原始数据失败: {e}")
             return None
 
+    def get_screen_raw(self, device_id: Optional[str] = None) -> Optional[bytes]:
+        """获取屏幕原始字节数据"""
+        return self._exec_out("screencap -p", device_id)
+
+    def get_screen_framebuffer(self, device_id: Optional[str] = None, compress: bool = False) -> Optional[np.ndarray]:
+        """
+        跳过 PNG 编解码，直接获取帧缓冲像素（约定见 parse_raw_screencap）
+        compress=True 时设备端先 gzip 再传输，减少无线连接下的传输量
+        """
+        data = self._exec_out("screencap | gzip -1" if compress else "screencap", device_id)
+        if data and compress:
+            try:
+                data = zlib.decompress(data, 16 + zlib.MAX_WBITS)
+            except zlib.error as e:
+                print(f"截图解压失败（设备可能不支持 gzip）: {e}")
+                return None
+        return parse_raw_screencap(data)
+
+    def get_screen_frame(self, device_id: Optional[str] = None) -> Optional[np.ndarray]:
+        """
+        按配置的截图模式获取屏幕图像
+        raw 模式失败（旧系统 / 未知像素格式）时自动回退到 PNG
+        """
+        if config_mgr.get("screencap_mode", "png") == "raw":
+            frame = self.get_screen_framebuffer(device_id, bool(config_mgr.get("screencap_compress", False)))
+            if frame is not None:
+                return frame
+        raw_data = self.get_screen_raw(device_id)
+        if not raw_data:
+            return None
+        return cv2.imdecode(np.frombuffer(raw_data, np.uint8), cv2.IMREAD_COLOR)
+
     def capture_screen(self, output_path: str = "screenshot.png", device_id: Optional[str] = None) -> bool:
         """
         截取设备屏幕并保存到本地
@@ -316,22 +890,22 @@ class ADBConnector:
             print(f"截图过程中发生错误: {e}")
             return False
 
-    def click_screen(self, x: int, y: int, device_id: Optional[str] = None, show_log: bool = True) -> bool:
+    def click_screen(self, x: int, y: int, device_id: Optional[str] = None, show_log: bool = True,
+                     device_ctx: Optional[DeviceContext] = None) -> bool:
         """带动态分辨率转换的屏幕点击"""
-        real_x, real_y = adapt_coord(x, y)
-        res = self.execute_adb(["shell", "input", "tap", str(real_x), str(real_y)], device_id)
-        if res is not None and show_log:
+        real_x, real_y = adapt_coord(x, y, device_id, device_ctx)
+        ok = self.run_input(["tap", real_x, real_y], device_id)
+        if ok and show_log:
             print(f"已点击屏幕坐标: ({real_x}, {real_y})")
-        return res is not None
+        return ok
 
     def swipe_screen(self, x1: int, y1: int, x2: int, y2: int, duration: int = 300,
-                     device_id: Optional[str] = None) -> bool:
+                     device_id: Optional[str] = None, device_ctx: Optional[DeviceContext] = None) -> bool:
         """带动态分辨率转换的滑动"""
-        rx1, ry1 = adapt_coord(x1, y1)
-        rx2, ry2 = adapt_coord(x2, y2)
-        res = self.execute_adb(["shell", "input", "swipe", str(rx1), str(ry1), str(rx2), str(ry2), str(duration)],
-                               device_id)
-        return res is not None
+        ctx = device_ctx or get_device_context(device_id)
+        rx1, ry1 = adapt_coord(x1, y1, device_id, ctx)
+        rx2, ry2 = adapt_coord(x2, y2, device_id, ctx)
+        return self.run_input(["swipe", rx1, ry1, rx2, ry2, duration], device_id)
 
     def scan_wifi_devices(self) -> List[str]:
         """扫描局域网内开启了 5555 端口的设备"""
@@ -355,51 +929,316 @@ class ADBConnector:
 # ============================================
 # 图像处理与识别
 # ============================================
+_MATCH_POOL: Optional[ThreadPoolExecutor] = None
+_MATCH_POOL_LOCK = threading.Lock()
+
+
+def _get_match_pool() -> ThreadPoolExecutor:
+    """多模板并行匹配共用的线程池"""
+    global _MATCH_POOL
+    with _MATCH_POOL_LOCK:
+        if _MATCH_POOL is None:
+            _MATCH_POOL = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1),
+                                             thread_name_prefix="ImageMatcher")
+        return _MATCH_POOL
+
+
 class ImageMatcher:
     @staticmethod
-    def compare_template(screen_data: bytes, template_path: str, threshold: float = 0.7) -> Dict:
-        """全屏自适应匹配模板，返回坐标信息"""
-        template_bgr = cv2.imread(template_path)
-        if template_bgr is None:
-            raise ValueError(f"无法读取模板图片: {template_path}")
-
-        screen_bgr = cv2.imdecode(np.frombuffer(screen_data, np.uint8), cv2.IMREAD_COLOR)
-        if screen_bgr is None:
-            raise ValueError("无法解码屏幕数据")
+    def to_gray(screen) -> Optional[np.ndarray]:
+        """
+        将截图统一转为灰度图
+        screen: PNG 字节 / 原始帧缓冲字节 / ndarray（4 通道 RGBA、3 通道 BGR、2 维灰度）
+        """
+        if isinstance(screen, (bytes, bytearray, memoryview)):
+            if bytes(screen[:4]) == b"\x89PNG":
+                return cv2.imdecode(np.frombuffer(screen, np.uint8), cv2.IMREAD_GRAYSCALE)
+            screen = parse_raw_screencap(bytes(screen))
+            if screen is None:
+                return None
+        if screen.ndim == 2:
+            return screen
+        if screen.shape[2] == 4:
+            return cv2.cvtColor(screen, cv2.COLOR_RGBA2GRAY)
+        return cv2.cvtColor(screen, cv2.COLOR_BGR2GRAY)
 
-        template_gray = cv2.cvtColor(template_bgr, cv2.COLOR_BGR2GRAY)
-        screen_gray = cv2.cvtColor(screen_bgr, cv2.COLOR_BGR2GRAY)
+    @staticmethod
+    def to_bgr(screen) -> Optional[np.ndarray]:
+        """将截图统一转为 BGR 彩色图（用于 OCR / 调试显示）"""
+        if isinstance(screen, (bytes, bytearray, memoryview)):
+            if bytes(screen[:4]) == b"\x89PNG":
+                return cv2.imdecode(np.frombuffer(screen, np.uint8), cv2.IMREAD_COLOR)
+            screen = parse_raw_screencap(bytes(screen))
+            if screen is None:
+                return None
+        if screen.ndim == 2:
+            return cv2.cvtColor(screen, cv2.COLOR_GRAY2BGR)
+        if screen.shape[2] == 4:
+            return cv2.cvtColor(screen, cv2.COLOR_RGBA2BGR)
+        return screen
+
+    # 每个 (设备, 模板) 锁定的最佳尺度：{"index": 金字塔下标, "misses": 锁定尺度下连续未匹配次数}
+    _scale_locks: Dict[tuple, Dict] = {}
+    _scale_mutex = threading.Lock()
+    # 锁定尺度连续未匹配达到该次数后，做一次全尺度扫描校正
+    SCALE_MISS_STREAK = 10
+    # 每个 (设备, 模板) 自动学习的优先搜索窗口：{"window": 截图像素坐标, "misses": 窗口内连续未匹配次数}
+    _roi_locks: Dict[tuple, Dict] = {}
+    # 已提示过的无效搜索区域 (设备, 模板, 区域)，避免等待循环中重复刷屏
+    _invalid_regions: Set[tuple] = set()
 
-        s_h, s_w = screen_gray.shape[:2]
-        t_h, t_w = template_gray.shape[:2]
+    @staticmethod
+    def _seed_scale_index(template, device_ctx: Optional[DeviceContext]) -> Optional[int]:
+        """模板按基础分辨率截取，设备缩放比即为预期尺度"""
+        if not template.pyramid or device_ctx is None:
+            return None
+        ratio = device_ctx.scale_x
+        return min(range(len(template.pyramid)), key=lambda i: abs(template.pyramid[i][0] - ratio))
 
-        best_max_corr, best_loc, best_scale = -1.0, (0, 0), 1.0
+    @staticmethod
+    def _match_scales(screen_gray: np.ndarray, template, indices) -> tuple:
+        """在给定尺度下标上依次匹配，返回 (最佳相关度, 左上角, 尺度, 下标)"""
+        s_h, s_w = screen_gray.shape[:2]
+        best_max_corr, best_loc, best_scale, best_index = -1.0, (0, 0), 1.0, None
 
-        # 多尺度匹配
-        for scale in np.linspace(0.4, 1.2, 9):
-            nw, nh = int(t_w * scale), int(t_h * scale)
-            if nw > s_w or nh > s_h or nw < 10 or nh < 10: continue
+        for index in indices:
+            scale, resized_temp = template.pyramid[index]
+            nh, nw = resized_temp.shape[:2]
+            if nw > s_w or nh > s_h: continue
 
-            interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_CUBIC
-            resized_temp = cv2.resize(template_gray, (nw, nh), interpolation=interpolation)
             res = cv2.matchTemplate(screen_gray, resized_temp, cv2.TM_CCOEFF_NORMED)
             _, max_val, _, max_loc = cv2.minMaxLoc(res)
 
             if max_val > best_max_corr:
-                best_max_corr, best_loc, best_scale = max_val, max_loc, scale
+                best_max_corr, best_loc, best_scale, best_index = max_val, max_loc, scale, index
             if max_val >= 0.95: break
 
+        return best_max_corr, best_loc, best_scale, best_index
+
+    # 粗匹配时降采样模板的最短边下限，低于此值回退到全分辨率匹配
+    COARSE_MIN_SIDE = 8
+    # 搜索区域小于该像素面积时直接全分辨率匹配（例如已锁定的 ROI 窗口）
+    COARSE_MIN_AREA = 400 * 400
+    # 粗到精与穷举匹配结果的抽样对比计数（match_any 的线程池中并发更新，由 _coarse_lock 保护）
+    coarse_stats = {"checks": 0, "agree": 0, "mismatch": 0}
+    _coarse_lock = threading.Lock()
+
+    @staticmethod
+    def _match_scales_coarse(screen_gray: np.ndarray, template, indices, factor: int) -> Optional[tuple]:
+        """
+        两级匹配：先在 1/factor 的缩小图上定位最佳尺度与大致位置，再在峰值附近的小窗口内全分辨率精修
+        缩小后的模板过小时返回 None，由调用方回退到全分辨率匹配
+        """
+        s_h, s_w = screen_gray.shape[:2]
+        small_screen = cv2.resize(screen_gray, (s_w // factor, s_h // factor), interpolation=cv2.INTER_AREA)
+        ss_h, ss_w = small_screen.shape[:2]
+
+        coarse_corr, coarse_loc, coarse_index = -1.0, (0, 0), None
+        for index in indices:
+            small_temp = template.coarse(index, factor)
+            th, tw = small_temp.shape[:2]
+            if min(th, tw) < ImageMatcher.COARSE_MIN_SIDE:
+                return None
+            if tw > ss_w or th > ss_h: continue
+
+            res = cv2.matchTemplate(small_screen, small_temp, cv2.TM_CCOEFF_NORMED)
+            _, max_val, _, max_loc = cv2.minMaxLoc(res)
+            if max_val > coarse_corr:
+                coarse_corr, coarse_loc, coarse_index = max_val, max_loc, index
+
+        if coarse_index is None:
+            return -1.0, (0, 0), 1.0, None
+
+        # 精修：在粗定位点周围 2 个降采样像素的窗口内做全分辨率匹配
+        scale, full_temp = template.pyramid[coarse_index]
+        th, tw = full_temp.shape[:2]
+        pad = 2 * factor
+        x1 = max(0, coarse_loc[0] * factor - pad)
+        y1 = max(0, coarse_loc[1] * factor - pad)
+        x2 = min(s_w, coarse_loc[0] * factor + tw + pad)
+        y2 = min(s_h, coarse_loc[1] * factor + th + pad)
+        if x2 - x1 < tw or y2 - y1 < th:
+            return -1.0, (0, 0), scale, coarse_index
+
+        res = cv2.matchTemplate(screen_gray[y1:y2, x1:x2], full_temp, cv2.TM_CCOEFF_NORMED)
+        _, max_val, _, max_loc = cv2.minMaxLoc(res)
+        return max_val, (max_loc[0] + x1, max_loc[1] + y1), scale, coarse_index
+
+    @staticmethod
+    def _match_scales_auto(image: np.ndarray, template, indices, threshold: float) -> tuple:
+        """按配置选择粗到精或全分辨率穷举匹配，并按抽样比例校验两者结果是否一致"""
+        factor = int(config_mgr.get("coarse_factor", 0) or 0)
+        if factor < 2 or image.shape[0] * image.shape[1] < ImageMatcher.COARSE_MIN_AREA:
+            return ImageMatcher._match_scales(image, template, indices)
+
+        result = ImageMatcher._match_scales_coarse(image, template, indices, factor)
+        if result is None:
+            return ImageMatcher._match_scales(image, template, indices)
+
+        verify_rate = float(config_mgr.get("coarse_verify_rate", 0.0) or 0.0)
+        if verify_rate > 0 and random.random() < verify_rate:
+            exact = ImageMatcher._match_scales(image, template, indices)
+            same_decision = (result[0] >= threshold) == (exact[0] >= threshold)
+            same_place = abs(result[1][0] - exact[1][0]) <= factor and abs(result[1][1] - exact[1][1]) <= factor
+            agree = same_decision and (same_place or exact[0] < threshold)
+            with ImageMatcher._coarse_lock:
+                ImageMatcher.coarse_stats["checks"] += 1
+                ImageMatcher.coarse_stats["agree" if agree else "mismatch"] += 1
+            if not agree:
+                print(f"⚠️ 粗到精匹配与穷举结果不一致: {template.path} "
+                      f"粗精 {result[0]:.3f}@{result[1]} / 穷举 {exact[0]:.3f}@{exact[1]}")
+                return exact
+        return result
+
+    @staticmethod
+    def _clip_region(region, s_w: int, s_h: int) -> Optional[tuple]:
+        x1, y1, x2, y2 = region
+        x1, x2 = sorted((max(0, min(int(x1), s_w)), max(0, min(int(x2), s_w))))
+        y1, y2 = sorted((max(0, min(int(y1), s_h)), max(0, min(int(y2), s_h))))
+        if x2 - x1 < MIN_TEMPLATE_SIDE or y2 - y1 < MIN_TEMPLATE_SIDE:
+            return None
+        return x1, y1, x2, y2
+
+    @staticmethod
+    def compare_template(screen_data, template_path: str, threshold: float = 0.7,
+                         device_id: Optional[str] = None, region=None,
+                         device_ctx: Optional[DeviceContext] = None) -> Dict:
+        """
+        自适应匹配模板，返回坐标信息（screen_data 支持的格式见 to_gray）
+        - 尺度：同一设备上模板尺度固定，首次命中后锁定该尺度，之后只在其 ±1 档匹配
+        - 区域：region 为截图像素坐标 (x1, y1, x2, y2) 时只在该区域内搜索；
+          未指定时自动记住上次命中位置，优先在其外扩窗口内搜索
+        两类锁定在连续未命中 SCALE_MISS_STREAK 次后各做一次全量搜索校正
+        device_ctx: 设备分辨率上下文，用于首次匹配时估计尺度；不传则按 device_id 查找
+        """
+        # 模板灰度图与多尺度金字塔来自进程级缓存，不再每次读盘
+        template = template_registry.get(template_path)
+
+        screen_gray = ImageMatcher.to_gray(screen_data)
+        if screen_gray is None:
+            raise ValueError("无法解码屏幕数据")
+
+        s_h, s_w = screen_gray.shape[:2]
+        t_h, t_w = template.height, template.width
+        key = (device_id or "", template.path)
+        with ImageMatcher._scale_mutex:
+            state = ImageMatcher._scale_locks.get(key)
+            if state is None:
+                seed = ImageMatcher._seed_scale_index(template, device_ctx or get_device_context(device_id))
+                if seed is not None:
+                    state = ImageMatcher._scale_locks[key] = {"index": seed, "misses": 0}
+            locked = state is not None and state["misses"] < ImageMatcher.SCALE_MISS_STREAK
+
+            roi_state = None if region is not None else ImageMatcher._roi_locks.get(key)
+            roi_locked = roi_state is not None and roi_state["misses"] < ImageMatcher.SCALE_MISS_STREAK
+
+        if locked:
+            index = state["index"]
+            indices = [i for i in (index, index - 1, index + 1) if 0 <= i < len(template.pyramid)]
+        else:
+            indices = range(len(template.pyramid))
+
+        if region is not None:
+            search = ImageMatcher._clip_region(region, s_w, s_h)
+            if search is None:
+                # 指定区域裁剪后为空（超出截图或小于最小模板边长）：按未命中处理，不扩大为全屏搜索
+                warn_key = key + (tuple(region),)
+                with ImageMatcher._scale_mutex:
+                    first = warn_key not in ImageMatcher._invalid_regions
+                    ImageMatcher._invalid_regions.add(warn_key)
+                if first:
+                    print(f"⚠️ 搜索区域 {tuple(region)} 超出截图 {s_w}x{s_h} 或过小，跳过匹配: {template_path}")
+                return {"is_match": False, "max_corr": 0.0, "scale": 1.0, "target_range": None,
+                        "center_point": None}
+        elif roi_locked:
+            search = roi_state["window"]
+        else:
+            search = None
+
+        if search is not None:
+            sx1, sy1, sx2, sy2 = search
+            best_max_corr, best_loc, best_scale, best_index = ImageMatcher._match_scales_auto(
+                screen_gray[sy1:sy2, sx1:sx2], template, indices, threshold)
+            best_loc = (best_loc[0] + sx1, best_loc[1] + sy1)
+        else:
+            best_max_corr, best_loc, best_scale, best_index = ImageMatcher._match_scales_auto(
+                screen_gray, template, indices, threshold)
+        is_match = best_max_corr >= threshold
+
         x1, y1 = best_loc
         x2, y2 = x1 + int(t_w * best_scale), y1 + int(t_h * best_scale)
-        is_match = best_max_corr >= threshold
+
+        with ImageMatcher._scale_mutex:
+            if is_match:
+                ImageMatcher._scale_locks[key] = {"index": best_index, "misses": 0}
+                if region is None:
+                    # 以命中框为中心向外扩半个模板尺寸作为下次的优先搜索窗口
+                    pad_x = max(40, (x2 - x1) // 2)
+                    pad_y = max(40, (y2 - y1) // 2)
+                    window = ImageMatcher._clip_region((x1 - pad_x, y1 - pad_y, x2 + pad_x, y2 + pad_y), s_w, s_h)
+                    if window is not None:
+                        ImageMatcher._roi_locks[key] = {"window": window, "misses": 0}
+            else:
+                # 锁定状态下累计未命中；全量搜索后重新计数
+                if state is not None:
+                    state["misses"] = state["misses"] + 1 if locked else 0
+                if roi_state is not None:
+                    roi_state["misses"] = roi_state["misses"] + 1 if roi_locked else 0
 
         return {
             "is_match": is_match,
             "max_corr": float(best_max_corr),
+            "scale": float(best_scale),
             "target_range": (x1, y1, x2, y2) if is_match else None,
             "center_point": (int((x1 + x2) / 2), int((y1 + y2) / 2)) if is_match else None
         }
 
+    @staticmethod
+    def match_any(screen_data, templates: Dict[str, str], threshold: float = 0.7,
+                  device_id: Optional[str] = None, regions: Optional[Dict[str, tuple]] = None,
+                  device_ctx: Optional[DeviceContext] = None) -> Dict:
+        """
+        单帧多模板匹配：截图只解码、灰度化一次，各模板在线程池中并行匹配（OpenCV 匹配时释放 GIL）
+        templates: {状态名: 模板路径}；regions: {状态名: 截图像素区域}，可选
+        返回得分最高的命中状态：{"name": 状态名或 None, "result": 该状态匹配结果, "results": 全部结果}
+        """
+        screen_gray = ImageMatcher.to_gray(screen_data)
+        if screen_gray is None:
+            raise ValueError("无法解码屏幕数据")
+        regions = regions or {}
+        device_ctx = device_ctx or get_device_context(device_id)
+
+        def _match(item):
+            name, path = item
+            return name, ImageMatcher.compare_template(screen_gray, path, threshold, device_id, regions.get(name),
+                                                       device_ctx)
+
+        if len(templates) > 1:
+            results = dict(_get_match_pool().map(_match, templates.items()))
+        else:
+            results = dict(map(_match, templates.items()))
+
+        best_name = None
+        for name, res in results.items():
+            if res["is_match"] and (best_name is None or res["max_corr"] > results[best_name]["max_corr"]):
+                best_name = name
+        return {
+            "name": best_name,
+            "result": results[best_name] if best_name else None,
+            "results": results,
+        }
+
+    @staticmethod
+    def reset_learned_state(device_id: Optional[str] = None):
+        """清除已学习的尺度与区域锁定（分辨率变化或切换设备时调用）"""
+        with ImageMatcher._scale_mutex:
+            for locks in (ImageMatcher._scale_locks, ImageMatcher._roi_locks):
+                if device_id is None:
+                    locks.clear()
+                else:
+                    for key in [k for k in locks if k[0] == device_id]:
+                        del locks[key]
+
 
 # ============================================
 # 交互控制器
@@ -413,13 +1252,16 @@ class JoystickController:
     - 保留了触点漂移 (起点不固定)
     """
 
-    def __init__(self, connector, center_x: int, center_y: int, radius: int, run_threshold: int = 150, device_id=None):
+    def __init__(self, connector, center_x: int, center_y: int, radius: int, run_threshold: int = 150, device_id=None,
+                 device_ctx: Optional[DeviceContext] = None):
         self.connector = connector
         self.cx = center_x
         self.cy = center_y
         self.radius = radius
         self.run_threshold = run_threshold  # 走路/跑步的分界线
         self.device_id = device_id
+        # 分辨率上下文：未传入时在首次移动时按 device_id 查找并缓存
+        self.device_ctx = device_ctx
 
         # 跑步速度 (像素/秒)：决定了起跑的瞬间爆发力
         self.run_speed_px = 3000
@@ -433,6 +1275,13 @@ class JoystickController:
         offset_y = max(min(offset_y, range_limit * 2), -range_limit * 2)
         return self.cx + offset_x, self.cy + offset_y
 
+    def gesture(self):
+        """创建绑定本摇杆的手势时间线（utils.gestures.Gesture），可在移动的同时点击技能"""
+        from utils.gestures import Gesture
+        if self.device_ctx is None:
+            self.device_ctx = get_device_context(self.device_id)
+        return Gesture(self.connector, self.device_id, self.device_ctx, joystick=self)
+
     def move(self, direction: str, duration: float = 1.0, mode: str = 'run', debug=False):
         """
         params:
@@ -440,17 +1289,26 @@ class JoystickController:
             duration: 持续时间 (单位：秒)，例如 0.5 或 2.5
             mode: 'walk' (走路) 或 'run' (跑步)
         """
-        direction = direction.lower()
-        if not direction: return
+        self.gesture().move(direction, duration, mode, debug=debug).run()
 
+    def plan(self, direction: str, duration: float = 1.0, mode: str = 'run', debug=False):
+        """
+        计算一次移动的拖动轨迹，参数同 move；direction 也可以是屏幕坐标系下的方向向量 (dx, dy)
+        返回基础分辨率下的 (起点 x, 起点 y, 终点 x, 终点 y, 实际时长秒)，方向无效时返回 None
+        """
         # --- 1. 基础方向向量 ---
-        dx, dy = 0, 0
-        if 'w' in direction: dy -= 1  # 上
-        if 's' in direction: dy += 1  # 下
-        if 'a' in direction: dx -= 1  # 左
-        if 'd' in direction: dx += 1  # 右
+        if isinstance(direction, (tuple, list)):
+            dx, dy = direction
+        else:
+            direction = direction.lower()
+            if not direction: return None
+            dx, dy = 0, 0
+            if 'w' in direction: dy -= 1  # 上
+            if 's' in direction: dy += 1  # 下
+            if 'a' in direction: dx -= 1  # 左
+            if 'd' in direction: dx += 1  # 右
 
-        if dx == 0 and dy == 0: return
+        if dx == 0 and dy == 0: return None
 
         # 计算标准移动角度
         move_angle = math.atan2(dy, dx)
@@ -492,17 +1350,11 @@ class JoystickController:
         if debug:
             print(f"移动: {direction} | 模式: {mode} | 设定: {duration}s | 实际指令: {actual_duration_ms}ms")
 
-        # --- 4. 执行滑动 ---
+        # --- 4. 输出滑动轨迹 ---
         # 转换为整数坐标
         sx, sy = int(start_x), int(start_y)
         ex, ey = int(target_x), int(target_y)
-
-        self.connector.swipe_screen(
-            sx, sy,
-            ex, ey,
-            actual_duration_ms,
-            self.device_id
-        )
+        return sx, sy, ex, ey, actual_duration_ms / 1000
 
 
 
@@ -535,25 +1387,32 @@ def list_devices(connector: ADBConnector) -> List[str]:
         print("未找到已连接的设备")
     return devices
 
-def click(x: int, y: int, connector: ADBConnector = None, device_id: str = None, show_log: bool = False):
+def click(x: int, y: int, connector: ADBConnector = None, device_id: str = None, show_log: bool = False,
+          device_ctx: Optional[DeviceContext] = None):
     """
     高层点击函数
     """
     if connector is None:
         connector = ADBConnector()
-    connector.click_screen(x, y, device_id, show_log)
-    time.sleep(0.5)
+    connector.click_screen(x, y, device_id, show_log, device_ctx)
+    batch = _active_batch(device_id)
+    if batch is not None:
+        batch.sleep(0.5)
+    else:
+        time.sleep(0.5)
 
 
-def random_click(x1: int, y1: int, x2: int, y2: int, connector: ADBConnector = None, device_id: str = None):
+def random_click(x1: int, y1: int, x2: int, y2: int, connector: ADBConnector = None, device_id: str = None,
+                 device_ctx: Optional[DeviceContext] = None):
     """
     区域随机点击函数
     """
     if connector is None:
         connector = ADBConnector()
 
-    rx1, ry1 = adapt_coord(x1, y1)
-    rx2, ry2 = adapt_coord(x2, y2)
+    ctx = device_ctx or get_device_context(device_id)
+    rx1, ry1 = adapt_coord(x1, y1, device_id, ctx)
+    rx2, ry2 = adapt_coord(x2, y2, device_id, ctx)
 
     left = min(rx1, rx2)
     top = min(ry1, ry2)
@@ -563,19 +1422,25 @@ def random_click(x1: int, y1: int, x2: int, y2: int, connector: ADBConnector = N
     random_x = random.randint(left, right)
     random_y = random.randint(top, bottom)
 
-    time.sleep(random.uniform(0.05, 0.2))
+    batch = _active_batch(device_id)
+    if batch is not None:
+        batch.sleep(round(random.uniform(0.05, 0.2), 3))
+    else:
+        time.sleep(random.uniform(0.05, 0.2))
 
     # 因为已经是实际坐标了，所以这里直接调原生的tap命令，或者再次调用click_screen时注意别二次转换
     # 最稳妥的方式是直接走底层指令
-    res = connector.execute_adb(["shell", "input", "tap", str(random_x), str(random_y)], device_id)
-    if res is not None:
-        time.sleep(0.05)
+    if connector.run_input(["tap", random_x, random_y], device_id):
+        if batch is not None:
+            batch.sleep(0.05)
+        else:
+            time.sleep(0.05)
     else:
         print(f"点击坐标 ({random_x}, {random_y}) 失败")
 
 
 def long_press(x: int, y: int, duration: float, connector: ADBConnector = None, device_id: str = None,
-               show_log: bool = True):
+               show_log: bool = True, device_ctx: Optional[DeviceContext] = None):
     """
     按住屏幕指定位置，单位为秒
     :param x: 基础分辨率 X (2800)
@@ -586,23 +1451,16 @@ def long_press(x: int, y: int, duration: float, connector: ADBConnector = None,
         connector = ADBConnector()
 
     # 转换为实际分辨率坐标
-    real_x, real_y = adapt_coord(x, y)
+    real_x, real_y = adapt_coord(x, y, device_id, device_ctx)
 
     # 将秒转换为 ADB 所需的毫秒
     duration_ms = int(duration * 1000)
 
     # ADB 长按原理：起始点和终点相同，并指定持续时间
-    cmd = [
-        "shell", "input", "swipe",
-        str(real_x), str(real_y),
-        str(real_x), str(real_y),
-        str(duration_ms)
-    ]
-
-    res = connector.execute_adb(cmd, device_id)
-    if res is not None and show_log:
+    ok = connector.run_input(["swipe", real_x, real_y, real_x, real_y, duration_ms], device_id)
+    if ok and show_log:
         print(f"-> 已长按坐标: ({real_x}, {real_y}) 持续 {duration}s")
-    return res is not None
+    return ok
 
 def random_sleep(min_time: float, max_time: float = None, variation: float = 0.1):
     """支持 GUI 中断的随机睡眠 """
@@ -622,37 +1480,274 @@ def random_sleep_extended(min_time: float, max_time: float = None, variation: fl
     random_sleep(min_time, max_time, variation)
 
 
+def get_stream_source(connector: ADBConnector, device_id: Optional[str] = None):
+    """开启 frame_stream 时返回（必要时启动）设备帧源；否则仅返回已在运行的帧源或 None"""
+    from utils import frame_source
+    if config_mgr.get("frame_stream", False):
+        return frame_source.start_frame_source(connector, device_id)
+    return frame_source.get_frame_source(device_id)
+
+
+def grab_screen(connector: ADBConnector, device_id: Optional[str] = None):
+    """获取当前屏幕：帧源运行中时直接取最新帧，否则现场截图"""
+    source = get_stream_source(connector, device_id)
+    if source is not None:
+        frame = source.latest() or source.wait_for_frame(0)
+        if frame is not None:
+            return frame.image
+    return connector.get_screen_frame(device_id)
+
+
+def adapt_region(region, device_id: Optional[str] = None,
+                 device_ctx: Optional[DeviceContext] = None) -> Optional[tuple]:
+    """基础分辨率下的区域 (x1, y1, x2, y2) 转为设备实际像素坐标"""
+    if region is None:
+        return None
+    ctx = device_ctx or get_device_context(device_id)
+    if ctx is None:
+        return tuple(region)
+    return ctx.to_device_region(region)
+
+
 def execute_screenshot_and_match(device_id: str, connector: ADBConnector, template_path: str, region=None,
-                                 debug: bool = False) -> Dict:
-    raw_data = connector.get_screen_raw(device_id)
-    if not raw_data:
+                                 debug: bool = False, device_ctx: Optional[DeviceContext] = None) -> Dict:
+    """
+    截图并匹配模板
+    region: 基础分辨率 (2800x1840) 下的搜索区域 (x1, y1, x2, y2)，None 表示全屏（自动学习命中位置）
+    """
+    screen = grab_screen(connector, device_id)
+    if screen is None:
         return {"is_match": False}
-    res = ImageMatcher.compare_template(raw_data, template_path)
+    ctx = device_ctx or get_device_context(device_id)
+    res = ImageMatcher.compare_template(screen, template_path, device_id=device_id,
+                                        region=adapt_region(region, device_id, ctx), device_ctx=ctx)
     if debug:
         status_notifier.log(f"截图匹配结果: {res}")
     return res
 
 
+class ChangeGate:
+    """
+    静态画面门控：等待期间记录最近一次未命中时监视区域的缩略灰度图，
+    新帧与其平均绝对差低于阈值时视为画面未变化，直接沿用未命中结果，跳过完整模板匹配
+    - 平均绝对差按缩略图上 TILE×TILE 的分块分别计算并取最大值，全屏监视时小按钮出现也能被察觉
+    - 基准只在完整匹配未命中后更新，缓慢渐变的画面累计差异超过阈值后仍会触发匹配
+    - 连续跳过 max_skips 帧或距上次完整匹配超过 max_skip_seconds 秒时强制完整匹配一次，
+      低于阈值的细微变化（如小图标淡入）不会被无限期跳过；传 0 关闭对应条件
+    - 各等待目标的累计跳过次数见 frame_gate_stats()
+    """
+    THUMB_WIDTH = 96
+    TILE = 8
+    MAX_SKIPS = 10
+    MAX_SKIP_SECONDS = 3.0
+    stats: Dict[str, Dict[str, int]] = {}
+    _stats_lock = threading.Lock()
+
+    def __init__(self, name: str, region=None, threshold: Optional[float] = None,
+                 max_skips: int = MAX_SKIPS, max_skip_seconds: float = MAX_SKIP_SECONDS):
+        self.name = name
+        self.region = region
+        self.threshold = float(config_mgr.get("frame_gate_threshold", 2.0) if threshold is None else threshold)
+        self.max_skips = max_skips
+        self.max_skip_seconds = max_skip_seconds
+        self.checked = 0
+        self.skipped = 0
+        self._streak = 0
+        self._last_full = time.time()
+        self._reference = None
+        self._thumb = None
+
+    @staticmethod
+    def union_region(names, regions: Dict[str, tuple]) -> Optional[tuple]:
+        """多个等待目标的监视区域：各自区域的外接矩形；任一目标没有区域（全屏搜索）时返回 None"""
+        boxes = [regions.get(name) for name in names]
+        if not boxes or any(box is None for box in boxes):
+            return None
+        return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+                max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+    @staticmethod
+    def thumbnail(gray: np.ndarray, region=None) -> np.ndarray:
+        """监视区域（None 为整帧）的缩略灰度图"""
+        if region is not None:
+            clipped = ImageMatcher._clip_region(region, gray.shape[1], gray.shape[0])
+            if clipped is not None:
+                x1, y1, x2, y2 = clipped
+                gray = gray[y1:y2, x1:x2]
+        h, w = gray.shape[:2]
+        width = min(ChangeGate.THUMB_WIDTH, w)
+        return cv2.resize(gray, (width, max(1, h * width // w)), interpolation=cv2.INTER_AREA)
+
+    @staticmethod
+    def tile_diff(thumb: np.ndarray, reference: np.ndarray) -> float:
+        """两张同尺寸缩略图按 TILE×TILE 分块的平均绝对差的最大值"""
+        diff = cv2.absdiff(thumb, reference)
+        h, w = diff.shape[:2]
+        tile = ChangeGate.TILE
+        return float(cv2.resize(diff, (max(1, w // tile), max(1, h // tile)), interpolation=cv2.INTER_AREA).max())
+
+    def unchanged(self, gray: np.ndarray) -> bool:
+        """当前帧与上次未命中时相比无明显变化时返回 True，调用方应跳过匹配"""
+        self.checked += 1
+        if self.threshold <= 0:
+            return False
+        self._thumb = self.thumbnail(gray, self.region)
+        reference = self._reference
+        now = time.time()
+        forced = ((self.max_skips and self._streak >= self.max_skips)
+                  or (self.max_skip_seconds and now - self._last_full >= self.max_skip_seconds))
+        if not forced and reference is not None and reference.shape == self._thumb.shape:
+            if self.tile_diff(self._thumb, reference) < self.threshold:
+                self.skipped += 1
+                self._streak += 1
+                return True
+        self._streak = 0
+        self._last_full = now
+        return False
+
+    def mark_miss(self):
+        """完整匹配未命中：以当前帧作为新的比较基准"""
+        if self._thumb is not None:
+            self._reference = self._thumb
+
+    def close(self):
+        """本次等待结束，计入全局统计"""
+        with ChangeGate._stats_lock:
+            total = ChangeGate.stats.setdefault(self.name, {"checked": 0, "skipped": 0})
+            total["checked"] += self.checked
+            total["skipped"] += self.skipped
+        if self.skipped:
+            print(f"  静态画面跳过匹配 {self.skipped}/{self.checked} 帧")
+
+
+def frame_gate_stats() -> Dict[str, Dict[str, Any]]:
+    """各等待目标的已检查帧数、跳过帧数与跳过率（"[全部]" 为汇总）"""
+    with ChangeGate._stats_lock:
+        items = {name: dict(v) for name, v in ChangeGate.stats.items()}
+    checked = sum(v["checked"] for v in items.values())
+    skipped = sum(v["skipped"] for v in items.values())
+    items["[全部]"] = {"checked": checked, "skipped": skipped}
+    for v in items.values():
+        v["skip_rate"] = round(v["skipped"] / v["checked"], 3) if v["checked"] else 0.0
+    return items
+
+
 def wait_until_match(device_id: str, connector: ADBConnector, template_path: str, timeout: int = 60,
-                     raise_err: bool = True, debug: bool = False) -> Optional[Dict]:
-    """阻塞式等待图片出现"""
+                     raise_err: bool = True, debug: bool = False, interval: float = 1.5,
+                     region=None, device_ctx: Optional[DeviceContext] = None) -> Optional[Dict]:
+    """
+    阻塞式等待图片出现
+    帧源运行时逐帧消费新截图，匹配延迟只取决于截图速度；否则按 PollScheduler 调度截图间隔
+    （interval 为默认间隔，有历史用时后早期稀疏、接近预期完成时加密）
+    监视区域与上次未命中时相比没有变化的帧跳过匹配（见 ChangeGate）
+    region: 基础分辨率下的搜索区域 (x1, y1, x2, y2)，含义同 execute_screenshot_and_match
+    """
+    from utils.poll_scheduler import PollScheduler, wait_key
     print(f"正在等待: {template_path} (超时: {timeout}s)...")
     start_time = time.time()
+    source = get_stream_source(connector, device_id)
+    ctx = device_ctx or get_device_context(device_id)
+    device_region = adapt_region(region, device_id, ctx)
+    gate = ChangeGate(template_path, device_region)
+    scheduler = PollScheduler(wait_key(template_path, device_id), timeout, interval)
+    last_seq = 0
 
-    while time.time() - start_time < timeout:
-        check_running()
-        res = execute_screenshot_and_match(device_id, connector, template_path)
-        if res.get('is_match'):
-            return res
-        elif debug:
-            print(f"  未匹配: {res}")
-        time.sleep(1.5)
+    try:
+        while time.time() - start_time < timeout:
+            check_running(device_id)
+            if source is not None:
+                remaining = timeout - (time.time() - start_time)
+                frame = source.wait_for_frame(last_seq, timeout=max(0.1, min(5.0, remaining)))
+                if frame is None:
+                    if not source.is_alive:
+                        source = None  # 帧源异常退出，回退到逐次截图
+                    continue
+                last_seq = frame.seq
+                screen = frame.image
+            else:
+                screen = grab_screen(connector, device_id)
+
+            screen_gray = ImageMatcher.to_gray(screen) if screen is not None else None
+            if screen_gray is None:
+                res = {"is_match": False}
+            elif gate.unchanged(screen_gray):
+                res = {"is_match": False, "skipped": True}
+            else:
+                res = ImageMatcher.compare_template(screen_gray, template_path, device_id=device_id,
+                                                    region=device_region, device_ctx=ctx)
+                if not res["is_match"]:
+                    gate.mark_miss()
+
+            if res.get('is_match'):
+                scheduler.record(time.time() - start_time)
+                return res
+            elif debug:
+                print(f"  未匹配: {res}")
+            if source is None:
+                smart_sleep(scheduler.next_delay(time.time() - start_time))
+    finally:
+        gate.close()
 
     if raise_err:
         raise TimeoutException(f"等待超时：{timeout}秒内未找到目标 {template_path}")
     return None
 
 
+def wait_until_any(device_id: str, connector: ADBConnector, templates: Dict[str, str], timeout: int = 60,
+                   raise_err: bool = True, debug: bool = False, interval: float = 1.5,
+                   regions: Optional[Dict[str, tuple]] = None,
+                   device_ctx: Optional[DeviceContext] = None) -> Optional[Dict]:
+    """
+    阻塞式等待多个状态中任意一个出现，每次只截一帧并对全部模板并行匹配；截图间隔同 wait_until_match
+    templates: {状态名: 模板路径}；regions: {状态名: 基础分辨率区域}，可选
+    返回 ImageMatcher.match_any 的结果（含命中状态名 "name"），超时返回 None 或抛出 TimeoutException
+    """
+    from utils.poll_scheduler import PollScheduler, wait_key
+    print(f"正在等待任一状态: {list(templates)} (超时: {timeout}s)...")
+    start_time = time.time()
+    source = get_stream_source(connector, device_id)
+    ctx = device_ctx or get_device_context(device_id)
+    device_regions = ctx.convert_table(regions) if ctx is not None and regions else dict(regions or {})
+    # 门控只监视各模板搜索区域的外接矩形；有模板全屏搜索时按整帧判断是否变化
+    gate = ChangeGate(",".join(templates), ChangeGate.union_region(templates, device_regions))
+    scheduler = PollScheduler(wait_key(",".join(templates), device_id), timeout, interval)
+    last_seq = 0
+
+    try:
+        while time.time() - start_time < timeout:
+            check_running(device_id)
+            if source is not None:
+                remaining = timeout - (time.time() - start_time)
+                frame = source.wait_for_frame(last_seq, timeout=max(0.1, min(5.0, remaining)))
+                if frame is None:
+                    if not source.is_alive:
+                        source = None
+                    continue
+                last_seq = frame.seq
+                screen = frame.image
+            else:
+                screen = connector.get_screen_frame(device_id)
+
+            screen_gray = ImageMatcher.to_gray(screen) if screen is not None else None
+            if screen_gray is not None and not gate.unchanged(screen_gray):
+                res = ImageMatcher.match_any(screen_gray, templates, device_id=device_id, regions=device_regions,
+                                             device_ctx=ctx)
+                if res["name"]:
+                    scheduler.record(time.time() - start_time)
+                    return res
+                gate.mark_miss()
+                if debug:
+                    print(f"  未匹配: { {k: round(v['max_corr'], 3) for k, v in res['results'].items()} }")
+            if source is None:
+                smart_sleep(scheduler.next_delay(time.time() - start_time))
+    finally:
+        gate.close()
+
+    if raise_err:
+        raise TimeoutException(f"等待超时：{timeout}秒内未找到任一目标 {list(templates)}")
+    return None
+
+
 # ============================================
 # 统一状态与日志分发器（用于主页表格与侧边栏日志分流）
 # ============================================
@@ -663,14 +1758,21 @@ class ScriptStatusSignaler:
 
     def update(self, current_round: int, step_desc: str, total_round: int = None):
         """同步更新主界面单行看板表格的状态"""
-        if self.callback:
+        ctx = current_run_context()
+        if ctx is not None and ctx.on_status:
+            # 多设备模式：按设备分流到各自的状态通道
+            ctx.on_status(ctx.device_id, current_round, step_desc, total_round)
+        elif self.callback:
             self.callback(current_round, step_desc, total_round)
         # 步骤也会自动在侧边栏详细日志中同步写一份
         self.log(f"[步骤] {step_desc}")
 
     def log(self, text: str):
         """同步将详细调试信息追加到侧边栏日志面板"""
-        if self.log_callback:
+        ctx = current_run_context()
+        if ctx is not None and ctx.on_log:
+            ctx.on_log(ctx.device_id, text)
+        elif self.log_callback:
             self.log_callback(text)
         else:
             print(text)